@@ -4,7 +4,7 @@ import { RouteSegmentDTO } from "../common/dto";
 
 interface DeliveryTaskRef {
     delivery_task: DeliveryTaskDTO; 
-    order_key: number;
+    order_key: string;
 }
 
 interface DeliveryTasksBatchRouteSegmentDTO {
@@ -4,7 +4,7 @@ import { RouteSegment } from "../common/type";
 
 export type DeliveryTaskRef = {
     deliveryTask: DeliveryTask;
-    orderKey: number;
+    orderKey: string;
 }
 
 export type DeliveryTasksBatchRouteSegment = {
@@ -0,0 +1,190 @@
+"""
+Cache of dispatch answers, keyed by a fingerprint of the problem.
+
+A dispatch retried with the same tasks and riders builds the same columnar problem, whose
+fingerprint is a blake2b hash of its columns, the solver build and the search parameters.
+The answer, each rider's order as delivery indices, is kept in memory in a size bounded
+LRU with a time to live, and optionally in a directory shared by the server's workers
+and kept across restarts. Orders are positional, so they apply to any problem with the
+same columns whatever the ids of its tasks and riders.
+"""
+
+from typing import Any, List, Optional, Tuple
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from ..settings import settings
+from .problem import DispatchProblem
+
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_DIGEST_SIZE = 16
+
+
+def get_file_version(path: str) -> str:
+    """
+    This function returns the size and modification time of a solver build, which change
+    whenever it is rebuilt.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return "missing"
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def get_problem_fingerprint(problem: DispatchProblem, **parameters: Any) -> str:
+    """
+    This function hashes the problem's columns and the parameters its answer depends on.
+    """
+    fingerprint = hashlib.blake2b(digest_size=FINGERPRINT_DIGEST_SIZE)
+    for column in (
+        problem.latitudes,
+        problem.longitudes,
+        problem.areas,
+        problem.volumes,
+        problem.expected_delivery_time_deltas,
+        problem.bag_volumes,
+    ):
+        column = np.ascontiguousarray(column)
+        fingerprint.update(f"{column.dtype.str}{column.shape}".encode("utf8"))
+        fingerprint.update(column.tobytes())
+    fingerprint.update(repr(sorted(parameters.items())).encode("utf8"))
+    return fingerprint.hexdigest()
+
+
+class SolutionCache:
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        directory: str,
+        max_bytes: int,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        # fingerprint to (expiry time, orders), least recently used first
+        self._entries: "OrderedDict[str, Tuple[float, List[List[int]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "SolutionCache":
+        return cls(
+            max_entries=settings.DISPATCH_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.DISPATCH_CACHE_TTL_SECONDS,
+            directory=settings.DISPATCH_CACHE_DIRECTORY,
+            max_bytes=settings.DISPATCH_CACHE_MAX_BYTES,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self.directory != ""
+
+    def get(self, fingerprint: str) -> Optional[List[List[int]]]:
+        """
+        Returns the cached orders or None, looking in memory and then on disk. It may
+        read a file, so it runs off the event loop.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is not None:
+                expires_at, orders = entry
+                if expires_at > now:
+                    self._entries.move_to_end(fingerprint)
+                    return orders
+                del self._entries[fingerprint]
+
+        orders = self._read(fingerprint, now)
+        if orders is not None:
+            self._put_in_memory(fingerprint, orders, now)
+        return orders
+
+    def put(self, fingerprint: str, orders: List[List[int]]) -> None:
+        """
+        Caches the orders in memory and on disk. It may write a file, so it runs off
+        the event loop.
+        """
+        now = time.time()
+        self._put_in_memory(fingerprint, orders, now)
+        if self.directory == "":
+            return
+        try:
+            self._write(fingerprint, orders)
+            self._rotate(now)
+        except OSError:
+            logger.exception("Failed to cache dispatch answer %s on disk", fingerprint)
+
+    def _put_in_memory(
+        self, fingerprint: str, orders: List[List[int]], now: float
+    ) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[fingerprint] = (now + self.ttl_seconds, orders)
+            self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_path(self, fingerprint: str) -> str:
+        return os.path.join(self.directory, f"dispatch-{fingerprint}.json")
+
+    def _read(self, fingerprint: str, now: float) -> Optional[List[List[int]]]:
+        if self.directory == "":
+            return None
+        path = self._get_path(fingerprint)
+        try:
+            if os.stat(path).st_mtime + self.ttl_seconds <= now:
+                os.remove(path)
+                return None
+            with open(path, "r", encoding="utf8") as f:
+                return json.load(f)["orders"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError):
+            logger.exception("Failed to read cached dispatch answer %s", fingerprint)
+            return None
+
+    def _write(self, fingerprint: str, orders: List[List[int]]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._get_path(fingerprint)
+        # workers caching the same answer at once write their own temporary file
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w", encoding="utf8") as f:
+            json.dump({"orders": orders}, f)
+        os.replace(temporary_path, path)
+
+    def _rotate(self, now: float) -> None:
+        """
+        Deletes the expired answers, then the oldest ones until the directory fits in
+        max_bytes.
+        """
+        answers = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".json"):
+                stat = entry.stat()
+                if stat.st_mtime + self.ttl_seconds <= now:
+                    os.remove(entry.path)
+                else:
+                    answers.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_bytes = sum(size for _, size, _ in answers)
+        for _, size, path in sorted(answers):
+            if total_bytes <= self.max_bytes:
+                break
+            os.remove(path)
+            total_bytes -= size
+
+
+solution_cache = SolutionCache.from_settings()
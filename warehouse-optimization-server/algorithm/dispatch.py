@@ -1,190 +1,669 @@
-from typing import List
-from subprocess import Popen, PIPE
-import datetime
-
-from ..dtos import DeliveryTaskDTO
+from typing import List, Optional, Tuple
+import asyncio
+import logging
+import math
+import random
+import time
+import uuid
+import numpy as np
+
+from ..dtos import DeliveryTaskDTO, DeliveryTasksBatchDTO
 from ..models.rider import Rider
 from .dto import DispatchedDeliveryTask
-from .map import distance as map_distance_service
-from ..schemas import Coordinate
-from ..constants import WAREHOUSE_LOCATION
-from ..models.item import Item
-from ..clock import WarehouseClock
+from . import native, protocol, zones
+from .cache import get_file_version, get_problem_fingerprint, solution_cache
+from .post_optimize import RoutePostOptimizer
+from .problem import DispatchProblem, SolverArrays
+from .recorder import problem_recorder
+from .solver_pool import DISPATCH_PROGRAM_PATH, get_solver_pool, get_solver_pool_size
+from ..metrics import solver_fallbacks, solver_timeouts, time_phase
+from ..settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+# time given to the solver on top of its budget to finish the stage it is in
+SOLVER_DEADLINE_GRACE_SECONDS = 1.0
+# least search time left to the solver when the grace and the local search take most of
+# a small budget
+MIN_SOLVER_TIME_BUDGET_SECONDS = 0.1
 
 
 class DispatchAlgorithm:
     @classmethod
-    def dispatch(
-        cls, delivery_tasks: List[DeliveryTaskDTO], riders: List[Rider]
+    async def dispatch(
+        cls,
+        delivery_tasks: List[DeliveryTaskDTO],
+        riders: List[Rider],
+        time_budget: Optional[float] = None,
+        quality_target: Optional[int] = None,
+        seed: Optional[int] = None,
+        num_starts: Optional[int] = None,
     ) -> List[DispatchedDeliveryTask]:
-        num_deliveries = len(delivery_tasks)
-        num_riders = len(riders)
+        """
+        This method is used to assign delivery tasks to riders.
 
-        cls._validate_delivery_tasks(delivery_tasks)
-        cls._validate_riders(riders)
+        A time budget in seconds bounds the solve and the local search after it
+        together: the solver gets what is left of it once the local search and a grace
+        period are set aside. With the binary wire format the solver stops searching
+        once its share is spent, and the best answer streamed so far is used if it is
+        still busy after the grace period. With the text format the share is only
+        enforced as a deadline and a solver killed at it fails the dispatch. With a
+        quality target the solver stops once that many deliveries are served, which
+        also needs the binary wire format.
 
-        delivery_tasks_pairwise_distance_matrix = (
-            cls._get_delivery_tasks_and_warehouse_pairwise_distance_matrix(
-                delivery_tasks
-            )
-        )
+        With the binary wire format or the native solver backend num_starts searches
+        (DISPATCH_NUM_STARTS by default) run in parallel with the seeds seed, seed + 1,
+        ... and the answer serving the most deliveries in the least total route time
+        wins. A random seed is drawn when none is given.
+
+        The solver's routes are then improved by a local search for up to
+        DISPATCH_POST_OPTIMIZE_SECONDS, see algorithm/post_optimize.py.
+
+        Days with more than DISPATCH_DECOMPOSITION_THRESHOLD deliveries are split into
+        zones that are solved separately, see solve_problem.
 
-        program_path = "./algorithm/runnable/bin/dispatch.exe"
+        A dispatch repeating the problem and arguments of a recent one returns its
+        answer from the solution cache, see algorithm/cache.py.
 
-        p = Popen(program_path, stdout=PIPE, stdin=PIPE, encoding="utf8")
-        f = open("./algorithm/runnable/dispatch_input.in", "w", encoding="utf8")
+        Each phase is timed in the wos_phase_seconds histogram, see metrics.py.
+        """
+        problem = await asyncio.to_thread(cls._get_problem, delivery_tasks, riders)
+
+        fingerprint = None
+        if solution_cache.enabled:
+            with time_phase("dispatch", "cache_lookup", problem.num_deliveries):
+                fingerprint = await asyncio.to_thread(
+                    cls._get_fingerprint,
+                    problem,
+                    time_budget,
+                    quality_target,
+                    seed,
+                    num_starts,
+                )
+                orders = await asyncio.to_thread(solution_cache.get, fingerprint)
+            if orders is not None:
+                logger.info("Dispatch answer %s served from the cache", fingerprint)
+                return cls._get_dispatched_delivery_tasks(problem, orders)
 
-        p.stdin.write(str(num_deliveries) + "\n")
-        f.write(str(int(num_deliveries)) + "\n")
+        orders = await cls.solve_problem(
+            problem, time_budget, quality_target, seed, num_starts
+        )
+        if fingerprint is not None:
+            with time_phase("dispatch", "cache_store", problem.num_deliveries):
+                await asyncio.to_thread(solution_cache.put, fingerprint, orders)
+        return cls._get_dispatched_delivery_tasks(problem, orders)
+
+    @classmethod
+    async def redispatch(
+        cls,
+        delivery_tasks_batches: List[DeliveryTasksBatchDTO],
+        delivery_tasks: List[DeliveryTaskDTO],
+        riders: List[Rider],
+        time_budget: Optional[float] = None,
+        quality_target: Optional[int] = None,
+        seed: Optional[int] = None,
+        num_starts: Optional[int] = None,
+    ) -> List[DispatchedDeliveryTask]:
+        """
+        This method is used to assign new delivery tasks to riders that may already have
+        a batch for the day, riders includes the riders of delivery_tasks_batches.
+
+        The solver is warm started from the current batches, the tasks of a batch up to
+        its current task, and up to its last pickup, stay where they are and the others
+        are reassigned along with the new delivery tasks. The search starts from the
+        current orders with the new tasks inserted, so it needs far less time than a
+        dispatch from scratch. The answer is in the same form as dispatch's, each
+        rider's tasks in order, fixed ones first, and a batch task may be left out when
+        it can no longer be served in time.
+
+        The arguments are those of dispatch, the search always uses the binary wire
+        format and the problem is solved whole, without the local search.
+        """
+        problem, warm_start = await asyncio.to_thread(
+            cls._get_warm_start_problem, delivery_tasks_batches, delivery_tasks, riders
+        )
+        with time_phase("dispatch", "matrix", problem.num_deliveries):
+            solver_arrays = await asyncio.to_thread(problem.get_solver_arrays)
+        orders = await cls._solve(
+            problem,
+            solver_arrays,
+            time_budget,
+            quality_target,
+            seed,
+            num_starts,
+            warm_start,
+        )
+        return cls._get_dispatched_delivery_tasks(problem, orders)
+
+    @classmethod
+    def _get_dispatched_delivery_tasks(
+        cls, problem: DispatchProblem, orders: List[List[int]]
+    ) -> List[DispatchedDeliveryTask]:
+        dispatched_delivery_tasks = []
 
-        for i in range(num_deliveries + 1):
-            for j in range(num_deliveries + 1):
-                if i == j:
-                    p.stdin.write(str(0) + "\n")
-                    f.write(str(int(0)) + "\n")
+        for rider_ind, order in enumerate(orders):
+            for location in order:
+                if location == 0:
+                    # the warehouse, the rider returns to the hub mid route
                     continue
-                p.stdin.write(str(int(delivery_tasks_pairwise_distance_matrix[i][j])) + "\n")
-                f.write(str(int(delivery_tasks_pairwise_distance_matrix[i][j])) + "\n")
+                dispatched_delivery_tasks.append(
+                    DispatchedDeliveryTask(
+                        delivery_id=problem.delivery_task_ids[location - 1],
+                        rider_id=problem.rider_ids[rider_ind],
+                    )
+                )
 
-        for delivery_task in delivery_tasks:
-            item = Item(**delivery_task.items[0].model_dump())
-            p.stdin.write(str(int(item.tool_scan_information.volume)) + "\n")
-            f.write(str(int(item.tool_scan_information.volume)) + "\n")
+        return dispatched_delivery_tasks
 
-        day_start_timestamp = WarehouseClock().get_day_start_timestamp()
+    @classmethod
+    async def solve_problem(
+        cls,
+        problem: DispatchProblem,
+        time_budget: Optional[float] = None,
+        quality_target: Optional[int] = None,
+        seed: Optional[int] = None,
+        num_starts: Optional[int] = None,
+    ) -> List[List[int]]:
+        """
+        This method returns the order of each rider, as delivery indices of the problem
+        counted from 1, for the arguments of dispatch.
+
+        A problem with more than DISPATCH_DECOMPOSITION_THRESHOLD deliveries is
+        partitioned into zones of about DISPATCH_ZONE_SIZE deliveries with k-means on
+        their coordinates, and the riders are split between the zones in proportion to
+        the volume to deliver. Each zone is solved on its own submatrix, in its own
+        solver process, with its area input filled with one k-means area per rider. The
+        full matrix is never built. A zone whose solve fails leaves its riders without
+        routes rather than failing the dispatch. Neighbouring zones are then repaired
+        pairwise by the local search, which can move deliveries across the zone
+        boundary.
+        """
+        threshold = settings.DISPATCH_DECOMPOSITION_THRESHOLD
+        if threshold > 0 and problem.num_deliveries > threshold:
+            return await cls._solve_by_zones(
+                problem, time_budget, quality_target, seed, num_starts
+            )
+        return await cls._solve_whole(
+            problem, time_budget, quality_target, seed, num_starts
+        )
 
-        for delivery_task in delivery_tasks:
-            expected_delivery_time = (
-                delivery_task.delivery_information.expected_delivery_time
+    @classmethod
+    async def _solve_whole(
+        cls,
+        problem: DispatchProblem,
+        time_budget: Optional[float],
+        quality_target: Optional[int],
+        seed: Optional[int],
+        num_starts: Optional[int],
+    ) -> List[List[int]]:
+        with time_phase("dispatch", "matrix", problem.num_deliveries):
+            solver_arrays = await asyncio.to_thread(problem.get_solver_arrays)
+        # the budget covers the local search and the grace after the solver's share
+        solver_time_budget = (
+            max(
+                time_budget
+                - SOLVER_DEADLINE_GRACE_SECONDS
+                - settings.DISPATCH_POST_OPTIMIZE_SECONDS,
+                MIN_SOLVER_TIME_BUDGET_SECONDS,
             )
-            # Ensure both datetimes are timezone-aware for calculation
-            if expected_delivery_time.tzinfo is None:
-                expected_delivery_time = expected_delivery_time.replace(tzinfo=datetime.timezone.utc)
-            
-            edd_delta = expected_delivery_time - day_start_timestamp
-            p.stdin.write(str(int(edd_delta.total_seconds())) + "\n")
-            f.write(str(int(edd_delta.total_seconds())) + "\n")
-
-        warehouse_coordinate = WAREHOUSE_LOCATION.coordinate
-        p.stdin.write(str(warehouse_coordinate.latitude) + "\n")
-        p.stdin.write(str(warehouse_coordinate.longitude) + "\n")
-        f.write(str(warehouse_coordinate.latitude) + "\n")
-        f.write(str(warehouse_coordinate.longitude) + "\n")
-
-        for delivery_task in delivery_tasks:
-            delivery_location_coordinate = (
-                delivery_task.delivery_information.delivery_location.coordinate
+            if time_budget is not None
+            else None
+        )
+        orders = await cls._solve(
+            problem, solver_arrays, solver_time_budget, quality_target, seed, num_starts
+        )
+        with time_phase("dispatch", "post_optimize", problem.num_deliveries):
+            return await asyncio.to_thread(
+                RoutePostOptimizer(problem, solver_arrays[0]).optimize,
+                orders,
+                settings.DISPATCH_POST_OPTIMIZE_SECONDS,
             )
-            p.stdin.write(str(delivery_location_coordinate.latitude) + "\n")
-            p.stdin.write(str(delivery_location_coordinate.longitude) + "\n")
-            f.write(str(delivery_location_coordinate.latitude) + "\n")
-            f.write(str(delivery_location_coordinate.longitude) + "\n")
-
-        p.stdin.write(str(1) + "\n")
-        f.write(str(1) + "\n")
-
-        for _ in range(num_deliveries):
-            p.stdin.write(str(1) + "\n")
-            f.write(str(1) + "\n")
 
-        p.stdin.write(str(num_riders) + "\n")
-        f.write(str(int(num_riders)) + "\n")
+    @classmethod
+    async def _solve_by_zones(
+        cls,
+        problem: DispatchProblem,
+        time_budget: Optional[float],
+        quality_target: Optional[int],
+        seed: Optional[int],
+        num_starts: Optional[int],
+    ) -> List[List[int]]:
+        num_deliveries = problem.num_deliveries
+        if problem.num_riders == 0:
+            return []
+        if seed is None:
+            seed = random.getrandbits(32)
+
+        with time_phase("dispatch", "zoning", num_deliveries):
+            zone_labels = await asyncio.to_thread(cls._get_zone_labels, problem, seed)
+        num_zones = int(zone_labels.max()) + 1
+        zone_deliveries = [
+            np.flatnonzero(zone_labels == zone) for zone in range(num_zones)
+        ]
+        zone_riders = zones.split_riders(
+            np.bincount(zone_labels, weights=problem.volumes, minlength=num_zones),
+            problem.bag_volumes,
+        )
 
-        for rider in riders:
-            p.stdin.write(str(int(rider.bag_volume)) + "\n")
-            f.write(str(int(rider.bag_volume)) + "\n")
+        # zones beyond the solver slots queue, so each wave gets its share of what the
+        # boundary repair leaves of the budget, a zone's deadline starting once it has a
+        # slot and its share covering its grace and local search, see _solve_whole
+        num_waves = math.ceil(num_zones / get_solver_pool_size())
+        zone_time_budget = (
+            max(time_budget - settings.DISPATCH_POST_OPTIMIZE_SECONDS, 0.0) / num_waves
+            if time_budget is not None
+            else None
+        )
 
-        p.stdin.flush()
+        async def solve_zone(zone: int) -> List[List[int]]:
+            deliveries = zone_deliveries[zone]
+            zone_problem = problem.get_subproblem(deliveries, zone_riders[zone])
+            zone_problem.areas[1:] = 1 + zones.get_kmeans_labels(
+                zone_problem.latitudes[1:],
+                zone_problem.longitudes[1:],
+                zone_problem.num_riders,
+                seed,
+            )
+            try:
+                zone_orders = await cls._solve_whole(
+                    zone_problem,
+                    zone_time_budget,
+                    math.ceil(quality_target * len(deliveries) / num_deliveries)
+                    if quality_target
+                    else None,
+                    (seed + zone) % (1 << 32),
+                    num_starts,
+                )
+            except Exception:
+                # the other zones are still dispatched, this one's deliveries are left
+                # undispatched
+                logger.exception(
+                    "Zone %d of %d with %d deliveries failed, its riders get no route",
+                    zone,
+                    num_zones,
+                    len(deliveries),
+                )
+                solver_fallbacks.inc(solver="dispatch", fallback="empty_zone")
+                return [[] for _ in range(zone_problem.num_riders)]
+            # back to the delivery indices of the whole problem
+            return [cls._get_problem_order(order, deliveries) for order in zone_orders]
 
-        dispatched_delivery_tasks = []
+        zone_orders = await asyncio.gather(
+            *(solve_zone(zone) for zone in range(num_zones))
+        )
 
-        for rider_ind in range(num_riders):
+        orders: List[List[int]] = [[] for _ in range(problem.num_riders)]
+        for riders, riders_orders in zip(zone_riders, zone_orders):
+            for rider, order in zip(riders.tolist(), riders_orders):
+                orders[rider] = order
+
+        with time_phase("dispatch", "zone_repair", num_deliveries):
+            return await asyncio.to_thread(
+                cls._repair_zone_boundaries,
+                problem,
+                zone_labels,
+                zone_riders,
+                orders,
+                settings.DISPATCH_POST_OPTIMIZE_SECONDS,
+            )
 
-            order: List[int] = []
+    @classmethod
+    def _get_zone_labels(cls, problem: DispatchProblem, seed: int) -> np.ndarray:
+        latitudes, longitudes = problem.latitudes[1:], problem.longitudes[1:]
+        zone_labels = zones.get_zone_labels(
+            latitudes,
+            longitudes,
+            math.ceil(problem.num_deliveries / settings.DISPATCH_ZONE_SIZE),
+            settings.DISPATCH_ZONE_SIZE,
+            seed,
+        )
+        if zone_labels.max() + 1 > problem.num_riders:
+            # every zone needs a rider, fewer and larger zones it is
+            zone_labels = zones.get_kmeans_labels(
+                latitudes, longitudes, problem.num_riders, seed
+            )
+        return zone_labels
 
-            while True:
+    @classmethod
+    def _repair_zone_boundaries(
+        cls,
+        problem: DispatchProblem,
+        zone_labels: np.ndarray,
+        zone_riders: List[np.ndarray],
+        orders: List[List[int]],
+        time_budget: float,
+    ) -> List[List[int]]:
+        """
+        This method runs the local search on each zone and its nearest neighbour
+        together, restricted to the riders of both zones and the deliveries they serve,
+        so routes near a boundary can trade deliveries. The pairs share time_budget.
+        """
+        num_zones = len(zone_riders)
+        if num_zones < 2 or time_budget <= 0:
+            return orders
+
+        zone_sizes = np.bincount(zone_labels)
+        centers = np.column_stack(
+            [
+                np.bincount(zone_labels, weights=coordinates[1:]) / zone_sizes
+                for coordinates in (problem.latitudes, problem.longitudes)
+            ]
+        )
+        center_distances = np.sum(
+            (centers[:, None, :] - centers[None, :, :]) ** 2, axis=2
+        )
+        np.fill_diagonal(center_distances, np.inf)
+        nearest_zones = np.argmin(center_distances, axis=1).tolist()
+        pairs = sorted(
+            {
+                (min(zone, neighbour), max(zone, neighbour))
+                for zone, neighbour in enumerate(nearest_zones)
+            }
+        )
 
-                result = p.stdout.readline().strip()
-                if result == "" or result=='':
-                    break
-                result = int(result)
+        deadline = time.perf_counter() + time_budget
+        for pair_index, (zone, neighbour) in enumerate(pairs):
+            remaining_time = deadline - time.perf_counter()
+            if remaining_time <= 0:
+                break
+            riders = np.concatenate((zone_riders[zone], zone_riders[neighbour]))
+            deliveries = np.array(
+                [
+                    location - 1
+                    for rider in riders.tolist()
+                    for location in orders[rider]
+                    if location != 0
+                ],
+                dtype=np.int64,
+            )
+            pair_problem = problem.get_subproblem(deliveries, riders)
+            # the hub stays 0 in the pair problem
+            pair_locations = {0: 0}
+            pair_locations.update(
+                (int(delivery) + 1, index + 1)
+                for index, delivery in enumerate(deliveries)
+            )
+            pair_orders = RoutePostOptimizer(
+                pair_problem, pair_problem.get_distance_matrix()
+            ).optimize(
+                [
+                    [pair_locations[location] for location in orders[rider]]
+                    for rider in riders.tolist()
+                ],
+                remaining_time / (len(pairs) - pair_index),
+            )
+            for rider, pair_order in zip(riders.tolist(), pair_orders):
+                orders[rider] = cls._get_problem_order(pair_order, deliveries)
+        return orders
 
-                if result == -1:
-                    break
+    @classmethod
+    def _get_problem_order(
+        cls, order: List[int], deliveries: np.ndarray
+    ) -> List[int]:
+        """
+        This method maps an order of a subproblem holding the given deliveries back to
+        the delivery indices of the problem, a return to the hub (0) stays 0.
+        """
+        return [
+            int(deliveries[location - 1]) + 1 if location != 0 else 0
+            for location in order
+        ]
 
-                order.append(int(result) - 1)
+    @classmethod
+    async def _solve(
+        cls,
+        problem: DispatchProblem,
+        solver_arrays: SolverArrays,
+        time_budget: Optional[float],
+        quality_target: Optional[int],
+        seed: Optional[int],
+        num_starts: Optional[int],
+        warm_start: Optional[List[protocol.WarmStartOrder]] = None,
+    ) -> List[List[int]]:
+        num_riders = problem.num_riders
+        time_budget_ms = int(time_budget * 1000) if time_budget is not None else 0
+        quality_target = quality_target or 0
+
+        deadline = (
+            time_budget + SOLVER_DEADLINE_GRACE_SECONDS
+            if time_budget is not None
+            else None
+        )
 
-            for delivery_ind in order:
-                delivery_task_id = delivery_tasks[delivery_ind].id
-                rider_id = riders[rider_ind].id
-                assert delivery_task_id is not None, "Delivery task id must be provided"
-                assert rider_id is not None, "Rider id must be provided"
-                dispatched_delivery_tasks.append(
-                    DispatchedDeliveryTask(
-                        delivery_id=delivery_task_id,
-                        rider_id=rider_id,
+        if (
+            settings.SOLVER_BACKEND == "subprocess"
+            and settings.SOLVER_WIRE_FORMAT != "binary"
+            and warm_start is None
+        ):
+            with time_phase("dispatch", "encode", problem.num_deliveries):
+                payload = await asyncio.to_thread(
+                    protocol.encode_dispatch_input,
+                    settings.SOLVER_WIRE_FORMAT,
+                    *solver_arrays,
+                    time_budget_ms,
+                    quality_target,
+                )
+            problem_recorder.record("dispatch", payload)
+            try:
+                with time_phase("dispatch", "solve", problem.num_deliveries):
+                    return await get_solver_pool(DISPATCH_PROGRAM_PATH).request(
+                        payload,
+                        lambda stdout: protocol.read_dispatch_output(
+                            stdout, num_riders
+                        ),
+                        timeout=deadline,
                     )
+            except asyncio.TimeoutError:
+                solver_timeouts.inc(solver="dispatch")
+                raise
+
+        # more starts than solver slots would only queue behind each other
+        num_starts = min(
+            num_starts or settings.DISPATCH_NUM_STARTS or get_solver_pool_size(),
+            get_solver_pool_size(),
+        )
+        base_seed = seed if seed is not None else random.getrandbits(32)
+        seeds = [(base_seed + start) % (1 << 32) for start in range(num_starts)]
+
+        payload = None
+        if settings.SOLVER_BACKEND == "subprocess" or problem_recorder.enabled:
+            with time_phase("dispatch", "encode", problem.num_deliveries):
+                payload = await asyncio.to_thread(
+                    protocol.encode_dispatch_input,
+                    "binary",
+                    *solver_arrays,
+                    time_budget_ms,
+                    quality_target,
+                    warm_start=warm_start,
                 )
 
-        return dispatched_delivery_tasks
+        if settings.SOLVER_BACKEND == "native":
+            # in process solves can't be killed, the time budget bounds them instead
+            searches = [
+                native.solve_dispatch_async(
+                    *solver_arrays,
+                    time_budget_ms=time_budget_ms,
+                    quality_target=quality_target,
+                    seed=run_seed,
+                    warm_start=warm_start,
+                )
+                for run_seed in seeds
+            ]
+        else:
+            assert payload is not None
+            searches = [
+                cls._solve_with_seed(
+                    protocol.with_dispatch_seed(payload, run_seed),
+                    num_riders,
+                    deadline,
+                )
+                for run_seed in seeds
+            ]
+        with time_phase("dispatch", "solve", problem.num_deliveries):
+            results = await asyncio.gather(*searches, return_exceptions=True)
+
+        solutions = [
+            (run_seed, result)
+            for run_seed, result in zip(seeds, results)
+            if isinstance(result, protocol.DispatchIncumbent)
+        ]
+        best_seed, best = min(
+            solutions,
+            key=lambda solution: (
+                -solution[1].served_deliveries,
+                solution[1].total_route_time,
+            ),
+            default=(seeds[0], None),
+        )
+
+        # the recording carries the winning seed, replaying it reproduces the answer
+        if payload is not None:
+            problem_recorder.record(
+                "dispatch",
+                protocol.with_dispatch_seed(payload, best_seed),
+                request_id=f"{uuid.uuid4().hex}-seed{best_seed}",
+            )
+
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if best is None:
+            if len(errors) > 0:
+                raise errors[0]
+            return [[] for _ in range(num_riders)]
+        if len(errors) > 0:
+            # the answer of a search that succeeded where others failed
+            solver_fallbacks.inc(solver="dispatch", fallback="surviving_start")
+        return best.orders
 
     @classmethod
-    def _get_delivery_tasks_and_warehouse_pairwise_distance_matrix(
-        cls, delivery_tasks: List[DeliveryTaskDTO]
-    ) -> List[List[float]]:
+    async def _solve_with_seed(
+        cls, payload: bytes, num_riders: int, deadline: Optional[float]
+    ) -> Optional[protocol.DispatchIncumbent]:
         """
-        This function returns a pairwise distance matrix for a list of coordinates.
+        This method runs one seeded search and returns the best answer it streamed, or
+        None when it found no valid answer.
         """
-        coordinates = [WAREHOUSE_LOCATION.coordinate]
-        for delivery_task in delivery_tasks:
-            coordinates.append(
-                delivery_task.delivery_information.delivery_location.coordinate
+        incumbent: Optional[protocol.DispatchIncumbent] = None
+
+        async def read_incumbents(stdout: asyncio.StreamReader) -> None:
+            nonlocal incumbent
+            async for improved in protocol.read_dispatch_incumbents(
+                stdout, num_riders
+            ):
+                incumbent = improved
+
+        try:
+            await get_solver_pool(DISPATCH_PROGRAM_PATH).request(
+                payload, read_incumbents, timeout=deadline
             )
-        pairwise_distance_matrix = map_distance_service.get_pairwise_distance_matrix(
-            coordinates
-        )
-        return pairwise_distance_matrix
+        except asyncio.TimeoutError:
+            # the solver was killed, the best answer it streamed in time is used
+            solver_timeouts.inc(solver="dispatch")
+            if incumbent is None:
+                raise
+            solver_fallbacks.inc(solver="dispatch", fallback="incumbent")
+
+        return incumbent
 
     @classmethod
-    def _validate_delivery_tasks(cls, delivery_tasks: List[DeliveryTaskDTO]):
-        for delivery_task in delivery_tasks:
-            assert (
-                len(delivery_task.items) == 1
-            ), "Each delivery task must have exactly one item, currently only one item is supported"
-
-            assert (
-                delivery_task.delivery_information is not None
-            ), "Delivery task's delivery information must be provided"
-            assert (
-                delivery_task.delivery_information.delivery_location is not None
-            ), "Delivery task's delivery location must be provided"
-            assert (
-                delivery_task.delivery_information.delivery_location.coordinate
-                is not None
-            ), "Delivery task's delivery location coordinate must be provided"
-            assert (
-                delivery_task.delivery_information.expected_delivery_time is not None
-            ), "Delivery task's expected delivery time must be provided"
-            expected_delivery_time = delivery_task.delivery_information.expected_delivery_time
-            warehouse_day_start = WarehouseClock().get_day_start_timestamp()
-            
-            # Ensure both datetimes are timezone-aware for comparison
-            if expected_delivery_time.tzinfo is None:
-                expected_delivery_time = expected_delivery_time.replace(tzinfo=datetime.timezone.utc)
-            
-            assert (
-                expected_delivery_time > warehouse_day_start
-            ), "Delivery task's expected delivery time must be in the future"
-
-            item = Item(**delivery_task.items[0].model_dump())
-            assert (
-                item.tool_scan_information is not None
-            ), "Item's tool scan information must be provided"
-            assert (
-                item.tool_scan_information.volume > 0
-            ), "Item's volume must be greater than 0"
+    def _get_fingerprint(
+        cls,
+        problem: DispatchProblem,
+        time_budget: Optional[float],
+        quality_target: Optional[int],
+        seed: Optional[int],
+        num_starts: Optional[int],
+    ) -> str:
+        """
+        This method returns the solution cache key of a dispatch, covering the solver
+        build and every setting the answer depends on.
+        """
+        solver_path = (
+            native.DISPATCH_LIBRARY_PATH
+            if settings.SOLVER_BACKEND == "native"
+            else DISPATCH_PROGRAM_PATH
+        )
+        return get_problem_fingerprint(
+            problem,
+            solver_version=get_file_version(solver_path),
+            protocol_version=protocol.DISPATCH_PROTOCOL_VERSION,
+            time_budget=time_budget,
+            quality_target=quality_target,
+            seed=seed,
+            num_starts=num_starts or settings.DISPATCH_NUM_STARTS,
+            solver_backend=settings.SOLVER_BACKEND,
+            solver_wire_format=settings.SOLVER_WIRE_FORMAT,
+            post_optimize_seconds=settings.DISPATCH_POST_OPTIMIZE_SECONDS,
+            decomposition_threshold=settings.DISPATCH_DECOMPOSITION_THRESHOLD,
+            zone_size=settings.DISPATCH_ZONE_SIZE,
+            distance_noise_mode=settings.DISTANCE_NOISE_MODE,
+            distance_noise_seed=settings.DISTANCE_NOISE_SEED,
+        )
 
     @classmethod
-    def _validate_riders(cls, riders: List[Rider]):
+    def _get_warm_start_problem(
+        cls,
+        delivery_tasks_batches: List[DeliveryTasksBatchDTO],
+        delivery_tasks: List[DeliveryTaskDTO],
+        riders: List[Rider],
+    ) -> Tuple[DispatchProblem, List[protocol.WarmStartOrder]]:
+        """
+        This method builds the problem of redispatch, the batch tasks followed by the new
+        delivery tasks, and the warm start holding each rider's current order.
+        """
+        rider_batches = {
+            delivery_tasks_batch.rider.id: delivery_tasks_batch
+            for delivery_tasks_batch in delivery_tasks_batches
+        }
+        assert len(rider_batches) == len(
+            delivery_tasks_batches
+        ), "Each rider must have at most one delivery tasks batch"
+        assert set(rider_batches) <= set(
+            rider.id for rider in riders
+        ), "The riders must include the riders of the delivery tasks batches"
+
+        all_delivery_tasks: List[DeliveryTaskDTO] = []
+        warm_start: List[protocol.WarmStartOrder] = []
         for rider in riders:
-            assert rider.bag_volume > 0, "Rider's bag volume must be greater than 0"
+            delivery_tasks_batch = rider_batches.get(rider.id)
+            if delivery_tasks_batch is None:
+                warm_start.append(protocol.WarmStartOrder([], 0))
+                continue
+            batch_delivery_tasks = [
+                task.delivery_task
+                for task in sorted(
+                    delivery_tasks_batch.tasks, key=lambda task: task.order_key
+                )
+            ]
+            fixed_count = len(delivery_tasks_batch.get_fixed_tasks())
+            first_location = len(all_delivery_tasks) + 1
+            warm_start.append(
+                protocol.WarmStartOrder(
+                    list(
+                        range(
+                            first_location, first_location + len(batch_delivery_tasks)
+                        )
+                    ),
+                    fixed_count,
+                )
+            )
+            all_delivery_tasks.extend(batch_delivery_tasks)
+        all_delivery_tasks.extend(delivery_tasks)
+
+        return cls._get_problem(all_delivery_tasks, riders), warm_start
+
+    @classmethod
+    def _get_problem(
+        cls,
+        delivery_tasks: List[DeliveryTaskDTO],
+        riders: List[Rider],
+    ) -> DispatchProblem:
+        """
+        This method builds and validates the columnar problem, it is CPU bound and runs
+        off the event loop.
+        """
+        with time_phase("dispatch", "problem", len(delivery_tasks)):
+            problem = DispatchProblem.from_dtos(delivery_tasks, riders)
+        with time_phase("dispatch", "validate", len(delivery_tasks)):
+            problem.validate()
+        return problem
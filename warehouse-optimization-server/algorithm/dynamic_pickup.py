@@ -1,4 +1,5 @@
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+import asyncio
 import datetime
 from beanie import PydanticObjectId
 from ..models.delivery import DeliveryStatus
@@ -11,20 +12,97 @@ from ..models.rider import Rider
 from .dto import DispatchedDeliveryTask
 from ..clock import WarehouseClock
 from ..models.item import Item
-from subprocess import Popen, PIPE
 import copy
+import numpy as np
 from .map import distance as map_distance_service
+from . import native, protocol
+from .recorder import problem_recorder
+from .solver_pool import PICKUP_PROGRAM_PATH, get_solver_pool
 from ..constants import WAREHOUSE_LOCATION
+from ..schemas import Coordinate
+from ..metrics import time_phase
+from ..settings import settings
 
 
 class DynamicPickupAlgorithm:
     @classmethod
-    def add_pickup(
+    async def add_pickup(
         cls,
         delivery_task: DeliveryTaskDTO,
         delivery_tasks_batches: List[DeliveryTasksBatchDTO] | None,
     ) -> PickupDeliveryBatchAssignmentDTO:
+        # the phases are timed by the number of tasks in the batches
+        num_tasks = sum(
+            len(delivery_tasks_batch.tasks)
+            for delivery_tasks_batch in delivery_tasks_batches or []
+        )
+        with time_phase("pickup", "solver_input", num_tasks):
+            solver_input = await asyncio.to_thread(
+                cls._get_solver_input, delivery_task, delivery_tasks_batches
+            )
+        if solver_input is None:
+            return PickupDeliveryBatchAssignmentDTO(
+                assigned_delivery_tasks_batch_id=None,
+                after_task_index=None,
+            )
+        (
+            solver_arguments,
+            delivery_tasks_batches,
+            num_tasks_removed_delivery_task_batch,
+        ) = solver_input
+
+        if settings.SOLVER_BACKEND == "native":
+            if problem_recorder.enabled:
+                problem_recorder.record(
+                    "pickup", protocol.encode_pickup_input("binary", *solver_arguments)
+                )
+            with time_phase("pickup", "solve", num_tasks):
+                batch_index, after_task_index = await native.solve_pickup_async(
+                    *solver_arguments
+                )
+        else:
+            with time_phase("pickup", "encode", num_tasks):
+                payload = protocol.encode_pickup_input(
+                    settings.SOLVER_WIRE_FORMAT, *solver_arguments
+                )
+            problem_recorder.record("pickup", payload)
+            with time_phase("pickup", "solve", num_tasks):
+                batch_index, after_task_index = await get_solver_pool(
+                    PICKUP_PROGRAM_PATH
+                ).request(payload, protocol.read_pickup_output)
+        if batch_index == -1:
+            return PickupDeliveryBatchAssignmentDTO(
+                assigned_delivery_tasks_batch_id=None,
+                after_task_index=None,
+            )
+        assigned_delivery_tasks_batch_id = delivery_tasks_batches[batch_index].id
+
+        after_task_index = max(after_task_index, 0)
+        
+        if assigned_delivery_tasks_batch_id is not None:
+            after_task_index += num_tasks_removed_delivery_task_batch.get(
+                assigned_delivery_tasks_batch_id, 0
+            )  # this is to account for the tasks that were removed from the batch
+
+        return PickupDeliveryBatchAssignmentDTO(
+            assigned_delivery_tasks_batch_id=assigned_delivery_tasks_batch_id,
+            after_task_index=after_task_index,
+        )
 
+    @classmethod
+    def _get_solver_input(
+        cls,
+        delivery_task: DeliveryTaskDTO,
+        delivery_tasks_batches: List[DeliveryTasksBatchDTO] | None,
+    ) -> Optional[
+        Tuple[tuple, List[DeliveryTasksBatchDTO], dict[PydanticObjectId, int]]
+    ]:
+        """
+        This method returns the arguments of the pickup solver, in the order of
+        protocol.encode_pickup_input, along with the pending batches they refer to,
+        or returns None when no batch can take the pickup. It is CPU bound and runs
+        off the event loop.
+        """
         delivery_tasks_batches = copy.deepcopy(delivery_tasks_batches)
         original_delivery_tasks_batches = copy.deepcopy(delivery_tasks_batches)
 
@@ -46,10 +124,7 @@ class DynamicPickupAlgorithm:
         cls._validate_delivery_tasks_batches(delivery_tasks_batches)
 
         if len(delivery_tasks_batches) == 0:
-            return PickupDeliveryBatchAssignmentDTO(
-                assigned_delivery_tasks_batch_id=None,
-                after_task_index=None,
-            )
+            return None
 
         current_time = datetime.datetime.now(datetime.timezone.utc)
 
@@ -62,48 +137,23 @@ class DynamicPickupAlgorithm:
             pickup_item.tool_scan_information is not None
         ), "Pickup item must have tool scan information"
 
-        num_riders = len(delivery_tasks_batches)
-
         delivery_task_to_pickup_distance_map = (
             cls._get_delivery_task_to_pickup_distance_map(
                 pickup_item, delivery_tasks_batches
             )
         )
 
-        program_path = "./algorithm/runnable/bin/pickup.exe"
-
-        p = Popen(program_path, stdout=PIPE, stdin=PIPE, encoding="utf8")
-        f = open("./algorithm/runnable/pickup_input.in", "w", encoding="utf8")
-
-        p.stdin.write(str(int(pickup_addition_time_delta_seconds)) + "\n")
-        f.write(str(int(pickup_addition_time_delta_seconds)) + "\n")
-
-        p.stdin.write(str(int(pickup_item.tool_scan_information.volume)) + "\n")
-        f.write(str(int(pickup_item.tool_scan_information.volume)) + "\n")
-
-        p.stdin.write(str(int(pickup_addition_time_delta_seconds)) + "\n")
-        f.write(str(int(pickup_addition_time_delta_seconds)) + "\n")
-
-        p.stdin.write(str(num_riders) + "\n")
-        f.write(str(num_riders) + "\n")
-
-        for delivery_tasks_batch in delivery_tasks_batches:
-            p.stdin.write(str(int(delivery_tasks_batch.rider.bag_volume)) + "\n")
-            f.write(str(int(delivery_tasks_batch.rider.bag_volume)) + "\n")
-
+        first_task_times: List[int] = []
+        tasks: List[np.ndarray] = []
         for delivery_tasks_batch in delivery_tasks_batches:
-            num_tasks = len(delivery_tasks_batch.tasks)
-            p.stdin.write(str(num_tasks) + "\n")
-            f.write(str(num_tasks) + "\n")
-
             # first task time is basically the time that the current task will take to complete
             first_task_time = cls._get_time_for_delivery_task_segment(
                 delivery_tasks_batch.tasks[0].delivery_task, delivery_tasks_batch
             )
-            p.stdin.write(str(int(first_task_time)) + "\n")
-            f.write(str(int(first_task_time)) + "\n")
+            first_task_times.append(int(first_task_time))
 
-            for task in delivery_tasks_batch.tasks:
+            rider_tasks = np.empty((len(delivery_tasks_batch.tasks), 5), dtype=np.int64)
+            for task_ind, task in enumerate(delivery_tasks_batch.tasks):
                 task_item = task.delivery_task.items[0]
                 task_type = (
                     0
@@ -132,48 +182,31 @@ class DynamicPickupAlgorithm:
                     task_item.tool_scan_information is not None
                 ), "Task item must have tool scan information"
 
-                p.stdin.write(str(int(task_item.tool_scan_information.volume)) + "\n")
-                p.stdin.write(str(task_type) + "\n")
-                p.stdin.write(str(int(expected_delivery_time_delta)) + "\n")
-                p.stdin.write(str(int(time_next)) + "\n")
-                p.stdin.write(str(int(time_from_pickup)) + "\n")
-
-                f.write(
-                    str(int(task_item.tool_scan_information.volume))
-                    + " "
-                    + str(task_type)
-                    + " "
-                    + str(int(expected_delivery_time_delta))
-                    + " "
-                    + str(int(time_next))
-                    + " "
-                    + str(int(time_from_pickup))
+                rider_tasks[task_ind] = (
+                    int(task_item.tool_scan_information.volume),
+                    task_type,
+                    int(expected_delivery_time_delta),
+                    int(time_next),
+                    int(time_from_pickup),
                 )
-                f.write("\n")
-
-        f.write("\n")
-
-        p.stdin.flush()
-
-        batch_index = int(p.stdout.readline().strip())
-        if batch_index == -1:
-            return PickupDeliveryBatchAssignmentDTO(
-                assigned_delivery_tasks_batch_id=None,
-                after_task_index=None,
-            )
-        assigned_delivery_tasks_batch_id = delivery_tasks_batches[batch_index].id
-
-        after_task_index = int(p.stdout.readline().strip())
-        after_task_index = max(after_task_index, 0)
-        
-        if assigned_delivery_tasks_batch_id is not None:
-            after_task_index += num_tasks_removed_delivery_task_batch.get(
-                assigned_delivery_tasks_batch_id, 0
-            )  # this is to account for the tasks that were removed from the batch
+            tasks.append(rider_tasks)
+
+        solver_arguments = (
+            int(pickup_addition_time_delta_seconds),
+            int(pickup_item.tool_scan_information.volume),
+            int(pickup_addition_time_delta_seconds),
+            [
+                int(delivery_tasks_batch.rider.bag_volume)
+                for delivery_tasks_batch in delivery_tasks_batches
+            ],
+            first_task_times,
+            tasks,
+        )
 
-        return PickupDeliveryBatchAssignmentDTO(
-            assigned_delivery_tasks_batch_id=assigned_delivery_tasks_batch_id,
-            after_task_index=after_task_index,
+        return (
+            solver_arguments,
+            delivery_tasks_batches,
+            num_tasks_removed_delivery_task_batch,
         )
 
     @classmethod
@@ -224,19 +257,28 @@ class DynamicPickupAlgorithm:
         assert (
             pickup_item.item_location is not None
         ), "Pickup item must have item location"
-        res: dict[PydanticObjectId, float] = {}
+        delivery_task_ids: List[PydanticObjectId] = []
+        coordinates: List[Coordinate] = []
         for delivery_tasks_batch in delivery_tasks_batches:
             for task in delivery_tasks_batch.tasks:
                 assert (
                     task.delivery_task.id is not None
                 ), "Delivery task id must be provided"
-                distance = map_distance_service.get_simulated_temporal_distance(
-                    pickup_item.item_location.coordinate,
-                    task.delivery_task.delivery_information.delivery_location.coordinate,
+                delivery_task_ids.append(task.delivery_task.id)
+                coordinates.append(
+                    task.delivery_task.delivery_information.delivery_location.coordinate
                 )
-                res[task.delivery_task.id] = distance
 
-        return res
+        latitudes, longitudes = map_distance_service.get_coordinate_arrays(coordinates)
+        pickup_coordinate = pickup_item.item_location.coordinate
+        distances = map_distance_service.get_simulated_temporal_distances(
+            pickup_coordinate.latitude,
+            pickup_coordinate.longitude,
+            latitudes,
+            longitudes,
+        )
+
+        return dict(zip(delivery_task_ids, distances.tolist()))
 
     @classmethod
     def _get_num_tasks_removed_delivery_task_batches(
@@ -1,8 +1,67 @@
-from typing import List
+from typing import List, Tuple
+from functools import lru_cache
 from ...schemas import Coordinate
+from ...settings import settings
 from .utils import toRadians
 import math
 import random
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0
+
+# (upper bound of road distance in km, average speed in km/h), short trips are slower due to stops
+SPEED_BANDS_KM = np.array([2.0, 10.0, 30.0])
+SPEED_BANDS_KMH = np.array([15.0, 25.0, 35.0, 50.0])
+
+# rows of the matrix computed per vectorized pass, bounds the size of the temporaries
+MATRIX_ROW_BLOCK_SIZE = 512
+
+DETERMINISTIC_DISTANCE_CACHE_SIZE = 1 << 16
+
+_rng = np.random.default_rng()
+
+_UINT64_MASK = (1 << 64) - 1
+
+
+def _splitmix64(values: np.ndarray) -> np.ndarray:
+    """
+    SplitMix64 finalizer over uint64 arrays, wrapping arithmetic is intended.
+    """
+    z = values + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def _get_coordinate_hashes(
+    latitudes: np.ndarray, longitudes: np.ndarray, seed: int
+) -> np.ndarray:
+    latitude_bits = np.ascontiguousarray(latitudes).view(np.uint64)
+    longitude_bits = np.ascontiguousarray(longitudes).view(np.uint64)
+    return _splitmix64(
+        latitude_bits ^ _splitmix64(longitude_bits ^ np.uint64(seed & _UINT64_MASK))
+    )
+
+
+def _get_deterministic_variation(
+    latitudes1: np.ndarray,
+    longitudes1: np.ndarray,
+    latitudes2: np.ndarray,
+    longitudes2: np.ndarray,
+    variability: float,
+) -> np.ndarray:
+    """
+    Returns noise in [-variability, variability) derived from the seed and the unordered
+    pair of coordinates, so A->B and B->A always get the same perturbation.
+    """
+    seed = settings.DISTANCE_NOISE_SEED
+    pair_hashes = _splitmix64(
+        _get_coordinate_hashes(latitudes1, longitudes1, seed)
+        ^ _get_coordinate_hashes(latitudes2, longitudes2, seed)
+    )
+    unit = (pair_hashes >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+    return (2 * unit - 1) * variability
 
 
 def get_simulated_temporal_distance(
@@ -18,7 +77,26 @@ def get_simulated_temporal_distance(
     - detour_factor: accounts for road curves and non-straight routes (1.25 typical)
     - elevation_diff_m: positive elevation gain slows travel
     - variability: random percentage variation to simulate real-world unpredictability
+
+    In deterministic noise mode the result only depends on the unordered pair of
+    coordinates and the configured seed, and is cached.
     """
+    if settings.DISTANCE_NOISE_MODE == "deterministic":
+        pair = sorted(
+            [
+                (coordinate1.latitude, coordinate1.longitude),
+                (coordinate2.latitude, coordinate2.longitude),
+            ]
+        )
+        return _get_deterministic_temporal_distance(
+            *pair[0],
+            *pair[1],
+            detour_factor,
+            elevation_diff_m,
+            variability,
+            settings.DISTANCE_NOISE_SEED,
+        )
+
     # Convert coordinates to radians
     lat1, lng1 = toRadians(coordinate1.latitude), toRadians(coordinate1.longitude)
     lat2, lng2 = toRadians(coordinate2.latitude), toRadians(coordinate2.longitude)
@@ -33,7 +111,7 @@ def get_simulated_temporal_distance(
         + math.cos(lat1) * math.cos(lat2) * math.sin(delta_lng / 2) ** 2
     )
     c = 2 * math.asin(math.sqrt(a))
-    R = 6371.0  # Earth radius in km
+    R = EARTH_RADIUS_KM  # Earth radius in km
     distance_km = c * R
 
     # Apply road network detour factor
@@ -67,20 +145,133 @@ def get_simulated_temporal_distance(
     return distance
 
 
-def get_pairwise_distance_matrix(coordinates: List[Coordinate]) -> List[List[int]]:
+@lru_cache(maxsize=DETERMINISTIC_DISTANCE_CACHE_SIZE)
+def _get_deterministic_temporal_distance(
+    latitude1: float,
+    longitude1: float,
+    latitude2: float,
+    longitude2: float,
+    detour_factor: float,
+    elevation_diff_m: float,
+    variability: float,
+    seed: int,  # part of the cache key only
+) -> int:
+    return int(
+        get_simulated_temporal_distances(
+            np.array([latitude1]),
+            np.array([longitude1]),
+            np.array([latitude2]),
+            np.array([longitude2]),
+            detour_factor,
+            elevation_diff_m,
+            variability,
+        )[0]
+    )
+
+
+def get_simulated_temporal_distances(
+    latitudes1: np.ndarray,
+    longitudes1: np.ndarray,
+    latitudes2: np.ndarray,
+    longitudes2: np.ndarray,
+    detour_factor: float = 1.25,
+    elevation_diff_m: float = 0.0,
+    variability: float = 0.1,
+) -> np.ndarray:
     """
-    This function returns a pairwise distance matrix for a list of coordinates.
+    Vectorized counterpart of get_simulated_temporal_distance.
+
+    The coordinate arrays are broadcast against each other, so passing column and row
+    vectors yields a full matrix of travel times in seconds (int32) in a single pass.
+    Every term of the model is symmetric in its two endpoints, so in deterministic
+    noise mode the result for (A, B) is bit-identical to the one for (B, A).
     """
-    num_coordinates = len(coordinates)
-    distance_matrix = [[0] * num_coordinates for _ in range(num_coordinates)]
-
-    for i in range(num_coordinates):
-        for j in range(num_coordinates):
-            if i == j:
-                distance_matrix[i][j] = 0
-            else:
-                distance_matrix[i][j] = get_simulated_temporal_distance(
-                    coordinates[i], coordinates[j]
-                )
+    latitudes1 = np.asarray(latitudes1, dtype=np.float64)
+    longitudes1 = np.asarray(longitudes1, dtype=np.float64)
+    latitudes2 = np.asarray(latitudes2, dtype=np.float64)
+    longitudes2 = np.asarray(longitudes2, dtype=np.float64)
 
+    lat1, lng1 = toRadians(latitudes1), toRadians(longitudes1)
+    lat2, lng2 = toRadians(latitudes2), toRadians(longitudes2)
+
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    road_distance_km = 2 * np.arcsin(np.sqrt(a)) * EARTH_RADIUS_KM * detour_factor
+
+    avg_speed_kmh = SPEED_BANDS_KMH[
+        np.searchsorted(SPEED_BANDS_KM, road_distance_km, side="right")
+    ]
+
+    if elevation_diff_m > 0:
+        avg_speed_kmh = avg_speed_kmh * (1 - min(elevation_diff_m / 1000 * 0.05, 0.15))
+
+    estimated_time_seconds = road_distance_km / avg_speed_kmh * 3600
+    if settings.DISTANCE_NOISE_MODE == "deterministic":
+        estimated_time_seconds *= 1 + _get_deterministic_variation(
+            latitudes1, longitudes1, latitudes2, longitudes2, variability
+        )
+    else:
+        estimated_time_seconds *= 1 + _rng.uniform(
+            -variability, variability, size=estimated_time_seconds.shape
+        )
+
+    return np.rint(estimated_time_seconds).astype(np.int32)
+
+
+def get_coordinate_arrays(
+    coordinates: List[Coordinate],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    This function returns the latitudes and longitudes of a list of coordinates as arrays.
+    """
+    latitudes = np.fromiter(
+        (coordinate.latitude for coordinate in coordinates),
+        dtype=np.float64,
+        count=len(coordinates),
+    )
+    longitudes = np.fromiter(
+        (coordinate.longitude for coordinate in coordinates),
+        dtype=np.float64,
+        count=len(coordinates),
+    )
+    return latitudes, longitudes
+
+
+def get_pairwise_distance_matrix_from_arrays(
+    latitudes: np.ndarray, longitudes: np.ndarray
+) -> np.ndarray:
+    """
+    This function returns the (n, n) int32 travel time matrix for coordinate arrays,
+    computed in row blocks to keep the temporaries bounded for large n.
+
+    In deterministic noise mode the matrix is symmetric, so only the blocks on and above
+    the diagonal are computed and mirrored into the lower triangle.
+    """
+    num_coordinates = len(latitudes)
+    distance_matrix = np.empty((num_coordinates, num_coordinates), dtype=np.int32)
+    symmetric = settings.DISTANCE_NOISE_MODE == "deterministic"
+
+    for start in range(0, num_coordinates, MATRIX_ROW_BLOCK_SIZE):
+        stop = min(start + MATRIX_ROW_BLOCK_SIZE, num_coordinates)
+        first_column = start if symmetric else 0
+        block = get_simulated_temporal_distances(
+            latitudes[start:stop, None],
+            longitudes[start:stop, None],
+            latitudes[None, first_column:],
+            longitudes[None, first_column:],
+        )
+        distance_matrix[start:stop, first_column:] = block
+        if symmetric:
+            distance_matrix[start:, start:stop] = block.T
+
+    np.fill_diagonal(distance_matrix, 0)
     return distance_matrix
+
+
+def get_pairwise_distance_matrix(coordinates: List[Coordinate]) -> np.ndarray:
+    """
+    This function returns a pairwise distance matrix for a list of coordinates.
+    """
+    return get_pairwise_distance_matrix_from_arrays(*get_coordinate_arrays(coordinates))
@@ -0,0 +1,223 @@
+"""
+In-process binding of the solvers, an alternative to the solver processes of
+solver_pool.py selected with SOLVER_BACKEND = "native".
+
+Both solvers build as shared libraries exposing a C entry point, with make libraries
+in algorithm/runnable or by hand from algorithm/runnable/source:
+
+    g++ -O2 -shared -fPIC -DWDO_SHARED_LIBRARY -o ../bin/libdispatch.so Dispatch_Algorithm.cpp
+    g++ -O2 -shared -fPIC -DWDO_SHARED_LIBRARY -o ../bin/libpickup.so Pickup_Algorithm.cpp
+
+(dispatch.dll and pickup.dll on Windows). The problem arrays are handed over as pointers
+to their NumPy buffers, without any serialization, and the orders come back in a
+preallocated int32 buffer. ctypes releases the GIL for the duration of the call, so
+solves running on worker threads use as many cores as the solver semaphore allows. A
+solve in process can't be killed, it is bounded by its time budget instead.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import ctypes
+import sys
+import threading
+
+import numpy as np
+
+from ..metrics import solver_crashes
+from . import protocol
+from .solver_pool import get_solver_semaphore
+
+
+if sys.platform == "win32":
+    DISPATCH_LIBRARY_PATH = "./algorithm/runnable/bin/dispatch.dll"
+    PICKUP_LIBRARY_PATH = "./algorithm/runnable/bin/pickup.dll"
+else:
+    DISPATCH_LIBRARY_PATH = "./algorithm/runnable/bin/libdispatch.so"
+    PICKUP_LIBRARY_PATH = "./algorithm/runnable/bin/libpickup.so"
+
+# return codes of the entry points
+WDO_OK = 0
+WDO_ORDERS_TOO_SMALL = 1
+WDO_ERROR = 2
+
+_int32_array = np.ctypeslib.ndpointer(dtype=np.int32, flags="C_CONTIGUOUS")
+_float64_array = np.ctypeslib.ndpointer(dtype=np.float64, flags="C_CONTIGUOUS")
+_int_pointer = ctypes.POINTER(ctypes.c_int)
+
+_libraries: Dict[str, ctypes.CDLL] = {}
+_libraries_lock = threading.Lock()
+
+
+def _get_library(path: str) -> ctypes.CDLL:
+    with _libraries_lock:
+        if path not in _libraries:
+            library = ctypes.CDLL(path)
+            if hasattr(library, "wdo_dispatch_solve"):
+                library.wdo_dispatch_solve.restype = ctypes.c_int
+                library.wdo_dispatch_solve.argtypes = [
+                    ctypes.c_int,  # num_items
+                    ctypes.c_int,  # num_riders
+                    _int32_array,  # distance matrix
+                    _int32_array,  # item volumes
+                    _int32_array,  # expected delivery time deltas
+                    _float64_array,  # coordinates
+                    _int32_array,  # areas
+                    _int32_array,  # rider bag volumes
+                    ctypes.c_int,  # time_budget_ms
+                    ctypes.c_int,  # quality_target
+                    ctypes.c_uint,  # seed
+                    _int32_array,  # warm start
+                    ctypes.c_int,  # warm start length
+                    _int32_array,  # orders
+                    ctypes.c_int,  # orders capacity
+                    _int_pointer,  # orders length
+                    _int_pointer,  # served deliveries
+                    ctypes.POINTER(ctypes.c_longlong),  # total route time
+                ]
+            if hasattr(library, "wdo_pickup_solve"):
+                library.wdo_pickup_solve.restype = ctypes.c_int
+                library.wdo_pickup_solve.argtypes = [
+                    ctypes.c_int,  # current_time
+                    ctypes.c_int,  # item_volume
+                    ctypes.c_int,  # item_entry_time
+                    ctypes.c_int,  # num_riders
+                    _int32_array,  # rider bag volumes
+                    _int32_array,  # number of tasks per rider
+                    _int32_array,  # first task time per rider
+                    _int32_array,  # tasks
+                    _int_pointer,  # batch index
+                    _int_pointer,  # after task index
+                ]
+            _libraries[path] = library
+        return _libraries[path]
+
+
+def _int32(values) -> np.ndarray:
+    return np.ascontiguousarray(values, dtype=np.int32)
+
+
+def _split_orders(orders: np.ndarray) -> List[List[int]]:
+    split_orders: List[List[int]] = [[]]
+    for location in orders.tolist():
+        if location == protocol.END_OF_ORDER:
+            split_orders.append([])
+        else:
+            split_orders[-1].append(location)
+    return split_orders[:-1]
+
+
+def solve_dispatch(
+    distance_matrix: np.ndarray,
+    volumes: np.ndarray,
+    expected_delivery_time_deltas: np.ndarray,
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    areas: np.ndarray,
+    bag_volumes: np.ndarray,
+    time_budget_ms: int = 0,
+    quality_target: int = 0,
+    seed: int = 0,
+    warm_start: Optional[List[protocol.WarmStartOrder]] = None,
+) -> Optional[protocol.DispatchIncumbent]:
+    """
+    Solves a dispatch problem in process, takes the arguments of
+    protocol.encode_dispatch_input and returns the best answer, or None when the solver
+    found no valid answer.
+    """
+    num_items = len(volumes)
+    num_riders = len(bag_volumes)
+    # each delivery once with a hub return before it, plus a hub return and -1 per rider
+    orders = np.empty(2 * (num_items + num_riders), dtype=np.int32)
+    orders_length = ctypes.c_int()
+    served_deliveries = ctypes.c_int()
+    total_route_time = ctypes.c_longlong()
+    warm_start_block = protocol.get_warm_start_block(warm_start or [])
+
+    status = _get_library(DISPATCH_LIBRARY_PATH).wdo_dispatch_solve(
+        num_items,
+        num_riders,
+        _int32(distance_matrix),
+        _int32(volumes),
+        _int32(expected_delivery_time_deltas),
+        np.ascontiguousarray(np.column_stack([latitudes, longitudes]), dtype=np.float64),
+        _int32(areas),
+        _int32(bag_volumes),
+        time_budget_ms,
+        quality_target,
+        seed,
+        warm_start_block,
+        len(warm_start_block),
+        orders,
+        len(orders),
+        ctypes.byref(orders_length),
+        ctypes.byref(served_deliveries),
+        ctypes.byref(total_route_time),
+    )
+    if status == WDO_ORDERS_TOO_SMALL:
+        raise RuntimeError(
+            f"Dispatch answer of {orders_length.value} values exceeds its buffer"
+        )
+    if status != WDO_OK:
+        raise RuntimeError("Dispatch solver failed")
+
+    if served_deliveries.value < 0:
+        return None
+    return protocol.DispatchIncumbent(
+        served_deliveries.value,
+        total_route_time.value,
+        _split_orders(orders[: orders_length.value]),
+    )
+
+
+def solve_pickup(
+    current_time: int,
+    item_volume: int,
+    item_entry_time: int,
+    bag_volumes: np.ndarray,
+    first_task_times: np.ndarray,
+    tasks: List[np.ndarray],
+) -> Tuple[int, int]:
+    """
+    Solves a pickup problem in process, takes the arguments of
+    protocol.encode_pickup_input and returns the (batch index, after task index) pair.
+    """
+    num_tasks = [len(rider_tasks) for rider_tasks in tasks]
+    all_tasks = (
+        np.concatenate(tasks) if len(tasks) > 0 else np.empty((0, 5), dtype=np.int32)
+    )
+    batch_index = ctypes.c_int()
+    after_task_index = ctypes.c_int()
+
+    status = _get_library(PICKUP_LIBRARY_PATH).wdo_pickup_solve(
+        current_time,
+        item_volume,
+        item_entry_time,
+        len(bag_volumes),
+        _int32(bag_volumes),
+        _int32(num_tasks),
+        _int32(first_task_times),
+        _int32(all_tasks),
+        ctypes.byref(batch_index),
+        ctypes.byref(after_task_index),
+    )
+    if status != WDO_OK:
+        raise RuntimeError("Pickup solver failed")
+    return batch_index.value, after_task_index.value
+
+
+async def solve_dispatch_async(*args, **kwargs) -> Optional[protocol.DispatchIncumbent]:
+    async with get_solver_semaphore():
+        try:
+            return await asyncio.to_thread(solve_dispatch, *args, **kwargs)
+        except RuntimeError:
+            solver_crashes.inc(solver="dispatch")
+            raise
+
+
+async def solve_pickup_async(*args, **kwargs) -> Tuple[int, int]:
+    async with get_solver_semaphore():
+        try:
+            return await asyncio.to_thread(solve_pickup, *args, **kwargs)
+        except RuntimeError:
+            solver_crashes.inc(solver="pickup")
+            raise
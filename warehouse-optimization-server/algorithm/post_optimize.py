@@ -0,0 +1,315 @@
+"""
+Local search over the routes returned by the dispatch solver.
+
+The solver's answer is improved with intra-route 2-opt and Or-opt moves and inter-route
+relocate and swap moves. The move deltas of a neighbourhood are computed at once with
+NumPy on the distance matrix, and improving moves are tried from the best down until one
+passes the feasibility check. A route is feasible when its deliveries fit in the rider's
+bag, every delivery is reached by its expected delivery time and the rider is back at
+the hub by REACH_HUB_BEFORE_SECONDS, the model of dispatch.exe where each rider leaves
+the hub once at the start of the day.
+
+Moves only reorder and reassign served deliveries, so the number served never drops and
+the total route time only decreases. The search stops at a local optimum or when its
+time budget is spent.
+"""
+
+from typing import List, Set
+import logging
+import time
+
+import numpy as np
+
+from .problem import DispatchProblem
+
+
+logger = logging.getLogger(__name__)
+
+# riders must be back at the hub before this time, as in dispatch.exe
+REACH_HUB_BEFORE_SECONDS = 46800
+# longest chain of consecutive deliveries moved by Or-opt
+MAX_OR_OPT_SEGMENT_LENGTH = 3
+
+
+class RoutePostOptimizer:
+    def __init__(self, problem: DispatchProblem, distance_matrix: np.ndarray):
+        self.distance_matrix = distance_matrix.astype(np.int64)
+        # per location columns, index 0 is the hub
+        self.volumes = np.concatenate(([0], problem.volumes)).astype(np.int64)
+        self.expected_delivery_time_deltas = np.concatenate(
+            ([0], problem.expected_delivery_time_deltas)
+        ).astype(np.int64)
+        self.bag_volumes = problem.bag_volumes.astype(np.int64)
+        self.routes: List[np.ndarray] = []
+        self.frozen_riders: Set[int] = set()
+        self.deadline = 0.0
+
+    def optimize(self, orders: List[List[int]], time_budget: float) -> List[List[int]]:
+        """
+        This method returns the orders improved within time_budget seconds. Orders with
+        hub returns mid route are returned unchanged, they are outside the route model.
+        """
+        if time_budget <= 0 or any(0 in order for order in orders):
+            return orders
+
+        self.deadline = time.perf_counter() + time_budget
+        self.routes = [np.array(order, dtype=np.int64) for order in orders]
+        # routes the solver returned outside the model are left as they are, the
+        # previous call's frozen riders are cleared first since feasibility checks them
+        self.frozen_riders = set()
+        self.frozen_riders = {
+            rider
+            for rider, route in enumerate(self.routes)
+            if not self._is_feasible(rider, route)
+        }
+        initial_time = self.get_total_route_time()
+
+        improved = True
+        while improved and not self._is_out_of_time():
+            improved = False
+            for rider in range(len(self.routes)):
+                while self._two_opt(rider) or self._or_opt(rider):
+                    improved = True
+            while self._relocate() or self._swap():
+                improved = True
+
+        logger.info(
+            "Post optimization took the total route time from %s to %s, %s routes frozen",
+            initial_time,
+            self.get_total_route_time(),
+            len(self.frozen_riders),
+        )
+        return [route.tolist() for route in self.routes]
+
+    def get_total_route_time(self) -> int:
+        return sum(self._get_route_time(route) for route in self.routes)
+
+    def _is_out_of_time(self) -> bool:
+        return time.perf_counter() >= self.deadline
+
+    def _get_path(self, route: np.ndarray) -> np.ndarray:
+        return np.concatenate(([0], route, [0])).astype(np.int64)
+
+    def _get_route_time(self, route: np.ndarray) -> int:
+        path = self._get_path(route)
+        return int(self.distance_matrix[path[:-1], path[1:]].sum())
+
+    def _is_feasible(self, rider: int, route: np.ndarray) -> bool:
+        if rider in self.frozen_riders:
+            return False
+        if len(route) == 0:
+            return True
+        if self.volumes[route].sum() > self.bag_volumes[rider]:
+            return False
+        path = self._get_path(route)
+        arrival_times = np.cumsum(self.distance_matrix[path[:-1], path[1:]])
+        return bool(
+            np.all(arrival_times[:-1] <= self.expected_delivery_time_deltas[route])
+            and arrival_times[-1] <= REACH_HUB_BEFORE_SECONDS
+        )
+
+    def _try_improving_moves(self, deltas: np.ndarray, apply_move) -> bool:
+        """
+        This method tries the moves with a negative delta from the best down, apply_move
+        returns whether the move was feasible and applied.
+        """
+        candidates = np.flatnonzero(deltas < 0)
+        for candidate in candidates[np.argsort(deltas[candidates], kind="stable")]:
+            if self._is_out_of_time():
+                return False
+            if apply_move(int(candidate)):
+                return True
+        return False
+
+    def _two_opt(self, rider: int) -> bool:
+        """
+        This method reverses the segment of a route whose reversal saves the most time.
+        The matrix may be asymmetric, so the reversed segment is costed backwards.
+        """
+        route = self.routes[rider]
+        num_deliveries = len(route)
+        if num_deliveries < 2:
+            return False
+
+        path = self._get_path(route)
+        forward = self.distance_matrix[path[:-1], path[1:]]
+        backward = self.distance_matrix[path[1:], path[:-1]]
+        forward_prefix = np.concatenate(([0], np.cumsum(forward)))
+        backward_prefix = np.concatenate(([0], np.cumsum(backward)))
+
+        # reverse path positions first..last, 1 <= first < last <= num_deliveries
+        first, last = np.triu_indices(num_deliveries, k=1)
+        first, last = first + 1, last + 1
+        deltas = (
+            self.distance_matrix[path[first - 1], path[last]]
+            + self.distance_matrix[path[first], path[last + 1]]
+            - forward[first - 1]
+            - forward[last]
+            + (backward_prefix[last] - backward_prefix[first])
+            - (forward_prefix[last] - forward_prefix[first])
+        )
+
+        def apply_move(candidate: int) -> bool:
+            start, stop = first[candidate] - 1, last[candidate]
+            new_route = route.copy()
+            new_route[start:stop] = route[start:stop][::-1]
+            if not self._is_feasible(rider, new_route):
+                return False
+            self.routes[rider] = new_route
+            return True
+
+        return self._try_improving_moves(deltas, apply_move)
+
+    def _or_opt(self, rider: int) -> bool:
+        """
+        This method moves a chain of up to MAX_OR_OPT_SEGMENT_LENGTH consecutive
+        deliveries to a better place in the same route.
+        """
+        route = self.routes[rider]
+        num_deliveries = len(route)
+        path = self._get_path(route)
+
+        max_segment_length = min(MAX_OR_OPT_SEGMENT_LENGTH, num_deliveries - 1)
+        for segment_length in range(1, max_segment_length + 1):
+            for start in range(num_deliveries - segment_length + 1):
+                if self._is_out_of_time():
+                    return False
+                stop = start + segment_length
+                segment = route[start:stop]
+                before, after = path[start], path[stop + 1]
+                removal_gain = (
+                    self.distance_matrix[before, segment[0]]
+                    + self.distance_matrix[segment[-1], after]
+                    - self.distance_matrix[before, after]
+                )
+
+                remaining = np.concatenate((route[:start], route[stop:]))
+                remaining_path = self._get_path(remaining)
+                insertion_costs = (
+                    self.distance_matrix[remaining_path[:-1], segment[0]]
+                    + self.distance_matrix[segment[-1], remaining_path[1:]]
+                    - self.distance_matrix[remaining_path[:-1], remaining_path[1:]]
+                )
+                deltas = insertion_costs - removal_gain
+                # inserting where the chain was taken from is no move
+                deltas[start] = 0
+
+                def apply_move(position: int) -> bool:
+                    new_route = np.concatenate(
+                        (remaining[:position], segment, remaining[position:])
+                    )
+                    if not self._is_feasible(rider, new_route):
+                        return False
+                    self.routes[rider] = new_route
+                    return True
+
+                if self._try_improving_moves(deltas, apply_move):
+                    return True
+        return False
+
+    def _get_removal_gains(self, route: np.ndarray) -> np.ndarray:
+        path = self._get_path(route)
+        return (
+            self.distance_matrix[path[:-2], path[1:-1]]
+            + self.distance_matrix[path[1:-1], path[2:]]
+            - self.distance_matrix[path[:-2], path[2:]]
+        )
+
+    def _relocate(self) -> bool:
+        """
+        This method moves one delivery to the place in another route where it saves
+        the most time.
+        """
+        for from_rider, from_route in enumerate(self.routes):
+            removal_gains = self._get_removal_gains(from_route)
+            for index, location in enumerate(from_route.tolist()):
+                for to_rider, to_route in enumerate(self.routes):
+                    if to_rider == from_rider:
+                        continue
+                    if self._is_out_of_time():
+                        return False
+                    if (
+                        self.volumes[to_route].sum() + self.volumes[location]
+                        > self.bag_volumes[to_rider]
+                    ):
+                        continue
+
+                    to_path = self._get_path(to_route)
+                    deltas = (
+                        self.distance_matrix[to_path[:-1], location]
+                        + self.distance_matrix[location, to_path[1:]]
+                        - self.distance_matrix[to_path[:-1], to_path[1:]]
+                        - removal_gains[index]
+                    )
+
+                    def apply_move(position: int) -> bool:
+                        new_from_route = np.delete(from_route, index)
+                        new_to_route = np.insert(to_route, position, location)
+                        if not (
+                            self._is_feasible(to_rider, new_to_route)
+                            and self._is_feasible(from_rider, new_from_route)
+                        ):
+                            return False
+                        self.routes[from_rider] = new_from_route
+                        self.routes[to_rider] = new_to_route
+                        return True
+
+                    if self._try_improving_moves(deltas, apply_move):
+                        return True
+        return False
+
+    def _swap(self) -> bool:
+        """
+        This method exchanges two deliveries of different routes, each taking the
+        other's place.
+        """
+        for rider, route in enumerate(self.routes):
+            path = self._get_path(route)
+            load = self.volumes[route].sum()
+            for other_rider in range(rider + 1, len(self.routes)):
+                other_route = self.routes[other_rider]
+                if len(other_route) == 0:
+                    continue
+                other_path = self._get_path(other_route)
+                other_load = self.volumes[other_route].sum()
+                other_before, other_after = other_path[:-2], other_path[2:]
+
+                for index, location in enumerate(route.tolist()):
+                    if self._is_out_of_time():
+                        return False
+                    before, after = path[index], path[index + 2]
+                    deltas = (
+                        # the other route's deliveries in place of location
+                        self.distance_matrix[before, other_route]
+                        + self.distance_matrix[other_route, after]
+                        - self.distance_matrix[before, location]
+                        - self.distance_matrix[location, after]
+                        # location in place of each of the other route's deliveries
+                        + self.distance_matrix[other_before, location]
+                        + self.distance_matrix[location, other_after]
+                        - self.distance_matrix[other_before, other_route]
+                        - self.distance_matrix[other_route, other_after]
+                    )
+                    volume_change = self.volumes[other_route] - self.volumes[location]
+                    deltas[
+                        (load + volume_change > self.bag_volumes[rider])
+                        | (other_load - volume_change > self.bag_volumes[other_rider])
+                    ] = 0
+
+                    def apply_move(other_index: int) -> bool:
+                        new_route = route.copy()
+                        new_other_route = other_route.copy()
+                        new_route[index] = other_route[other_index]
+                        new_other_route[other_index] = location
+                        if not (
+                            self._is_feasible(rider, new_route)
+                            and self._is_feasible(other_rider, new_other_route)
+                        ):
+                            return False
+                        self.routes[rider] = new_route
+                        self.routes[other_rider] = new_other_route
+                        return True
+
+                    if self._try_improving_moves(deltas, apply_move):
+                        return True
+        return False
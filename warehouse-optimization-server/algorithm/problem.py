@@ -0,0 +1,198 @@
+"""
+Columnar form of a dispatch problem.
+
+The delivery task and rider DTOs are walked once and their solver relevant fields are
+kept as NumPy columns, which validation, the distance matrix and the solver input are
+all built from.
+"""
+
+from typing import List, Optional, Tuple
+import datetime
+
+import numpy as np
+from beanie import PydanticObjectId
+
+from ..clock import WarehouseClock
+from ..constants import WAREHOUSE_LOCATION
+from ..dtos import DeliveryTaskDTO
+from ..models.rider import Rider
+from .map import distance as map_distance_service
+
+
+# distance matrix, volumes, expected delivery time deltas, latitudes, longitudes, areas
+# and bag volumes, in the order of protocol.encode_dispatch_input
+SolverArrays = Tuple[
+    np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray
+]
+
+
+class DispatchProblem:
+    """
+    Location columns (latitudes, longitudes, areas) hold the warehouse at index 0 and
+    delivery i at index i + 1, delivery columns (volumes, expected delivery time deltas)
+    hold delivery i at index i and rider columns hold rider j at index j.
+
+    Volumes and bag volumes keep the values of the DTOs, so validate sees them as
+    given, and are truncated to whole units for the solver by get_solver_arrays.
+    """
+
+    def __init__(
+        self,
+        delivery_task_ids: List[PydanticObjectId],
+        rider_ids: List[PydanticObjectId],
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        areas: np.ndarray,
+        volumes: np.ndarray,
+        expected_delivery_time_deltas: np.ndarray,
+        bag_volumes: np.ndarray,
+    ):
+        self.delivery_task_ids = delivery_task_ids
+        self.rider_ids = rider_ids
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.areas = areas
+        self.volumes = volumes
+        self.expected_delivery_time_deltas = expected_delivery_time_deltas
+        self.bag_volumes = bag_volumes
+
+    @property
+    def num_deliveries(self) -> int:
+        return len(self.delivery_task_ids)
+
+    @property
+    def num_riders(self) -> int:
+        return len(self.rider_ids)
+
+    @classmethod
+    def from_dtos(
+        cls,
+        delivery_tasks: List[DeliveryTaskDTO],
+        riders: List[Rider],
+        day_start_timestamp: Optional[datetime.datetime] = None,
+    ) -> "DispatchProblem":
+        """
+        This method builds the problem in one pass over the delivery tasks, asserting
+        the fields it reads are present. Their values are checked by validate.
+        """
+        if day_start_timestamp is None:
+            day_start_timestamp = WarehouseClock().get_day_start_timestamp()
+
+        num_deliveries = len(delivery_tasks)
+        latitudes = np.empty(num_deliveries + 1, dtype=np.float64)
+        longitudes = np.empty(num_deliveries + 1, dtype=np.float64)
+        latitudes[0] = WAREHOUSE_LOCATION.coordinate.latitude
+        longitudes[0] = WAREHOUSE_LOCATION.coordinate.longitude
+        volumes = np.empty(num_deliveries, dtype=np.float64)
+        expected_delivery_time_deltas = np.empty(num_deliveries, dtype=np.int64)
+        delivery_task_ids: List[PydanticObjectId] = []
+
+        for index, delivery_task in enumerate(delivery_tasks):
+            assert delivery_task.id is not None, "Delivery task id must be provided"
+            assert (
+                len(delivery_task.items) == 1
+            ), "Each delivery task must have exactly one item, currently only one item is supported"
+            delivery_information = delivery_task.delivery_information
+            assert (
+                delivery_information is not None
+            ), "Delivery task's delivery information must be provided"
+            assert (
+                delivery_information.delivery_location is not None
+            ), "Delivery task's delivery location must be provided"
+            # a pickup already in a batch is visited at its item's location
+            coordinate = delivery_task.get_task_coordinate()
+            assert (
+                coordinate is not None
+            ), "Delivery task's delivery location coordinate must be provided"
+            expected_delivery_time = delivery_information.expected_delivery_time
+            assert (
+                expected_delivery_time is not None
+            ), "Delivery task's expected delivery time must be provided"
+            tool_scan_information = delivery_task.items[0].tool_scan_information
+            assert (
+                tool_scan_information is not None
+            ), "Item's tool scan information must be provided"
+
+            # Ensure both datetimes are timezone-aware for calculation
+            if expected_delivery_time.tzinfo is None:
+                expected_delivery_time = expected_delivery_time.replace(
+                    tzinfo=datetime.timezone.utc
+                )
+
+            delivery_task_ids.append(delivery_task.id)
+            latitudes[index + 1] = coordinate.latitude
+            longitudes[index + 1] = coordinate.longitude
+            volumes[index] = tool_scan_information.volume
+            expected_delivery_time_deltas[index] = int(
+                (expected_delivery_time - day_start_timestamp).total_seconds()
+            )
+
+        rider_ids: List[PydanticObjectId] = []
+        for rider in riders:
+            assert rider.id is not None, "Rider id must be provided"
+            rider_ids.append(rider.id)
+
+        return cls(
+            delivery_task_ids=delivery_task_ids,
+            rider_ids=rider_ids,
+            latitudes=latitudes,
+            longitudes=longitudes,
+            areas=np.ones(num_deliveries + 1, dtype=np.int32),
+            volumes=volumes,
+            expected_delivery_time_deltas=expected_delivery_time_deltas,
+            bag_volumes=np.fromiter(
+                (rider.bag_volume for rider in riders),
+                dtype=np.float64,
+                count=len(riders),
+            ),
+        )
+
+    def get_subproblem(
+        self, delivery_indices: np.ndarray, rider_indices: np.ndarray
+    ) -> "DispatchProblem":
+        """
+        This method returns the problem restricted to some deliveries and riders, its
+        delivery i is delivery delivery_indices[i] here and likewise for riders.
+        """
+        location_indices = np.concatenate(([0], np.asarray(delivery_indices) + 1))
+        return DispatchProblem(
+            delivery_task_ids=[self.delivery_task_ids[i] for i in delivery_indices],
+            rider_ids=[self.rider_ids[i] for i in rider_indices],
+            latitudes=self.latitudes[location_indices],
+            longitudes=self.longitudes[location_indices],
+            areas=self.areas[location_indices],
+            volumes=self.volumes[delivery_indices],
+            expected_delivery_time_deltas=self.expected_delivery_time_deltas[
+                delivery_indices
+            ],
+            bag_volumes=self.bag_volumes[rider_indices],
+        )
+
+    def validate(self) -> None:
+        assert np.all(
+            self.expected_delivery_time_deltas > 0
+        ), "Delivery task's expected delivery time must be in the future"
+        assert np.all(self.volumes > 0), "Item's volume must be greater than 0"
+        assert np.all(
+            self.bag_volumes > 0
+        ), "Rider's bag volume must be greater than 0"
+
+    def get_distance_matrix(self) -> np.ndarray:
+        """
+        This method returns the pairwise travel time matrix of the warehouse and the
+        delivery locations.
+        """
+        return map_distance_service.get_pairwise_distance_matrix_from_arrays(
+            self.latitudes, self.longitudes
+        )
+
+    def get_solver_arrays(self) -> SolverArrays:
+        return (
+            self.get_distance_matrix(),
+            self.volumes.astype(np.int32),
+            self.expected_delivery_time_deltas.astype(np.int32),
+            self.latitudes,
+            self.longitudes,
+            self.areas,
+            self.bag_volumes.astype(np.int32),
+        )
@@ -0,0 +1,291 @@
+"""
+Wire format of the dispatch.exe and pickup.exe solver inputs and outputs.
+
+Two input formats are supported by both solvers:
+
+- text: the original format, one whitespace separated number per value.
+- binary: a fixed header followed by contiguous little-endian blocks, read by the
+  solvers with bulk fread calls.
+
+Binary dispatch input (version 4):
+
+    header  "WDSP" | uint32 version | int32 num_items | int32 num_riders
+            | int32 time_budget_ms | int32 quality_target | uint32 seed
+    int32   distance matrix, (num_items + 1)^2 values, row major, warehouse first
+    int32   item volumes, num_items values
+    int32   expected delivery time deltas, num_items values
+    float64 coordinates, (num_items + 1) (latitude, longitude) pairs, warehouse first
+    int32   areas, num_items + 1 values, warehouse first
+    int32   rider bag volumes, num_riders values
+    int32   warm start length, 0 for a cold start
+    int32   warm start, warm start length values, for each rider the length of its
+            previous order, how many of its first locations are fixed and the order
+
+Binary pickup input (version 1):
+
+    header  "WPCK" | uint32 version | int32 current_time | int32 item_volume
+            | int32 item_entry_time | int32 num_riders | int32 total_tasks
+    int32   rider bag volumes, num_riders values
+    int32   number of tasks per rider, num_riders values
+    int32   first task time per rider, num_riders values
+    int32   tasks, total_tasks rows of (volume, type, edd, time_next, time_from_pickup)
+
+The solver outputs are short and stay textual in both cases, they are read line by line
+from the solver's stdout as it produces them.
+
+For text and version 1 dispatch inputs dispatch.exe prints only its final answer, the
+orders of each rider terminated by -1. For version 2 and later inputs it streams every
+answer that improves on the previous one as "I <served deliveries> <total route time>"
+followed by the orders, and ends with "F". A time budget of 0 means no budget, a quality
+target of 0 means no target, otherwise the search stops once an answer serves that many
+deliveries. The seed makes the search reproducible. A warm started search keeps the
+fixed locations of every rider's previous order where they are and starts from the rest.
+"""
+
+from typing import AsyncIterator, List, Literal, NamedTuple, Optional, Tuple
+import asyncio
+import struct
+import numpy as np
+
+
+WireFormat = Literal["text", "binary"]
+
+DISPATCH_MAGIC = b"WDSP"
+PICKUP_MAGIC = b"WPCK"
+DISPATCH_PROTOCOL_VERSION = 4
+PICKUP_PROTOCOL_VERSION = 1
+
+DISPATCH_HEADER = struct.Struct("<4sIiiiiI")
+# the seed is the last field of the dispatch header
+DISPATCH_SEED = struct.Struct("<I")
+DISPATCH_SEED_OFFSET = DISPATCH_HEADER.size - DISPATCH_SEED.size
+PICKUP_HEADER = struct.Struct("<4sIiiiii")
+
+# end of a rider's order in the dispatch output
+END_OF_ORDER = -1
+INCUMBENT_MARKER = "I"
+FINAL_MARKER = "F"
+
+
+class DispatchIncumbent(NamedTuple):
+    served_deliveries: int
+    total_route_time: int
+    orders: List[List[int]]
+
+
+class WarmStartOrder(NamedTuple):
+    # 1-based item indices, as in the dispatch output
+    order: List[int]
+    # the first fixed_count locations of order stay as they are
+    fixed_count: int
+
+
+def _int32_block(values) -> bytes:
+    return np.ascontiguousarray(values, dtype="<i4").tobytes()
+
+
+def _float64_block(values) -> bytes:
+    return np.ascontiguousarray(values, dtype="<f8").tobytes()
+
+
+def _text_block(values) -> str:
+    values = np.asarray(values).ravel().tolist()
+    return "\n".join(map(str, values)) + "\n" if len(values) > 0 else ""
+
+
+def get_warm_start_block(warm_start: List[WarmStartOrder]) -> np.ndarray:
+    """
+    Returns the values of the warm start block, one WarmStartOrder per rider.
+    """
+    values: List[int] = []
+    for warm_start_order in warm_start:
+        values.append(len(warm_start_order.order))
+        values.append(warm_start_order.fixed_count)
+        values.extend(warm_start_order.order)
+    return np.array(values, dtype=np.int32)
+
+
+def encode_dispatch_input(
+    wire_format: WireFormat,
+    distance_matrix: np.ndarray,
+    volumes: np.ndarray,
+    expected_delivery_time_deltas: np.ndarray,
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    areas: np.ndarray,
+    bag_volumes: np.ndarray,
+    time_budget_ms: int = 0,
+    quality_target: int = 0,
+    seed: int = 0,
+    warm_start: Optional[List[WarmStartOrder]] = None,
+) -> bytes:
+    """
+    Encodes a dispatch problem. Coordinate and area arrays include the warehouse at
+    index 0, the per item arrays do not. The time budget, quality target, seed and warm
+    start only exist in the binary format.
+    """
+    num_items = len(volumes)
+    coordinates = np.column_stack([latitudes, longitudes])
+
+    if wire_format == "binary":
+        warm_start_block = get_warm_start_block(warm_start or [])
+        return b"".join(
+            [
+                DISPATCH_HEADER.pack(
+                    DISPATCH_MAGIC,
+                    DISPATCH_PROTOCOL_VERSION,
+                    num_items,
+                    len(bag_volumes),
+                    time_budget_ms,
+                    quality_target,
+                    seed,
+                ),
+                _int32_block(distance_matrix),
+                _int32_block(volumes),
+                _int32_block(expected_delivery_time_deltas),
+                _float64_block(coordinates),
+                _int32_block(areas),
+                _int32_block(bag_volumes),
+                _int32_block([len(warm_start_block)]),
+                _int32_block(warm_start_block),
+            ]
+        )
+
+    assert warm_start is None, "Only binary dispatch inputs have a warm start"
+    return "".join(
+        [
+            f"{num_items}\n",
+            _text_block(np.asarray(distance_matrix, dtype=np.int64)),
+            _text_block(np.asarray(volumes, dtype=np.int64)),
+            _text_block(np.asarray(expected_delivery_time_deltas, dtype=np.int64)),
+            _text_block(np.asarray(coordinates, dtype=np.float64)),
+            _text_block(np.asarray(areas, dtype=np.int64)),
+            f"{len(bag_volumes)}\n",
+            _text_block(np.asarray(bag_volumes, dtype=np.int64)),
+        ]
+    ).encode("utf8")
+
+
+def with_dispatch_seed(payload: bytes, seed: int) -> bytes:
+    """
+    Returns a binary dispatch input with its seed replaced, without encoding it again.
+    """
+    assert payload[:4] == DISPATCH_MAGIC, "Only binary dispatch inputs have a seed"
+    return b"".join(
+        [
+            payload[:DISPATCH_SEED_OFFSET],
+            DISPATCH_SEED.pack(seed),
+            payload[DISPATCH_HEADER.size :],
+        ]
+    )
+
+
+def encode_pickup_input(
+    wire_format: WireFormat,
+    current_time: int,
+    item_volume: int,
+    item_entry_time: int,
+    bag_volumes: np.ndarray,
+    first_task_times: np.ndarray,
+    tasks: List[np.ndarray],
+) -> bytes:
+    """
+    Encodes a pickup problem, tasks holds one (num_tasks, 5) array per rider.
+    """
+    num_tasks = [len(rider_tasks) for rider_tasks in tasks]
+    all_tasks = (
+        np.concatenate(tasks) if len(tasks) > 0 else np.empty((0, 5), dtype=np.int64)
+    )
+
+    if wire_format == "binary":
+        return b"".join(
+            [
+                PICKUP_HEADER.pack(
+                    PICKUP_MAGIC,
+                    PICKUP_PROTOCOL_VERSION,
+                    current_time,
+                    item_volume,
+                    item_entry_time,
+                    len(bag_volumes),
+                    len(all_tasks),
+                ),
+                _int32_block(bag_volumes),
+                _int32_block(num_tasks),
+                _int32_block(first_task_times),
+                _int32_block(all_tasks),
+            ]
+        )
+
+    parts = [
+        f"{current_time}\n{item_volume}\n{item_entry_time}\n{len(bag_volumes)}\n",
+        _text_block(np.asarray(bag_volumes, dtype=np.int64)),
+    ]
+    for rider_num_tasks, first_task_time, rider_tasks in zip(
+        num_tasks, np.asarray(first_task_times).tolist(), tasks
+    ):
+        parts.append(f"{rider_num_tasks}\n{first_task_time}\n")
+        parts.extend(
+            " ".join(map(str, task)) + "\n"
+            for task in np.asarray(rider_tasks, dtype=np.int64).tolist()
+        )
+    return "".join(parts).encode("utf8")
+
+
+async def _read_line(stream: asyncio.StreamReader) -> str:
+    line = await stream.readline()
+    if not line:
+        raise EOFError("Solver closed its output before finishing the response")
+    return line.decode("utf8").strip()
+
+
+async def _read_int_line(stream: asyncio.StreamReader) -> int:
+    return int(await _read_line(stream))
+
+
+async def read_dispatch_output(
+    stream: asyncio.StreamReader, num_riders: int
+) -> List[List[int]]:
+    """
+    Reads the per rider orders printed by dispatch.exe. Locations are 1-based item
+    indices, 0 is a return to the warehouse.
+    """
+    orders: List[List[int]] = []
+    for _ in range(num_riders):
+        order: List[int] = []
+        while True:
+            location = await _read_int_line(stream)
+            if location == END_OF_ORDER:
+                break
+            order.append(location)
+        orders.append(order)
+    return orders
+
+
+async def read_dispatch_incumbents(
+    stream: asyncio.StreamReader, num_riders: int
+) -> AsyncIterator[DispatchIncumbent]:
+    """
+    Yields the improving answers streamed by dispatch.exe for a version 2 input, until
+    its final marker.
+    """
+    while True:
+        line = await _read_line(stream)
+        if line == FINAL_MARKER:
+            return
+        marker, served_deliveries, total_route_time = line.split()
+        if marker != INCUMBENT_MARKER:
+            raise ValueError(f"Unexpected dispatch output line: {line}")
+        yield DispatchIncumbent(
+            int(served_deliveries),
+            int(total_route_time),
+            await read_dispatch_output(stream, num_riders),
+        )
+
+
+async def read_pickup_output(stream: asyncio.StreamReader) -> Tuple[int, int]:
+    """
+    Reads the (batch index, after task index) pair printed by pickup.exe.
+    """
+    batch_index = await _read_int_line(stream)
+    after_task_index = await _read_int_line(stream)
+    return batch_index, after_task_index
@@ -0,0 +1,153 @@
+"""
+Optional recorder of the problem instances sent to the solvers.
+
+When enabled, a sample of the solver inputs is handed to a background thread that
+compresses each one into its own file named after the request, so the request path
+never touches the disk. The oldest recordings are deleted once the directory grows past
+the configured size. A recording holds the exact bytes written to the solver's stdin,
+so it can be replayed with e.g.
+
+    zcat dispatch-<request id>.in.gz | ./algorithm/runnable/bin/dispatch.exe
+"""
+
+from typing import Literal, Optional, Tuple
+import gzip
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+
+from ..settings import settings
+
+try:
+    import zstandard
+except ImportError:  # optional dependency, gzip is used instead
+    zstandard = None
+
+
+logger = logging.getLogger(__name__)
+
+# recordings waiting to be written, new ones are dropped when the writer falls behind
+MAX_PENDING_RECORDINGS = 64
+
+
+class ProblemRecorder:
+    def __init__(
+        self,
+        enabled: bool,
+        sample_rate: float,
+        directory: str,
+        compression: Literal["gzip", "zstd"],
+        max_bytes: int,
+    ):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.compression = compression
+        if compression == "zstd" and zstandard is None:
+            logger.warning("zstandard is not installed, recording with gzip instead")
+            self.compression = "gzip"
+        self.max_bytes = max_bytes
+
+        self._queue: "queue.Queue[Optional[Tuple[str, str, bytes]]]" = queue.Queue(
+            maxsize=MAX_PENDING_RECORDINGS
+        )
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "ProblemRecorder":
+        return cls(
+            enabled=settings.PROBLEM_RECORDER_ENABLED,
+            sample_rate=settings.PROBLEM_RECORDER_SAMPLE_RATE,
+            directory=settings.PROBLEM_RECORDER_DIRECTORY,
+            compression=settings.PROBLEM_RECORDER_COMPRESSION,
+            max_bytes=settings.PROBLEM_RECORDER_MAX_BYTES,
+        )
+
+    def record(
+        self, kind: str, payload: bytes, request_id: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Queues a solver input for recording, returns the request id it is stored under
+        or None when it was not sampled.
+        """
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+
+        self._ensure_writer_started()
+        request_id = request_id or uuid.uuid4().hex
+        try:
+            self._queue.put_nowait((kind, request_id, payload))
+        except queue.Full:
+            logger.warning("Problem recorder is falling behind, dropping %s", request_id)
+            return None
+        return request_id
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Writes out the pending recordings and stops the writer thread.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+
+    def _ensure_writer_started(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._thread = threading.Thread(
+                    target=self._run, name="problem-recorder", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            recording = self._queue.get()
+            if recording is None:
+                return
+            try:
+                self._write(*recording)
+                self._rotate()
+            except Exception:
+                logger.exception("Failed to record problem %s", recording[1])
+
+    def _write(self, kind: str, request_id: str, payload: bytes) -> None:
+        if self.compression == "zstd":
+            extension, data = "zst", zstandard.ZstdCompressor().compress(payload)
+        else:
+            extension, data = "gz", gzip.compress(payload, compresslevel=6)
+
+        timestamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        path = os.path.join(
+            self.directory, f"{kind}-{timestamp}-{request_id}.in.{extension}"
+        )
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+
+    def _rotate(self) -> None:
+        """
+        Deletes the oldest recordings until the directory fits in max_bytes.
+        """
+        recordings = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                recordings.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_bytes = sum(size for _, size, _ in recordings)
+        for _, size, path in sorted(recordings):
+            if total_bytes <= self.max_bytes:
+                break
+            os.remove(path)
+            total_bytes -= size
+
+
+problem_recorder = ProblemRecorder.from_settings()
@@ -1,11 +1,25 @@
 #include <bits/stdc++.h>
+#ifdef _WIN32
+#include <io.h>
+#include <fcntl.h>
+#endif
 #define ll long long
 #define ld long double
 using namespace std;
-clock_t startTime;
+// The search state is thread local so the shared library can solve several requests at
+// once on different threads.
+// wall clock start of the current request, the time budget is measured against it
+thread_local chrono::steady_clock::time_point startTime;
+// source of all randomness of the search, rand() below draws from it
+thread_local mt19937 rng(chrono::steady_clock::now().time_since_epoch().count());
+int searchRand()
+{
+    return (int)(rng() >> 1);
+}
+#define rand searchRand
 double getCurrentTime()
 {
-    return (double)(clock() - startTime) / CLOCKS_PER_SEC;
+    return chrono::duration<double>(chrono::steady_clock::now() - startTime).count();
 }
 //------------------------------------------------IO_OPERATORS---------------------------------------------/
 template <typename T, typename U>
@@ -582,7 +596,7 @@ void initialize(set<pair<pair<int, int>, vector<int>>> &st,int &generations,vect
 
 
                 st.insert({{-P.first, P.second}, order_of_delivery});
-                random_shuffle(order_of_delivery.begin() + 1, order_of_delivery.begin() + (rand() % (numLocations) + 1));
+                shuffle(order_of_delivery.begin() + 1, order_of_delivery.begin() + (rand() % (numLocations) + 1), rng);
         }
 
 
@@ -956,7 +970,7 @@ vector<vector<int>> delivering_object_using_genetic_algorithm111(vector<vector<i
         pair<int, int> P = calculateCost111(adjancy_matrix, numRiders, endOfDelivery, bagSize, package_volume, reach_hub_before_this_time, order_of_delivery);
 
         st.insert({{-P.first, P.second}, order_of_delivery});
-        random_shuffle(order_of_delivery.begin() + 1, order_of_delivery.begin() + (rand() % (numLocations) + 1));
+        shuffle(order_of_delivery.begin() + 1, order_of_delivery.begin() + (rand() % (numLocations) + 1), rng);
     }
 
     for (int i = 0; i < generations; i++)
@@ -2158,11 +2172,17 @@ vector<vector<int>> rider_with_pickup_points(int pickup_point, vector<vector<int
 
 int rand(int l, int r)
 {
-    static mt19937 rng(chrono::steady_clock::now().time_since_epoch().count());
     uniform_int_distribution<int> ludo(l, r);
     return ludo(rng);
 }
 
+// All randomness of the search comes from rng, so a request solved with a given seed is
+// reproducible as long as its time budget does not cut the search short.
+void seedRandom(unsigned int seed)
+{
+    rng.seed(seed);
+}
+
 // void solve() {
 //     int numLocations;
 //     cin >> numLocations;
@@ -2780,6 +2800,92 @@ vector<vector<int>> Scan(vector<vector<int>> &adjancy_matrix,int &num_clusters){
 
 
 
+//------------------------------------------------ANYTIME_SEARCH---------------------------------------------/
+
+// Limits of the current request and the best answer found so far. With a time budget the
+// search skips its remaining stages once the budget is spent, and with a quality target
+// once an answer serves that many deliveries. When streaming, every answer that beats the
+// incumbent is printed right away as
+//     I <served deliveries> <total route time>
+// followed by the per rider orders, so the caller can stop waiting at any point.
+struct SearchControl
+{
+    double time_budget = 0;  // seconds, 0 for no budget
+    int quality_target = 0;  // 0 for no target
+    bool stream_incumbents = false;
+    int best_served = -1;
+    ll best_total_time = 0;
+    vector<vector<int>> best_answer;
+};
+
+thread_local SearchControl searchControl;
+
+bool searchIsDone()
+{
+    if (searchControl.time_budget > 0 && getCurrentTime() >= searchControl.time_budget)
+        return true;
+    return searchControl.quality_target > 0 && searchControl.best_served >= searchControl.quality_target;
+}
+
+// Travel time of all riders, each leaving from and returning to the hub.
+ll routeTotalTime(vector<vector<int>> &dis, vector<vector<int>> &ans)
+{
+    ll total_time = 0;
+    for (auto &order : ans)
+    {
+        int current_location = 0;
+        for (int location : order)
+        {
+            total_time += dis[current_location][location];
+            current_location = location;
+        }
+        total_time += dis[current_location][0];
+    }
+    return total_time;
+}
+
+void printOrders(vector<vector<int>> &ans, int numRiders)
+{
+    for (int i = 0; i < numRiders; ++i)
+    {
+        if (i < (int)ans.size())
+        {
+            for (auto loc : ans[i])
+                cout << loc << "\n";
+        }
+        cout << -1 << "\n";
+    }
+}
+
+// Makes ans the incumbent and streams it.
+void setIncumbent(int numRiders, int served, ll total_time, vector<vector<int>> &ans)
+{
+    searchControl.best_served = served;
+    searchControl.best_total_time = total_time;
+    searchControl.best_answer = ans;
+
+    if (searchControl.stream_incumbents)
+    {
+        cout << "I " << served << " " << total_time << "\n";
+        printOrders(ans, numRiders);
+        cout << flush;
+    }
+}
+
+// Records a valid answer and streams it when it improves on the incumbent, more served
+// deliveries first, then less total route time.
+void recordAnswer(vector<pair<int, vector<vector<int>>>> &record_all_answers, vector<vector<int>> &dis,
+                  int numRiders, int served, vector<vector<int>> &ans)
+{
+    record_all_answers.push_back({served, ans});
+
+    ll total_time = routeTotalTime(dis, ans);
+    if (served < searchControl.best_served ||
+        (served == searchControl.best_served && total_time >= searchControl.best_total_time))
+        return;
+    setIncumbent(numRiders, served, total_time, ans);
+}
+
 // void solve()
 vector<vector<int>> solve(int numLocations, vector<vector<int>> &dis, vector<int> &itemSizes, vector<int> &times, 
                 vector<pair<double,double>> &coordinates, vector<int> &area, int numRiders, vector<int> &riderBags, 
@@ -2877,6 +2983,8 @@ vector<vector<int>> solve(int numLocations, vector<vector<int>> &dis, vector<int
     int no_of_clusters = min(5, numRiders / 2);
     // no_of_clusters = 5;
     no_of_clusters = min({no_of_clusters,numRiders, numLocations});
+    // a single rider still needs one cluster, k-means on none reads out of bounds
+    no_of_clusters = max(no_of_clusters, min(numRiders, numLocations) > 0 ? 1 : 0);
 
     vector<vector<vector<int>>> clustering_list;
 
@@ -2946,6 +3054,8 @@ vector<vector<int>> solve(int numLocations, vector<vector<int>> &dis, vector<int
         // // //cout << "\n";
         for (int iter = 0; iter < all_answers; iter++)
         {
+            if (searchIsDone())
+                break;
             // // //cout << "\n";z
 
             vector<vector<int>> ans2(numRiders);
@@ -3163,7 +3273,7 @@ vector<vector<int>> solve(int numLocations, vector<vector<int>> &dis, vector<int
 
             if (checker.first == 1 && checker.second == count1)
             {
-                record_all_answers.push_back({count1, ans2});
+                recordAnswer(record_all_answers, dis, numRiders, count1, ans2);
             }
 
             // // //cout << endl;
@@ -3199,6 +3309,8 @@ vector<vector<int>> solve(int numLocations, vector<vector<int>> &dis, vector<int
         // // //cout << "\n";
         for (int iter = 0; iter < all_answers; iter++)
         {
+            if (searchIsDone())
+                break;
             // // //cout << "\n";z
 
             vector<vector<int>> ans2(numRiders);
@@ -3329,7 +3441,7 @@ vector<vector<int>> solve(int numLocations, vector<vector<int>> &dis, vector<int
 
             if (checker.first == 1 && checker.second == count1)
             {
-                record_all_answers.push_back({count1, ans2});
+                recordAnswer(record_all_answers, dis, numRiders, count1, ans2);
             }
 
             // // //cout << endl;
@@ -3338,12 +3450,13 @@ vector<vector<int>> solve(int numLocations, vector<vector<int>> &dis, vector<int
 
 
 // return timepass_array;
+    // the remaining stages are skipped, with an empty answer, once the search is done
     // Jaskaran Ans
     // // //cout << "\n\n\n";
     // // //cout << "\n";
     // // //cout << "\n";
     // // //cout << "Jaskaran Ans"<< "\t\t\t\t";
-    auto ans2 = dp_on_EOD_and_lastrider(dis, ridersToAssign, times, riderBags, itemSizes, reach_hub_before_this_time);
+    auto ans2 = searchIsDone() ? timepass_array : dp_on_EOD_and_lastrider(dis, ridersToAssign, times, riderBags, itemSizes, reach_hub_before_this_time);
     auto checker = goodSolution(numRiders, dis, numLocations, times, riderBags, itemSizes, ans2, reach_hub_before_this_time);
     // // //cout << checker.first << " " << checker.second << " ";
     int count1 = 0;
@@ -3367,14 +3480,14 @@ vector<vector<int>> solve(int numLocations, vector<vector<int>> &dis, vector<int
 
     if (checker.first == 1 && checker.second == count1)
     {
-        record_all_answers.push_back({count1, ans2});
+        recordAnswer(record_all_answers, dis, numRiders, count1, ans2);
     }
 //     // // //cout << endl;
 //     // // //cout << "\t\t";
 
     // Mayank Ans
     int count = 0;
-    auto ans = delivering_based_on_End_of_Delivery_Time__Mainfunction(dis, ridersToAssign, times, riderBags, itemSizes, reach_hub_before_this_time);
+    auto ans = searchIsDone() ? timepass_array : delivering_based_on_End_of_Delivery_Time__Mainfunction(dis, ridersToAssign, times, riderBags, itemSizes, reach_hub_before_this_time);
     // // //cout << "Mayank Ans"
     //      << "\t\t\t\t\t";
     checker = goodSolution(numRiders, dis, numLocations, times, riderBags, itemSizes, ans, reach_hub_before_this_time);
@@ -3398,14 +3511,14 @@ vector<vector<int>> solve(int numLocations, vector<vector<int>> &dis, vector<int
 
     if (checker.first == 1 && checker.second == count)
     {
-        record_all_answers.push_back({count, ans});
+        recordAnswer(record_all_answers, dis, numRiders, count, ans);
     }
 
 //     // // //cout << endl;
 
     // Mayank_2 Ans
     count = 0;
-    ans = delivering_based_on_End_of_Delivery_Time__Mainfunction2(dis, ridersToAssign, times, riderBags, itemSizes, reach_hub_before_this_time);
+    ans = searchIsDone() ? timepass_array : delivering_based_on_End_of_Delivery_Time__Mainfunction2(dis, ridersToAssign, times, riderBags, itemSizes, reach_hub_before_this_time);
     // // //cout << "Mayank second Ans"
     // << " \t\t\t";
     checker = goodSolution(numRiders, dis, numLocations, times, riderBags, itemSizes, ans, reach_hub_before_this_time);
@@ -3429,14 +3542,14 @@ vector<vector<int>> solve(int numLocations, vector<vector<int>> &dis, vector<int
 
     if (checker.first == 1 && checker.second == count)
     {
-        record_all_answers.push_back({count, ans});
+        recordAnswer(record_all_answers, dis, numRiders, count, ans);
     }
     // // //cout << endl;
 
     // Abhishek Ans
     // // //cout << "Abhishek Ans"
     // << "\t\t\t\t";
-    auto abhishek_ans = getRidersAssignment(ridersToAssign, dis, loc, numLocations, times, riderBags, itemSizes);
+    auto abhishek_ans = searchIsDone() ? timepass_array : getRidersAssignment(ridersToAssign, dis, loc, numLocations, times, riderBags, itemSizes);
     checker = goodSolution(numRiders, dis, numLocations, times, riderBags, itemSizes, abhishek_ans, reach_hub_before_this_time);
     // // //cout << checker.first << " " << checker.second << " ";
     count1 = 0;
@@ -3455,7 +3568,7 @@ vector<vector<int>> solve(int numLocations, vector<vector<int>> &dis, vector<int
     // // //cout << count1;
     if (checker.first == 1 && checker.second == count1)
     {
-        record_all_answers.push_back({count1, abhishek_ans});
+        recordAnswer(record_all_answers, dis, numRiders, count1, abhishek_ans);
     }
 
     // // //cout << "\t\t";
@@ -3464,7 +3577,7 @@ vector<vector<int>> solve(int numLocations, vector<vector<int>> &dis, vector<int
     // Saurabh Ans
     // // //cout << "Saurabh Ans"
     // << " \t\t\t\t";
-    auto saurabh_ans = delivering_object_nearest1(dis, numRiders, times, riderBags, itemSizes, reach_hub_before_this_time);
+    auto saurabh_ans = searchIsDone() ? timepass_array : delivering_object_nearest1(dis, numRiders, times, riderBags, itemSizes, reach_hub_before_this_time);
     // getRidersAssignment(ridersToAssign, dis, loc, numLocations, times, riderBags, itemSizes);
     if(saurabh_ans.size()<numRiders)
     {
@@ -3492,7 +3605,7 @@ vector<vector<int>> solve(int numLocations, vector<vector<int>> &dis, vector<int
 
     if (checker.first == 1 && checker.second == count1)
     {
-        record_all_answers.push_back({count1, saurabh_ans});
+        recordAnswer(record_all_answers, dis, numRiders, count1, saurabh_ans);
     }
     // // //cout << endl;
     // // //cout << "\t\t";
@@ -3500,7 +3613,7 @@ vector<vector<int>> solve(int numLocations, vector<vector<int>> &dis, vector<int
     // Saurabh second  Ans
     // // //cout << "Saurabh second Ans"
     // << " \t\t\t";
-    auto saurabh_second_ans = delivering_object_nearest_in_cyclic1(dis, numRiders, times, riderBags, itemSizes, reach_hub_before_this_time);
+    auto saurabh_second_ans = searchIsDone() ? timepass_array : delivering_object_nearest_in_cyclic1(dis, numRiders, times, riderBags, itemSizes, reach_hub_before_this_time);
     // getRidersAssignment(ridersToAssign, dis, loc, numLocations, times, riderBags, itemSizes);
     if(saurabh_second_ans.size()<numRiders)
     {
@@ -3528,7 +3641,7 @@ vector<vector<int>> solve(int numLocations, vector<vector<int>> &dis, vector<int
 
     if (checker.first == 1 && checker.second == count1)
     {
-        record_all_answers.push_back({count1, saurabh_second_ans});
+        recordAnswer(record_all_answers, dis, numRiders, count1, saurabh_second_ans);
     }
 
     
@@ -3588,7 +3701,7 @@ vector<vector<int>> solve(int numLocations, vector<vector<int>> &dis, vector<int
 
     // return record_all_answers[0].second;
 
-    auto saurabh_genetic_ans = delivering_object_using_genetic_algorithm(dis, numRiders, times, riderBags, itemSizes, reach_hub_before_this_time);
+    auto saurabh_genetic_ans = searchIsDone() ? timepass_array : delivering_object_using_genetic_algorithm(dis, numRiders, times, riderBags, itemSizes, reach_hub_before_this_time);
     // getRidersAssignment(ridersToAssign, dis, loc, numLocations, times, riderBags, itemSizes);\
     // if(saurabh_genetic_ans.size()<numRiders)
     // {
@@ -3615,7 +3728,7 @@ vector<vector<int>> solve(int numLocations, vector<vector<int>> &dis, vector<int
     // // //cout << checker.first << " " << checker.second << " " << count1<<"\n\n";
     if (checker.first == 1 && checker.second == count1)
     {
-        record_all_answers.push_back({count1, saurabh_genetic_ans});
+        recordAnswer(record_all_answers, dis, numRiders, count1, saurabh_genetic_ans);
     }
 
 
@@ -3720,81 +3833,670 @@ vector<vector<int>> solve(int numLocations, vector<vector<int>> &dis, vector<int
 }
 
 
-int main()
+//------------------------------------------------WARM_START---------------------------------------------/
+
+// Re-dispatch seeded with the riders' current orders. The first fixed_counts[i] locations
+// of rider i are already under way and stay where they are, the other locations of the
+// previous answer and the new ones are reassigned. As in
+// delivering_object_using_genetic_algorithm111 an answer is encoded as one order of all
+// the free locations, decoded greedily rider by rider, and the population starts from the
+// previous answer rather than from random orders. Answers are ranked by the locations of
+// the previous answer they keep, then by served deliveries and total route time, so a
+// location already given to a rider is only dropped when it can't be served anymore.
+
+// population size and generation cap of the warm started search, the time budget and
+// quality target stop it earlier
+const int WARM_START_POPULATION = 20;
+const int WARM_START_GENERATIONS = 500;
+
+// Where a rider is once its fixed locations are done.
+struct FixedPrefix
 {
-    srand(time(0));
+    int location = 0;
+    int time = 0;
+    int bag_left = 0;
+};
 
-    // setIO("sample_test_1"); // add this to test the algorithm
+vector<FixedPrefix> getFixedPrefixes(vector<vector<int>> &dis, vector<int> &itemSizes, vector<int> &riderBags,
+                                     vector<vector<int>> &previous_answer, vector<int> &fixed_counts)
+{
+    vector<FixedPrefix> prefixes(riderBags.size());
+    for (int i = 0; i < (int)riderBags.size(); ++i)
+    {
+        prefixes[i].bag_left = riderBags[i];
+        for (int j = 0; j < fixed_counts[i]; ++j)
+        {
+            int location = previous_answer[i][j];
+            prefixes[i].time += dis[prefixes[i].location][location];
+            prefixes[i].bag_left -= itemSizes[location];
+            prefixes[i].location = location;
+        }
+    }
+    return prefixes;
+}
 
-    startTime = clock();
-    int T = 1;
+bool canVisit(vector<vector<int>> &dis, vector<int> &itemSizes, vector<int> &times, int reach_hub_before_this_time,
+              int current_location, int current_time, int bag_left, int location)
+{
+    int arrival = current_time + dis[current_location][location];
+    return bag_left >= itemSizes[location] && arrival <= times[location] &&
+           arrival + dis[location][0] <= reach_hub_before_this_time;
+}
 
-    while (T--)
+// Whether every location of order after the fixed prefix is still served in time.
+bool freeSuffixIsFeasible(vector<vector<int>> &dis, vector<int> &itemSizes, vector<int> &times,
+                          int reach_hub_before_this_time, FixedPrefix prefix, vector<int> &order, int fixed_count)
+{
+    for (int j = fixed_count; j < (int)order.size(); ++j)
     {
-        
-        int num_items;
-        cin>>num_items;
-        // num_items = 2000;
+        int location = order[j];
+        if (!canVisit(dis, itemSizes, times, reach_hub_before_this_time, prefix.location, prefix.time,
+                      prefix.bag_left, location))
+            return false;
+        prefix.time += dis[prefix.location][location];
+        prefix.bag_left -= itemSizes[location];
+        prefix.location = location;
+    }
+    return true;
+}
 
-        vector<vector<int>> time_adj(num_items + 1, vector<int> (num_items + 1,0));
-        
-        for (int i = 0; i <= num_items; ++i) {
-            for (int j = 0; j <= num_items; ++j) {
-                cin>>time_adj[i][j];
-                // if(i!=j)
-                // {
-                //     time_adj[i][j]=rand(30,150);
-                // }
+// Decodes an order of the free locations, its values index free_locations from 1 and
+// start with a 0 as crossover expects. Each rider continues from its fixed prefix and
+// takes, in order, the locations it can still serve.
+vector<vector<int>> decodeWarmStart(vector<vector<int>> &dis, vector<int> &itemSizes, vector<int> &times,
+                                    int reach_hub_before_this_time, vector<vector<int>> &previous_answer,
+                                    vector<int> &fixed_counts, vector<FixedPrefix> &prefixes,
+                                    vector<int> &free_locations, vector<int> &order_of_delivery, int &served)
+{
+    int numRiders = prefixes.size();
+    vector<vector<int>> ans(numRiders);
+    vector<bool> is_delivered(order_of_delivery.size(), false);
+    served = 0;
+    for (int i = 0; i < numRiders; ++i)
+    {
+        ans[i].assign(previous_answer[i].begin(), previous_answer[i].begin() + fixed_counts[i]);
+        served += fixed_counts[i];
+        FixedPrefix state = prefixes[i];
+        for (int j = 1; j < (int)order_of_delivery.size(); ++j)
+        {
+            int gene = order_of_delivery[j];
+            int location = free_locations[gene - 1];
+            if (is_delivered[gene] || !canVisit(dis, itemSizes, times, reach_hub_before_this_time, state.location,
+                                                state.time, state.bag_left, location))
+                continue;
+            ans[i].push_back(location);
+            served++;
+            is_delivered[gene] = true;
+            state.time += dis[state.location][location];
+            state.bag_left -= itemSizes[location];
+            state.location = location;
+        }
+    }
+    return ans;
+}
+
+// The previous answer with the free locations it can no longer serve dropped, and the
+// locations left over inserted, earliest expected delivery first, where they add the
+// least travel time.
+vector<vector<int>> repairPreviousAnswer(vector<vector<int>> &dis, vector<int> &itemSizes, vector<int> &times,
+                                         int reach_hub_before_this_time, vector<vector<int>> &previous_answer,
+                                         vector<int> &fixed_counts, vector<FixedPrefix> &prefixes,
+                                         vector<int> &free_locations)
+{
+    int numRiders = prefixes.size();
+    vector<vector<int>> ans(numRiders);
+    vector<bool> is_assigned(dis.size(), false);
+    for (int i = 0; i < numRiders; ++i)
+    {
+        ans[i].assign(previous_answer[i].begin(), previous_answer[i].begin() + fixed_counts[i]);
+        FixedPrefix state = prefixes[i];
+        for (int j = fixed_counts[i]; j < (int)previous_answer[i].size(); ++j)
+        {
+            int location = previous_answer[i][j];
+            if (!canVisit(dis, itemSizes, times, reach_hub_before_this_time, state.location, state.time,
+                          state.bag_left, location))
+                continue;
+            ans[i].push_back(location);
+            is_assigned[location] = true;
+            state.time += dis[state.location][location];
+            state.bag_left -= itemSizes[location];
+            state.location = location;
+        }
+    }
+
+    vector<int> unassigned;
+    for (int location : free_locations)
+    {
+        if (!is_assigned[location])
+            unassigned.push_back(location);
+    }
+    stable_sort(unassigned.begin(), unassigned.end(), [&](int a, int b) { return times[a] < times[b]; });
+
+    for (int location : unassigned)
+    {
+        int best_rider = -1, best_position = -1, best_increase = INT_MAX;
+        for (int i = 0; i < numRiders; ++i)
+        {
+            for (int position = fixed_counts[i]; position <= (int)ans[i].size(); ++position)
+            {
+                int before = position == 0 ? 0 : ans[i][position - 1];
+                int after = position == (int)ans[i].size() ? 0 : ans[i][position];
+                int increase = dis[before][location] + dis[location][after] - dis[before][after];
+                if (increase >= best_increase)
+                    continue;
+                ans[i].insert(ans[i].begin() + position, location);
+                if (freeSuffixIsFeasible(dis, itemSizes, times, reach_hub_before_this_time, prefixes[i], ans[i],
+                                         fixed_counts[i]))
+                {
+                    best_rider = i;
+                    best_position = position;
+                    best_increase = increase;
+                }
+                ans[i].erase(ans[i].begin() + position);
             }
         }
+        if (best_rider != -1)
+            ans[best_rider].insert(ans[best_rider].begin() + best_position, location);
+    }
+    return ans;
+}
 
-        vector<int> item_volumes(num_items+1);
-        for(int i=1; i <= num_items; ++i) {
-            cin>>item_volumes[i];
-            // item_volumes[i]=rand(10,50);
+// Moves a few locations of the order around, keeping most of it as it is.
+void perturbOrder(vector<int> &order_of_delivery)
+{
+    int size = order_of_delivery.size();
+    int first = rand() % (size - 1) + 1;
+    int last = rand() % (size - 1) + 1;
+    if (first > last)
+        swap(first, last);
+    reverse(order_of_delivery.begin() + first, order_of_delivery.begin() + last + 1);
+    swap(order_of_delivery[rand() % (size - 1) + 1], order_of_delivery[rand() % (size - 1) + 1]);
+}
+
+vector<vector<int>> warmStartSolve(int numLocations, vector<vector<int>> &dis, vector<int> &itemSizes,
+                                   vector<int> &times, int numRiders, vector<int> &riderBags,
+                                   int reach_hub_before_this_time, vector<vector<int>> &previous_answer,
+                                   vector<int> &fixed_counts)
+{
+    vector<FixedPrefix> prefixes = getFixedPrefixes(dis, itemSizes, riderBags, previous_answer, fixed_counts);
+
+    vector<bool> is_fixed(numLocations + 1, false);
+    for (int i = 0; i < numRiders; ++i)
+    {
+        for (int j = 0; j < fixed_counts[i]; ++j)
+            is_fixed[previous_answer[i][j]] = true;
+    }
+    vector<int> free_locations;
+    for (int location = 1; location <= numLocations; ++location)
+    {
+        if (!is_fixed[location])
+            free_locations.push_back(location);
+    }
+
+    vector<bool> is_previous(numLocations + 1, false);
+    for (auto &order : previous_answer)
+    {
+        for (int location : order)
+            is_previous[location] = true;
+    }
+    // (-kept previous locations, -served deliveries, total route time), smaller is better
+    typedef tuple<int, int, ll> WarmStartCost;
+    auto getCost = [&](vector<vector<int>> &ans) {
+        int kept = 0, served = 0;
+        for (auto &order : ans)
+        {
+            for (int location : order)
+            {
+                kept += is_previous[location];
+                served++;
+            }
         }
+        return WarmStartCost(-kept, -served, routeTotalTime(dis, ans));
+    };
+    WarmStartCost best_cost;
+    auto recordIfBetter = [&](vector<vector<int>> &ans, WarmStartCost cost) {
+        if (searchControl.best_served >= 0 && cost >= best_cost)
+            return;
+        best_cost = cost;
+        setIncumbent(numRiders, -get<1>(cost), get<2>(cost), ans);
+    };
+
+    vector<vector<int>> repaired = repairPreviousAnswer(dis, itemSizes, times, reach_hub_before_this_time,
+                                                        previous_answer, fixed_counts, prefixes, free_locations);
+    recordIfBetter(repaired, getCost(repaired));
+
+    // the population starts from the repaired answer, its free locations rider by rider
+    // followed by the ones it could not place
+    vector<int> gene_of_location(numLocations + 1, 0);
+    for (int gene = 1; gene <= (int)free_locations.size(); ++gene)
+        gene_of_location[free_locations[gene - 1]] = gene;
+    vector<int> order_of_delivery = {0};
+    vector<bool> is_ordered(free_locations.size() + 1, false);
+    for (int i = 0; i < numRiders; ++i)
+    {
+        for (int j = fixed_counts[i]; j < (int)repaired[i].size(); ++j)
+        {
+            order_of_delivery.push_back(gene_of_location[repaired[i][j]]);
+            is_ordered[gene_of_location[repaired[i][j]]] = true;
+        }
+    }
+    for (int gene = 1; gene <= (int)free_locations.size(); ++gene)
+    {
+        if (!is_ordered[gene])
+            order_of_delivery.push_back(gene);
+    }
+    // crossover needs at least two free locations
+    if (order_of_delivery.size() < 3)
+        return searchControl.best_answer;
+
+    set<pair<WarmStartCost, vector<int>>> st;
+    auto evaluate = [&](vector<int> &order) {
+        int order_served;
+        vector<vector<int>> ans = decodeWarmStart(dis, itemSizes, times, reach_hub_before_this_time, previous_answer,
+                                                  fixed_counts, prefixes, free_locations, order, order_served);
+        WarmStartCost cost = getCost(ans);
+        recordIfBetter(ans, cost);
+        st.insert({cost, order});
+    };
+
+    evaluate(order_of_delivery);
+    for (int i = 1; i < WARM_START_POPULATION && !searchIsDone(); ++i)
+    {
+        vector<int> mutant = order_of_delivery;
+        perturbOrder(mutant);
+        evaluate(mutant);
+    }
+
+    for (int generation = 0; generation < WARM_START_GENERATIONS && !searchIsDone() && st.size() >= 2; ++generation)
+    {
+        int total_permutation = st.size();
+        int ind_par1 = rand() % total_permutation;
+        int ind_par2 = rand() % (total_permutation - 1);
+        if (ind_par2 >= ind_par1)
+            ind_par2++;
+        vector<int> par1 = next(st.begin(), ind_par1)->second;
+        vector<int> par2 = next(st.begin(), ind_par2)->second;
+        vector<vector<int>> childs = crossover(par1, par2);
+        evaluate(childs[0]);
+        evaluate(childs[1]);
+        while ((int)st.size() > WARM_START_POPULATION)
+            st.erase(--st.end());
+    }
 
-        vector<int> edd(num_items+1);
-        for(int i=1; i <= num_items; ++i) {
-            cin>>edd[i];
-            // edd[i]=46800;
+    return searchControl.best_answer;
+}
+
+// The warm start block of the binary format holds, for each rider, the length of its
+// previous order, how many of its first locations are fixed and the order itself.
+bool parseWarmStart(vector<int> &warm_start, int num_items, int num_riders, vector<vector<int>> &previous_answer,
+                    vector<int> &fixed_counts)
+{
+    previous_answer.assign(num_riders, {});
+    fixed_counts.assign(num_riders, 0);
+    vector<bool> is_seen(num_items + 1, false);
+    size_t offset = 0;
+    for (int i = 0; i < num_riders; ++i)
+    {
+        if (offset + 2 > warm_start.size())
+            return false;
+        int length = warm_start[offset++];
+        fixed_counts[i] = warm_start[offset++];
+        if (length < 0 || fixed_counts[i] < 0 || fixed_counts[i] > length || offset + length > warm_start.size())
+            return false;
+        for (int j = 0; j < length; ++j)
+        {
+            int location = warm_start[offset++];
+            if (location < 1 || location > num_items || is_seen[location])
+                return false;
+            is_seen[location] = true;
+            previous_answer[i].push_back(location);
+        }
+    }
+    return offset == warm_start.size();
+}
+
+
+//------------------------------------------------WIRE_FORMAT---------------------------------------------/
+
+// The input is either the original whitespace separated text format or the binary
+// format written by algorithm/protocol.py, told apart by the first byte of stdin.
+// Binary blocks are little-endian, which is the native byte order on x86.
+const char DISPATCH_MAGIC[4] = {'W', 'D', 'S', 'P'};
+// version 2 adds the time budget and quality target to the header and streams incumbents,
+// version 3 adds the random seed and version 4 the warm start block after the bag volumes
+const unsigned int WIRE_PROTOCOL_VERSION = 4;
+
+static_assert(sizeof(int) == 4, "the binary wire format uses 32 bit integers");
+
+struct DispatchInput
+{
+    unsigned int version = 0;  // 0 for the text format
+    int time_budget_ms = 0;
+    int quality_target = 0;
+    unsigned int seed = 0;
+    int num_items;
+    vector<vector<int>> time_adj;
+    vector<int> item_volumes;
+    vector<int> edd;
+    vector<pair<double, double>> coordinates;
+    vector<int> area;
+    int num_riders;
+    vector<int> bag_volumes;
+    vector<int> warm_start;  // empty for a cold start
+};
+
+template <typename T>
+void readBinaryBlock(T *data, size_t count)
+{
+    if (count > 0 && fread(data, sizeof(T), count, stdin) != count)
+    {
+        cerr << "Truncated binary input\n";
+        exit(1);
+    }
+}
+
+bool isBinaryInput()
+{
+    int first_byte = getc(stdin);
+    if (first_byte != EOF)
+    {
+        ungetc(first_byte, stdin);
+    }
+    return first_byte == DISPATCH_MAGIC[0];
+}
+
+// Skips the whitespace between requests, false once stdin is closed.
+bool hasMoreInput()
+{
+    int next_byte;
+    while ((next_byte = getc(stdin)) != EOF && isspace(next_byte))
+    {
+    }
+    if (next_byte == EOF)
+    {
+        return false;
+    }
+    ungetc(next_byte, stdin);
+    return true;
+}
+
+void readDispatchInputText(DispatchInput &input)
+{
+    int num_items;
+    cin>>num_items;
+    input.num_items = num_items;
+
+    input.time_adj.assign(num_items + 1, vector<int> (num_items + 1,0));
+    for (int i = 0; i <= num_items; ++i) {
+        for (int j = 0; j <= num_items; ++j) {
+            cin>>input.time_adj[i][j];
+        }
+    }
+
+    input.item_volumes.assign(num_items+1, 0);
+    for(int i=1; i <= num_items; ++i) {
+        cin>>input.item_volumes[i];
+    }
+
+    input.edd.assign(num_items+1, 0);
+    for(int i=1; i <= num_items; ++i) {
+        cin>>input.edd[i];
+    }
+
+    input.coordinates.assign(num_items+1, {0, 0});
+    for(int i=0; i<=num_items; ++i) { 
+        cin>>input.coordinates[i].first>>input.coordinates[i].second;
+    }
+
+    input.area.assign(num_items+1, 0);
+    for(int i=0; i<=num_items; ++i) {
+        cin>>input.area[i];
+    }
+
+    cin>>input.num_riders;
+
+    input.bag_volumes.assign(input.num_riders, 0);
+    for(int i=0; i< input.num_riders; ++i) {
+        cin>>input.bag_volumes[i];
+    }
+}
+
+void readDispatchInputBinary(DispatchInput &input)
+{
+    char magic[4];
+    unsigned int version;
+    readBinaryBlock(magic, 4);
+    readBinaryBlock(&version, 1);
+    if (memcmp(magic, DISPATCH_MAGIC, 4) != 0 || version < 1 || version > WIRE_PROTOCOL_VERSION)
+    {
+        cerr << "Unsupported dispatch input, version " << version << "\n";
+        exit(1);
+    }
+    input.version = version;
+    readBinaryBlock(&input.num_items, 1);
+    readBinaryBlock(&input.num_riders, 1);
+    if (version >= 2)
+    {
+        readBinaryBlock(&input.time_budget_ms, 1);
+        readBinaryBlock(&input.quality_target, 1);
+    }
+    if (version >= 3)
+    {
+        readBinaryBlock(&input.seed, 1);
+    }
+    int num_items = input.num_items;
+
+    input.time_adj.assign(num_items + 1, vector<int>(num_items + 1, 0));
+    for (int i = 0; i <= num_items; ++i)
+    {
+        readBinaryBlock(input.time_adj[i].data(), num_items + 1);
+    }
+
+    // per item blocks leave index 0 (the warehouse) empty, as in the text format
+    input.item_volumes.assign(num_items + 1, 0);
+    readBinaryBlock(input.item_volumes.data() + 1, num_items);
+
+    input.edd.assign(num_items + 1, 0);
+    readBinaryBlock(input.edd.data() + 1, num_items);
+
+    vector<double> coordinates(2 * (num_items + 1));
+    readBinaryBlock(coordinates.data(), coordinates.size());
+    input.coordinates.resize(num_items + 1);
+    for (int i = 0; i <= num_items; ++i)
+    {
+        input.coordinates[i] = {coordinates[2 * i], coordinates[2 * i + 1]};
+    }
+
+    input.area.assign(num_items + 1, 0);
+    readBinaryBlock(input.area.data(), num_items + 1);
+
+    input.bag_volumes.assign(input.num_riders, 0);
+    readBinaryBlock(input.bag_volumes.data(), input.num_riders);
+
+    if (version >= 4)
+    {
+        int warm_start_length;
+        readBinaryBlock(&warm_start_length, 1);
+        if (warm_start_length < 0)
+        {
+            cerr << "Invalid warm start length " << warm_start_length << "\n";
+            exit(1);
         }
+        input.warm_start.assign(warm_start_length, 0);
+        readBinaryBlock(input.warm_start.data(), warm_start_length);
+    }
+}
+
+// Solves the request, warm started when it carries the riders' previous orders.
+vector<vector<int>> solveDispatchInput(DispatchInput &input, int reach_hub_before_this_time)
+{
+    if (input.warm_start.empty())
+    {
+        return solve(input.num_items, input.time_adj, input.item_volumes, input.edd, input.coordinates, input.area,
+                     input.num_riders, input.bag_volumes, reach_hub_before_this_time);
+    }
+
+    vector<vector<int>> previous_answer;
+    vector<int> fixed_counts;
+    if (!parseWarmStart(input.warm_start, input.num_items, input.num_riders, previous_answer, fixed_counts))
+    {
+        throw invalid_argument("invalid warm start block");
+    }
+    return warmStartSolve(input.num_items, input.time_adj, input.item_volumes, input.edd, input.num_riders,
+                          input.bag_volumes, reach_hub_before_this_time, previous_answer, fixed_counts);
+}
 
-        vector<pair<double,double>> coordinates(num_items+1);
-        for(int i=0; i<=num_items; ++i) { 
-            cin>>coordinates[i].first>>coordinates[i].second;
+
+//------------------------------------------------SHARED_LIBRARY---------------------------------------------/
+
+// Built with -DWDO_SHARED_LIBRARY the solver is a shared library without main, called in
+// process by algorithm/native.py:
+//     g++ -O2 -shared -fPIC -DWDO_SHARED_LIBRARY -o ../bin/libdispatch.so Dispatch_Algorithm.cpp
+#ifdef _WIN32
+#define WDO_EXPORT extern "C" __declspec(dllexport)
+#else
+#define WDO_EXPORT extern "C" __attribute__((visibility("default")))
+#endif
+
+const int WDO_OK = 0;
+const int WDO_ORDERS_TOO_SMALL = 1;
+const int WDO_ERROR = 2;
+
+// Solves a dispatch problem given as the blocks of the binary wire format, without the
+// header, warm_start_length is 0 for a cold start. The best answer is written to orders as the orders of each rider terminated by
+// -1, with its length in orders_length. served is -1 when no valid answer was found.
+WDO_EXPORT int wdo_dispatch_solve(int num_items, int num_riders, const int *time_adj, const int *item_volumes,
+                                  const int *edd, const double *coordinates, const int *area,
+                                  const int *bag_volumes, int time_budget_ms, int quality_target,
+                                  unsigned int seed, const int *warm_start, int warm_start_length, int *orders,
+                                  int orders_capacity, int *orders_length, int *served, long long *total_time)
+{
+    try
+    {
+        startTime = chrono::steady_clock::now();
+
+        DispatchInput input;
+        input.num_items = num_items;
+        input.num_riders = num_riders;
+        input.time_adj.assign(num_items + 1, vector<int>(num_items + 1, 0));
+        for (int i = 0; i <= num_items; ++i)
+        {
+            const int *row = time_adj + (ll)i * (num_items + 1);
+            copy(row, row + num_items + 1, input.time_adj[i].begin());
+        }
+        // per item blocks leave index 0 (the warehouse) empty, as in the text format
+        input.item_volumes.assign(num_items + 1, 0);
+        copy(item_volumes, item_volumes + num_items, input.item_volumes.begin() + 1);
+        input.edd.assign(num_items + 1, 0);
+        copy(edd, edd + num_items, input.edd.begin() + 1);
+        input.coordinates.resize(num_items + 1);
+        for (int i = 0; i <= num_items; ++i)
+        {
+            input.coordinates[i] = {coordinates[2 * i], coordinates[2 * i + 1]};
         }
+        input.area.assign(area, area + num_items + 1);
+        input.bag_volumes.assign(bag_volumes, bag_volumes + num_riders);
+        input.warm_start.assign(warm_start, warm_start + warm_start_length);
+
+        searchControl = SearchControl();
+        searchControl.time_budget = time_budget_ms / 1000.0;
+        searchControl.quality_target = quality_target;
+        seedRandom(seed);
 
-        vector<int> area(num_items+1,0);
-        for(int i=0; i<=num_items; ++i) {
-            cin>>area[i];
-            // area[i]=1;
+        int reach_hub_before_this_time = 46800;
+        solveDispatchInput(input, reach_hub_before_this_time);
+
+        vector<vector<int>> &answer = searchControl.best_answer;
+        *served = searchControl.best_served;
+        *total_time = searchControl.best_total_time;
+
+        int length = num_riders;
+        for (int i = 0; i < num_riders && i < (int)answer.size(); ++i)
+        {
+            length += answer[i].size();
+        }
+        *orders_length = length;
+        if (length > orders_capacity)
+        {
+            return WDO_ORDERS_TOO_SMALL;
         }
 
-        int num_riders;
-        cin>>num_riders;
-        // num_riders = 100;
+        int offset = 0;
+        for (int i = 0; i < num_riders; ++i)
+        {
+            if (i < (int)answer.size())
+            {
+                for (int loc : answer[i])
+                    orders[offset++] = loc;
+            }
+            orders[offset++] = -1;
+        }
+        return WDO_OK;
+    }
+    catch (...)
+    {
+        return WDO_ERROR;
+    }
+}
+
+
+#ifndef WDO_SHARED_LIBRARY
+int main()
+{
+#ifdef _WIN32
+    _setmode(_fileno(stdin), _O_BINARY);
+#endif
+
+    // setIO("sample_test_1"); // add this to test the algorithm
+
+    // the solver serves requests until stdin is closed, so a worker process can be reused
+    while (hasMoreInput())
+    {
+        startTime = chrono::steady_clock::now();
 
-        vector<int> bag_volumes(num_riders);
-        for(int i=0; i< num_riders; ++i) {
-            cin>>bag_volumes[i];
-            // bag_volumes[i]=rand(200,1000);
+        DispatchInput input;
+        if (isBinaryInput())
+        {
+            readDispatchInputBinary(input);
+        }
+        else
+        {
+            readDispatchInputText(input);
         }
 
+        int num_riders = input.num_riders;
         int reach_hub_before_this_time = 46800;
 
+        searchControl = SearchControl();
+        searchControl.time_budget = input.time_budget_ms / 1000.0;
+        searchControl.quality_target = input.quality_target;
+        searchControl.stream_incumbents = input.version >= 2;
+        if (input.version >= 3)
+        {
+            seedRandom(input.seed);
+        }
+
         vector<vector<int>> result(num_riders);
-        result = solve(num_items, time_adj, item_volumes, edd, coordinates, area, num_riders, bag_volumes, reach_hub_before_this_time);
-        
-        for(int i=0; i<num_riders; ++i)
+        result = solveDispatchInput(input, reach_hub_before_this_time);
+
+        if (searchControl.stream_incumbents)
+        {
+            // the last streamed incumbent is the answer
+            std::cout<<"F\n";
+        }
+        else
         {
-            if(result[i].size()==0){std::cout<<-1<<"\n"; continue;}
+            for(int i=0; i<num_riders; ++i)
+            {
+                if(result[i].size()==0){std::cout<<-1<<"\n"; continue;}
 
-            for(auto loc : result[i]){std::cout<<loc<<"\n";} 
-            std::cout<<-1<<"\n";
+                for(auto loc : result[i]){std::cout<<loc<<"\n";} 
+                std::cout<<-1<<"\n";
+            }
         }
+        std::cout<<std::flush;
     }
     
     return 0;
 }
-
+#endif
@@ -2,6 +2,13 @@
 #include<vector>
 #include<cstdlib>
 #include<ctime>
+#include<cstdio>
+#include<cstring>
+#include<cctype>
+#ifdef _WIN32
+#include <io.h>
+#include <fcntl.h>
+#endif
 using namespace std;
 
 pair<int, int> getAns(int current_time,int item_volume,int item_entry_time,int num_riders,
@@ -106,39 +113,83 @@ pair<int, int> getAns(int current_time,int item_volume,int item_entry_time,int n
 }
 
 
-int main ()
-{
-    srand(time(0));
+// The input is either the original whitespace separated text format or the binary
+// format written by algorithm/protocol.py, told apart by the first byte of stdin.
+// Binary blocks are little-endian, which is the native byte order on x86.
+const char PICKUP_MAGIC[4] = {'W', 'P', 'C', 'K'};
+const unsigned int WIRE_PROTOCOL_VERSION = 1;
 
-    // string name = "pickup_input";
-    // freopen((name+".in").c_str(), "r", stdin);
-    
-    int current_time;
-    cin>>current_time;
+static_assert(sizeof(int) == 4, "the binary wire format uses 32 bit integers");
 
+struct PickupInput
+{
+    int current_time;
     int item_volume;
-    cin>>item_volume;
-
     int item_entry_time;
-    cin>>item_entry_time;
-
     int num_riders;
-    cin>>num_riders;
+    vector<int> bag_volume;
+    vector<int> first_task_time;
+    vector<vector<vector<int>>> tasks;
+};
 
-    vector<int> bag_volume(num_riders);
-    for(int i=0; i<num_riders; i++){cin>>bag_volume[i];}
+template <typename T>
+void readBinaryBlock(T *data, size_t count)
+{
+    if (count > 0 && fread(data, sizeof(T), count, stdin) != count)
+    {
+        cerr << "Truncated binary input\n";
+        exit(1);
+    }
+}
 
-    vector<int> first_task_time(num_riders);
-    vector<vector<vector<int>>> tasks(num_riders);
+bool isBinaryInput()
+{
+    int first_byte = getc(stdin);
+    if (first_byte != EOF)
+    {
+        ungetc(first_byte, stdin);
+    }
+    return first_byte == PICKUP_MAGIC[0];
+}
 
-    int reach_hub_before_this_time = 48600;
+// Skips the whitespace between requests, false once stdin is closed.
+bool hasMoreInput()
+{
+    int next_byte;
+    while ((next_byte = getc(stdin)) != EOF && isspace(next_byte))
+    {
+    }
+    if (next_byte == EOF)
+    {
+        return false;
+    }
+    ungetc(next_byte, stdin);
+    return true;
+}
+
+void readPickupInputText(PickupInput &input)
+{
+    cin>>input.current_time;
+
+    cin>>input.item_volume;
+
+    cin>>input.item_entry_time;
+
+    cin>>input.num_riders;
+    int num_riders = input.num_riders;
+
+    input.bag_volume.assign(num_riders, 0);
+    for(int i=0; i<num_riders; i++){cin>>input.bag_volume[i];}
+
+    input.first_task_time.assign(num_riders, 0);
+    input.tasks.assign(num_riders, {});
 
     for(int i=0; i<num_riders; i++)
     {
         int num_tasks;
         cin>>num_tasks;
 
-        cin>>first_task_time[i];
+        cin>>input.first_task_time[i];
 
         while(num_tasks--)
         {
@@ -150,14 +201,132 @@ int main ()
             cin>>time_next; //time to next task, -1 for last task
             cin>>time_from_pickup; //time from pickup point
 
-            tasks[i].push_back({item_volume,task_type,edd,time_next,time_from_pickup});
+            input.tasks[i].push_back({item_volume,task_type,edd,time_next,time_from_pickup});
         }
     }
+}
+
+void readPickupInputBinary(PickupInput &input)
+{
+    char magic[4];
+    unsigned int version;
+    int total_tasks;
+    readBinaryBlock(magic, 4);
+    readBinaryBlock(&version, 1);
+    if (memcmp(magic, PICKUP_MAGIC, 4) != 0 || version != WIRE_PROTOCOL_VERSION)
+    {
+        cerr << "Unsupported pickup input, version " << version << "\n";
+        exit(1);
+    }
+    readBinaryBlock(&input.current_time, 1);
+    readBinaryBlock(&input.item_volume, 1);
+    readBinaryBlock(&input.item_entry_time, 1);
+    readBinaryBlock(&input.num_riders, 1);
+    readBinaryBlock(&total_tasks, 1);
+    int num_riders = input.num_riders;
 
-    pair<int,int> res = getAns(current_time,item_volume,item_entry_time,num_riders,bag_volume,first_task_time,tasks,reach_hub_before_this_time);
+    input.bag_volume.assign(num_riders, 0);
+    readBinaryBlock(input.bag_volume.data(), num_riders);
 
-    std::cout<<res.first<<"\n";
-    std::cout<<res.second<<"\n";
+    vector<int> num_tasks(num_riders);
+    readBinaryBlock(num_tasks.data(), num_riders);
+
+    input.first_task_time.assign(num_riders, 0);
+    readBinaryBlock(input.first_task_time.data(), num_riders);
+
+    vector<int> all_tasks(5 * total_tasks);
+    readBinaryBlock(all_tasks.data(), all_tasks.size());
+
+    input.tasks.assign(num_riders, {});
+    int offset = 0;
+    for(int i=0; i<num_riders; i++)
+    {
+        for(int j=0; j<num_tasks[i]; j++, offset += 5)
+        {
+            input.tasks[i].push_back(vector<int>(all_tasks.begin() + offset, all_tasks.begin() + offset + 5));
+        }
+    }
+}
+
+
+// Built with -DWDO_SHARED_LIBRARY the solver is a shared library without main, called in
+// process by algorithm/native.py:
+//     g++ -O2 -shared -fPIC -DWDO_SHARED_LIBRARY -o ../bin/libpickup.so Pickup_Algorithm.cpp
+#ifdef _WIN32
+#define WDO_EXPORT extern "C" __declspec(dllexport)
+#else
+#define WDO_EXPORT extern "C" __attribute__((visibility("default")))
+#endif
+
+const int WDO_OK = 0;
+const int WDO_ERROR = 2;
+
+// Solves a pickup problem given as the blocks of the binary wire format, without the
+// header. tasks holds total_tasks rows of 5 values.
+WDO_EXPORT int wdo_pickup_solve(int current_time, int item_volume, int item_entry_time, int num_riders,
+                                const int *bag_volumes, const int *num_tasks, const int *first_task_times,
+                                const int *tasks, int *batch_index, int *after_task_index)
+{
+    try
+    {
+        vector<int> bag_volume(bag_volumes, bag_volumes + num_riders);
+        vector<int> first_task_time(first_task_times, first_task_times + num_riders);
+        vector<vector<vector<int>>> rider_tasks(num_riders);
+        for(int i=0, offset=0; i<num_riders; i++)
+        {
+            for(int j=0; j<num_tasks[i]; j++, offset += 5)
+            {
+                rider_tasks[i].push_back(vector<int>(tasks + offset, tasks + offset + 5));
+            }
+        }
+
+        int reach_hub_before_this_time = 48600;
+        pair<int,int> res = getAns(current_time,item_volume,item_entry_time,num_riders,bag_volume,first_task_time,rider_tasks,reach_hub_before_this_time);
+
+        *batch_index = res.first;
+        *after_task_index = res.second;
+        return WDO_OK;
+    }
+    catch (...)
+    {
+        return WDO_ERROR;
+    }
+}
+
+
+#ifndef WDO_SHARED_LIBRARY
+int main ()
+{
+#ifdef _WIN32
+    _setmode(_fileno(stdin), _O_BINARY);
+#endif
+    srand(time(0));
+
+    // string name = "pickup_input";
+    // freopen((name+".in").c_str(), "r", stdin);
+
+    int reach_hub_before_this_time = 48600;
+
+    // the solver serves requests until stdin is closed, so a worker process can be reused
+    while (hasMoreInput())
+    {
+        PickupInput input;
+        if (isBinaryInput())
+        {
+            readPickupInputBinary(input);
+        }
+        else
+        {
+            readPickupInputText(input);
+        }
+
+        pair<int,int> res = getAns(input.current_time,input.item_volume,input.item_entry_time,input.num_riders,input.bag_volume,input.first_task_time,input.tasks,reach_hub_before_this_time);
+
+        std::cout<<res.first<<"\n";
+        std::cout<<res.second<<"\n";
+        std::cout<<std::flush;
+    }
 
     return 0;
-}
\ No newline at end of file
+}
+#endif
@@ -0,0 +1,196 @@
+"""
+Pools of long-lived solver processes, driven by asyncio.
+
+dispatch.exe and pickup.exe read requests from stdin until it is closed, so one process
+can answer many requests. A pool keeps the idle workers of one solver and lends one to
+each request, replacing workers that exited. A global semaphore caps the number of
+solver processes working at once to SOLVER_POOL_SIZE across all pools.
+
+Responses are streamed from the solver's stdout. When the awaiting task is cancelled,
+by a timeout or a disconnected client, the worker it borrowed is killed and reaped
+before the cancellation propagates, so no solver keeps running for an abandoned request.
+Solvers built before they learned to loop simply exit after one answer and are
+respawned on the next borrow. Requests failing because the solver died or answered
+garbage are counted in wos_solver_crashes_total, see metrics.py.
+"""
+
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+from contextlib import asynccontextmanager
+import asyncio
+import os
+
+from ..metrics import solver_crashes, solver_fallbacks
+from ..settings import settings
+
+
+DISPATCH_PROGRAM_PATH = "./algorithm/runnable/bin/dispatch.exe"
+PICKUP_PROGRAM_PATH = "./algorithm/runnable/bin/pickup.exe"
+
+T = TypeVar("T")
+
+ResponseReader = Callable[[asyncio.StreamReader], Awaitable[T]]
+
+
+class SolverWorker:
+    """
+    One solver process and its pipes.
+    """
+
+    def __init__(self, process: asyncio.subprocess.Process, solver: str):
+        self.process = process
+        self.solver = solver
+        self.requests_served = 0
+
+    @classmethod
+    async def start(cls, program_path: str) -> "SolverWorker":
+        process = await asyncio.create_subprocess_exec(
+            program_path,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        return cls(process, get_solver_name(program_path))
+
+    def is_alive(self) -> bool:
+        return self.process.returncode is None
+
+    async def request(self, payload: bytes, read_response: ResponseReader[T]) -> T:
+        assert self.process.stdin is not None and self.process.stdout is not None
+        try:
+            self.process.stdin.write(payload)
+            await self.process.stdin.drain()
+            response = await read_response(self.process.stdout)
+        except (BrokenPipeError, ConnectionResetError, EOFError, ValueError):
+            solver_crashes.inc(solver=self.solver)
+            raise
+        self.requests_served += 1
+        return response
+
+    async def kill(self) -> None:
+        """
+        Kills the solver and waits for it to exit so no zombie is left behind.
+        """
+        if self.is_alive():
+            try:
+                self.process.kill()
+            except ProcessLookupError:
+                pass
+        await self.process.wait()
+
+    async def close(self) -> None:
+        """
+        Closes stdin so the solver exits after its current request.
+        """
+        try:
+            if self.process.stdin is not None:
+                self.process.stdin.close()
+            await asyncio.wait_for(self.process.wait(), timeout=5)
+        except BaseException:
+            await self.kill()
+
+
+class SolverPool:
+    def __init__(self, program_path: str, max_idle: int):
+        self.program_path = program_path
+        self.max_idle = max_idle
+        self._idle: List[SolverWorker] = []
+
+    @asynccontextmanager
+    async def borrow(self) -> AsyncIterator[SolverWorker]:
+        """
+        Lends a healthy worker, waiting while SOLVER_POOL_SIZE workers are busy. A worker
+        whose borrower raised or was cancelled is killed and reaped, since it may still
+        be solving and its pipes are in an unknown state.
+        """
+        async with get_solver_semaphore():
+            worker = await self._take_healthy_worker()
+            try:
+                yield worker
+            except BaseException:
+                await asyncio.shield(worker.kill())
+                raise
+            if worker.is_alive() and len(self._idle) < self.max_idle:
+                self._idle.append(worker)
+            else:
+                await worker.close()
+
+    async def request(
+        self,
+        payload: bytes,
+        read_response: ResponseReader[T],
+        timeout: Optional[float] = None,
+    ) -> T:
+        """
+        Sends a request to a pooled worker. A reused worker may have exited between its
+        health check and the request, in which case the request is retried once on a
+        fresh worker.
+
+        The timeout in seconds starts once a worker is lent, time spent waiting for a
+        free solver slot doesn't count against it. A worker still busy when it expires
+        is killed and asyncio.TimeoutError is raised.
+        """
+        reused = False
+        try:
+            async with self.borrow() as worker:
+                reused = worker.requests_served > 0
+                return await asyncio.wait_for(
+                    worker.request(payload, read_response), timeout=timeout
+                )
+        except (BrokenPipeError, ConnectionResetError, EOFError):
+            if not reused:
+                raise
+        solver_fallbacks.inc(
+            solver=get_solver_name(self.program_path), fallback="fresh_worker"
+        )
+        async with self.borrow() as worker:
+            return await asyncio.wait_for(
+                worker.request(payload, read_response), timeout=timeout
+            )
+
+    async def close(self) -> None:
+        workers, self._idle = self._idle, []
+        await asyncio.gather(*(worker.close() for worker in workers))
+
+    async def _take_healthy_worker(self) -> SolverWorker:
+        while len(self._idle) > 0:
+            worker = self._idle.pop()
+            if worker.is_alive():
+                return worker
+            await worker.kill()
+        return await SolverWorker.start(self.program_path)
+
+
+def get_solver_name(program_path: str) -> str:
+    """
+    The solver's name in metrics, "dispatch" or "pickup".
+    """
+    return os.path.splitext(os.path.basename(program_path))[0]
+
+
+def get_solver_pool_size() -> int:
+    return settings.SOLVER_POOL_SIZE or os.cpu_count() or 1
+
+
+_solver_pools: Dict[str, SolverPool] = {}
+_solver_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_solver_semaphore() -> asyncio.Semaphore:
+    """
+    The semaphore shared by all pools, bounding the solver processes working at once.
+    """
+    global _solver_semaphore
+    if _solver_semaphore is None:
+        _solver_semaphore = asyncio.Semaphore(get_solver_pool_size())
+    return _solver_semaphore
+
+
+def get_solver_pool(program_path: str) -> SolverPool:
+    if program_path not in _solver_pools:
+        _solver_pools[program_path] = SolverPool(program_path, get_solver_pool_size())
+    return _solver_pools[program_path]
+
+
+async def close_solver_pools() -> None:
+    pools = list(_solver_pools.values())
+    _solver_pools.clear()
+    await asyncio.gather(*(pool.close() for pool in pools))
@@ -0,0 +1,149 @@
+"""
+Geographic decomposition of large dispatch problems.
+
+Deliveries are partitioned into zones with k-means on their coordinates, projected so
+that a degree of longitude and of latitude weigh the same distance, and the riders are
+split between the zones in proportion to the volume to deliver in each.
+"""
+
+from typing import List
+import math
+
+import numpy as np
+
+
+# k-means stops after this many iterations even if assignments still change
+MAX_KMEANS_ITERATIONS = 50
+
+
+def _get_projected_points(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    longitude_scale = math.cos(math.radians(float(np.mean(latitudes))))
+    return np.column_stack([latitudes, longitudes * longitude_scale])
+
+
+def get_kmeans_labels(
+    latitudes: np.ndarray, longitudes: np.ndarray, num_clusters: int, seed: int = 0
+) -> np.ndarray:
+    """
+    This function returns the k-means cluster, from 0 to num_clusters - 1, of each
+    coordinate. Centers are seeded with k-means++ and an empty cluster is moved to the
+    point farthest from its center, so every cluster ends up with at least one point.
+    """
+    num_points = len(latitudes)
+    num_clusters = max(1, min(num_clusters, num_points))
+    if num_clusters == 1:
+        return np.zeros(num_points, dtype=np.int64)
+
+    points = _get_projected_points(latitudes, longitudes)
+    rng = np.random.default_rng(seed)
+
+    centers = np.empty((num_clusters, 2), dtype=np.float64)
+    centers[0] = points[rng.integers(num_points)]
+    squared_distances = np.sum((points - centers[0]) ** 2, axis=1)
+    for cluster in range(1, num_clusters):
+        total = squared_distances.sum()
+        index = (
+            rng.choice(num_points, p=squared_distances / total)
+            if total > 0
+            else rng.integers(num_points)
+        )
+        centers[cluster] = points[index]
+        squared_distances = np.minimum(
+            squared_distances, np.sum((points - centers[cluster]) ** 2, axis=1)
+        )
+
+    labels = np.full(num_points, -1, dtype=np.int64)
+    for _ in range(MAX_KMEANS_ITERATIONS):
+        point_center_distances = np.sum(
+            (points[:, None, :] - centers[None, :, :]) ** 2, axis=2
+        )
+        new_labels = np.argmin(point_center_distances, axis=1)
+
+        counts = np.bincount(new_labels, minlength=num_clusters)
+        for cluster in np.flatnonzero(counts == 0):
+            farthest = int(
+                np.argmax(point_center_distances[np.arange(num_points), new_labels])
+            )
+            counts[new_labels[farthest]] -= 1
+            new_labels[farthest] = cluster
+            counts[cluster] = 1
+            point_center_distances[farthest, :] = 0
+
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for axis in range(2):
+            centers[:, axis] = np.bincount(
+                labels, weights=points[:, axis], minlength=num_clusters
+            ) / np.maximum(counts, 1)
+
+    return labels
+
+
+def get_zone_labels(
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    num_zones: int,
+    max_zone_size: int,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    This function partitions the coordinates into num_zones zones or more, the zones
+    k-means leaves larger than max_zone_size are split again so no solve outgrows it.
+    Zones are numbered from 0 without gaps.
+    """
+    labels = get_kmeans_labels(latitudes, longitudes, num_zones, seed)
+
+    zone_labels = np.empty_like(labels)
+    num_split_zones = 0
+    for zone in range(int(labels.max()) + 1):
+        members = np.flatnonzero(labels == zone)
+        if len(members) == 0:
+            continue
+        sub_labels = get_kmeans_labels(
+            latitudes[members],
+            longitudes[members],
+            math.ceil(len(members) / max_zone_size),
+            seed,
+        )
+        zone_labels[members] = num_split_zones + sub_labels
+        num_split_zones += int(sub_labels.max()) + 1
+    return zone_labels
+
+
+def split_riders(zone_volumes: np.ndarray, bag_volumes: np.ndarray) -> List[np.ndarray]:
+    """
+    This function returns the indices of the riders given to each zone. Every zone gets
+    one rider and the rest are shared in proportion to the zone volumes by largest
+    remainder, the riders with the largest bags going first to the zones with the most
+    volume per rider. There must be at least as many riders as zones.
+    """
+    num_zones = len(zone_volumes)
+    num_riders = len(bag_volumes)
+    assert num_riders >= num_zones, "Every zone needs at least one rider"
+
+    zone_volumes = np.asarray(zone_volumes, dtype=np.float64)
+    total_volume = zone_volumes.sum()
+    shares = (
+        zone_volumes / total_volume
+        if total_volume > 0
+        else np.full(num_zones, 1 / num_zones)
+    )
+    quotas = shares * (num_riders - num_zones)
+    counts = 1 + np.floor(quotas).astype(np.int64)
+    remainders = quotas - np.floor(quotas)
+    for zone in np.argsort(-remainders, kind="stable")[: num_riders - counts.sum()]:
+        counts[zone] += 1
+
+    zone_riders: List[List[int]] = [[] for _ in range(num_zones)]
+    for rider in np.argsort(-np.asarray(bag_volumes), kind="stable").tolist():
+        zone = max(
+            (
+                zone
+                for zone in range(num_zones)
+                if len(zone_riders[zone]) < counts[zone]
+            ),
+            key=lambda zone: zone_volumes[zone] / (len(zone_riders[zone]) + 1),
+        )
+        zone_riders[zone].append(rider)
+    return [np.array(riders, dtype=np.int64) for riders in zone_riders]
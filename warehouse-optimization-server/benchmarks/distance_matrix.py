@@ -0,0 +1,86 @@
+"""
+Benchmark of the pairwise travel time matrix builders.
+
+Compares the scalar per-pair loop against the vectorized NumPy engine for growing
+numbers of points scattered around the warehouse.
+
+Run from the repository root:
+
+    python -m warehouse-optimization-server.benchmarks.distance_matrix
+"""
+
+import argparse
+import time
+from typing import List
+
+import numpy as np
+
+from ..algorithm.map import distance as map_distance_service
+from ..constants import WAREHOUSE_LOCATION
+from ..schemas import Coordinate
+from ..settings import settings
+
+
+def _get_random_coordinates(num_points: int, spread_degrees: float = 0.15) -> List[Coordinate]:
+    rng = np.random.default_rng(0)
+    warehouse_coordinate = WAREHOUSE_LOCATION.coordinate
+    latitudes = warehouse_coordinate.latitude + rng.uniform(-spread_degrees, spread_degrees, num_points)
+    longitudes = warehouse_coordinate.longitude + rng.uniform(-spread_degrees, spread_degrees, num_points)
+    return [
+        Coordinate(latitude=latitude, longitude=longitude)
+        for latitude, longitude in zip(latitudes.tolist(), longitudes.tolist())
+    ]
+
+
+def _get_scalar_pairwise_distance_matrix(coordinates: List[Coordinate]) -> List[List[int]]:
+    num_coordinates = len(coordinates)
+    distance_matrix = [[0] * num_coordinates for _ in range(num_coordinates)]
+    for i in range(num_coordinates):
+        for j in range(num_coordinates):
+            if i != j:
+                distance_matrix[i][j] = map_distance_service.get_simulated_temporal_distance(
+                    coordinates[i], coordinates[j]
+                )
+    return distance_matrix
+
+
+def _time(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 1000, 2000, 5000])
+    parser.add_argument(
+        "--scalar-limit",
+        type=int,
+        default=1000,
+        help="largest size for which the scalar loop is also timed",
+    )
+    parser.add_argument(
+        "--noise-mode",
+        choices=["random", "deterministic"],
+        default=settings.DISTANCE_NOISE_MODE,
+        help="deterministic mode only computes the upper triangle of the matrix",
+    )
+    args = parser.parse_args()
+    settings.DISTANCE_NOISE_MODE = args.noise_mode
+
+    print(f"{'points':>8} {'scalar (s)':>12} {'vectorized (s)':>15} {'speedup':>9}")
+    for num_points in args.sizes:
+        coordinates = _get_random_coordinates(num_points)
+        vectorized_seconds = _time(map_distance_service.get_pairwise_distance_matrix, coordinates)
+        if num_points <= args.scalar_limit:
+            scalar_seconds = _time(_get_scalar_pairwise_distance_matrix, coordinates)
+            print(
+                f"{num_points:>8} {scalar_seconds:>12.3f} {vectorized_seconds:>15.3f} "
+                f"{scalar_seconds / vectorized_seconds:>8.1f}x"
+            )
+        else:
+            print(f"{num_points:>8} {'-':>12} {vectorized_seconds:>15.3f} {'-':>9}")
+
+
+if __name__ == "__main__":
+    main()
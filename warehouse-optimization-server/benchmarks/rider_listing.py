@@ -0,0 +1,157 @@
+"""
+Benchmark of the rider listing.
+
+Seeds a scratch database with growing numbers of riders, each with a batch and a route
+view for the current day, and times RiderService.get_riders against looking up each
+rider's batch one at a time as the listing did before, counting the find commands each
+sends. The listing sends the same two finds whatever the number of riders, so its time
+grows linearly with it.
+
+Needs a MongoDB server at MONGO_URL, the scratch database is dropped afterwards. Run
+from the repository root:
+
+    python -m warehouse-optimization-server.benchmarks.rider_listing
+"""
+
+import argparse
+import asyncio
+import datetime
+import time
+
+import motor.motor_asyncio
+from beanie import PydanticObjectId, init_beanie
+from pymongo import monitoring
+
+from ..constants import WAREHOUSE_LOCATION
+from ..crud import delivery_batch as delivery_batch_crud
+from ..crud import rider_route_view as rider_route_view_crud
+from ..enums import DeliveryStatus
+from ..models.delivery import DeliveryTask
+from ..models.delivery_batch import DeliveryTaskRef, DeliveryTasksBatch
+from ..models.item import Item
+from ..models.rider import Rider
+from ..models.rider_route_view import RiderRouteView
+from ..order_keys import get_order_keys_between
+from ..schemas import DeliveryInformation
+from ..services.delivery_batch import DeliveryBatchService
+from ..services.rider import RiderService
+from ..settings import settings
+
+
+class _FindCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name == "find":
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def _seed(num_riders: int, tasks_per_rider: int):
+    expected_delivery_time = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=4)
+    items, delivery_tasks, riders, delivery_tasks_batches = [], [], [], []
+    for rider_index in range(num_riders):
+        rider = Rider(
+            id=PydanticObjectId(),
+            name=f"rider {rider_index}",
+            age=30,
+            bag_volume=100,
+            phone_number="0000000000",
+        )
+        rider_delivery_tasks = []
+        for task_index in range(tasks_per_rider):
+            item = Item(id=PydanticObjectId(), name=f"item {rider_index}.{task_index}", description="")
+            delivery_task = DeliveryTask(
+                id=PydanticObjectId(),
+                items=[item],
+                delivery_information=DeliveryInformation(
+                    expected_delivery_time=expected_delivery_time,
+                    delivery_type="delivery",
+                    awb_id=f"{rider_index}.{task_index}",
+                    delivery_location=WAREHOUSE_LOCATION,
+                ),
+                status=DeliveryStatus.DISPATCHED.name,
+            )
+            items.append(item)
+            rider_delivery_tasks.append(delivery_task)
+        order_keys = get_order_keys_between(None, None, tasks_per_rider)
+        delivery_tasks_batches.append(
+            DeliveryTasksBatch(
+                rider=rider,
+                tasks=[
+                    DeliveryTaskRef(delivery_task=delivery_task.id, order_key=order_key)  # type: ignore
+                    for delivery_task, order_key in zip(rider_delivery_tasks, order_keys)
+                ],
+            )
+        )
+        riders.append(rider)
+        delivery_tasks.extend(rider_delivery_tasks)
+    for document_model, documents in [
+        (Item, items),
+        (DeliveryTask, delivery_tasks),
+        (Rider, riders),
+        (DeliveryTasksBatch, delivery_tasks_batches),
+    ]:
+        if documents:
+            await document_model.insert_many(documents)
+    await rider_route_view_crud.save_rider_route_views(await delivery_batch_crud.get_delivery_tasks_batches())
+    return [rider.id for rider in riders]
+
+
+async def _time(find_counter: _FindCounter, coroutine_function):
+    find_counter.count = 0
+    start = time.perf_counter()
+    await coroutine_function()
+    return time.perf_counter() - start, find_counter.count
+
+
+async def _get_riders_one_by_one(rider_ids):
+    for rider_id in rider_ids:
+        await DeliveryBatchService.get_delivery_tasks_batch_for_rider(rider_id)
+
+
+async def _main(args):
+    find_counter = _FindCounter()
+    client = motor.motor_asyncio.AsyncIOMotorClient(settings.MONGO_URL, event_listeners=[find_counter])
+    database_name = f"{settings.MONGO_NAME}_rider_listing_benchmark"
+    await client.drop_database(database_name)
+    await init_beanie(
+        database=client[database_name],
+        document_models=[Item, Rider, DeliveryTask, DeliveryTasksBatch, RiderRouteView],
+    )
+    print(f"{'riders':>6} {'listing (s)':>12} {'finds':>6} {'one by one (s)':>15} {'finds':>6}")
+    try:
+        num_seeded_riders = 0
+        rider_ids = []
+        for num_riders in sorted(args.sizes):
+            rider_ids += await _seed(num_riders - num_seeded_riders, args.tasks_per_rider)
+            num_seeded_riders = num_riders
+            listing_seconds, listing_finds = await _time(find_counter, RiderService.get_riders)
+            one_by_one_seconds, one_by_one_finds = await _time(
+                find_counter, lambda: _get_riders_one_by_one(rider_ids)
+            )
+            print(
+                f"{num_riders:>6} {listing_seconds:>12.3f} {listing_finds:>6} "
+                f"{one_by_one_seconds:>15.3f} {one_by_one_finds:>6}"
+            )
+    finally:
+        await client.drop_database(database_name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 200, 500, 1000, 2000])
+    parser.add_argument("--tasks-per-rider", type=int, default=25)
+    args = parser.parse_args()
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
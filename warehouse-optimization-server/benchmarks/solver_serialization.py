@@ -0,0 +1,109 @@
+"""
+Benchmark of the solver input serialization.
+
+Compares, for growing dispatch problems, the original line by line text writes against
+the batched text and binary encoders of algorithm/protocol.py. The end to end time
+includes encoding and pushing the payload through a pipe to a consumer process.
+
+Run from the repository root:
+
+    python -m warehouse-optimization-server.benchmarks.solver_serialization
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from ..algorithm import protocol
+
+SINK_COMMAND = [sys.executable, "-c", "import sys; sys.stdin.buffer.read()"]
+
+
+def _get_random_problem(num_items: int, num_riders: int):
+    rng = np.random.default_rng(0)
+    distance_matrix = rng.integers(60, 3600, size=(num_items + 1, num_items + 1), dtype=np.int32)
+    np.fill_diagonal(distance_matrix, 0)
+    return (
+        distance_matrix,
+        rng.integers(1, 20, size=num_items),
+        rng.integers(3600, 46800, size=num_items),
+        17.4 + rng.uniform(-0.1, 0.1, size=num_items + 1),
+        78.4 + rng.uniform(-0.1, 0.1, size=num_items + 1),
+        np.ones(num_items + 1, dtype=np.int32),
+        rng.integers(50, 200, size=num_riders),
+    )
+
+
+def _write_line_by_line(stream, problem):
+    """
+    The serialization DispatchAlgorithm used before the protocol module.
+    """
+    distance_matrix, volumes, edds, latitudes, longitudes, areas, bag_volumes = problem
+    matrix = distance_matrix.tolist()
+    num_items = len(volumes)
+    stream.write(str(num_items) + "\n")
+    for i in range(num_items + 1):
+        for j in range(num_items + 1):
+            stream.write(str(int(matrix[i][j])) + "\n")
+    for volume in volumes.tolist():
+        stream.write(str(int(volume)) + "\n")
+    for edd in edds.tolist():
+        stream.write(str(int(edd)) + "\n")
+    for latitude, longitude in zip(latitudes.tolist(), longitudes.tolist()):
+        stream.write(str(latitude) + "\n")
+        stream.write(str(longitude) + "\n")
+    for area in areas.tolist():
+        stream.write(str(area) + "\n")
+    stream.write(str(len(bag_volumes)) + "\n")
+    for bag_volume in bag_volumes.tolist():
+        stream.write(str(int(bag_volume)) + "\n")
+    stream.flush()
+
+
+def _time_line_by_line(problem) -> float:
+    start = time.perf_counter()
+    p = subprocess.Popen(SINK_COMMAND, stdin=subprocess.PIPE, encoding="utf8")
+    _write_line_by_line(p.stdin, problem)
+    p.stdin.close()
+    p.wait()
+    return time.perf_counter() - start
+
+
+def _time_encoded(wire_format, problem):
+    start = time.perf_counter()
+    p = subprocess.Popen(SINK_COMMAND, stdin=subprocess.PIPE)
+    encode_start = time.perf_counter()
+    payload = protocol.encode_dispatch_input(wire_format, *problem)
+    encode_seconds = time.perf_counter() - encode_start
+    p.stdin.write(payload)
+    p.stdin.close()
+    p.wait()
+    return encode_seconds, time.perf_counter() - start, len(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 1000, 3000])
+    parser.add_argument("--riders", type=int, default=50)
+    args = parser.parse_args()
+
+    print(
+        f"{'items':>6} {'lines e2e (s)':>14} {'text enc (s)':>13} {'text e2e (s)':>13} "
+        f"{'bin enc (s)':>12} {'bin e2e (s)':>12} {'text MB':>8} {'bin MB':>7}"
+    )
+    for num_items in args.sizes:
+        problem = _get_random_problem(num_items, args.riders)
+        line_by_line_seconds = _time_line_by_line(problem)
+        text_encode, text_total, text_size = _time_encoded("text", problem)
+        binary_encode, binary_total, binary_size = _time_encoded("binary", problem)
+        print(
+            f"{num_items:>6} {line_by_line_seconds:>14.3f} {text_encode:>13.3f} {text_total:>13.3f} "
+            f"{binary_encode:>12.4f} {binary_total:>12.3f} {text_size / 1e6:>8.1f} {binary_size / 1e6:>7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
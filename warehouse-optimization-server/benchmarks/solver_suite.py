@@ -0,0 +1,581 @@
+"""
+Benchmark suite of the dispatch.exe and pickup.exe solvers with regression tracking.
+
+Synthetic instances are generated from a few parameters: the number of deliveries, the
+number of riders, the bag volume distribution, the spread of the expected delivery
+times and a city-like spread around the warehouse, a dense core and a few neighbourhood
+clusters. Each instance is encoded in the solver input format and fed to a fresh solver
+process, which records its wall time and peak resident memory, and the answer is scored
+against the instance:
+
+- dispatch: deliveries served, total route time, late deliveries and total lateness,
+  trips over the bag volume and riders back at the hub too late.
+- pickup: whether the pickup was assigned, when it is picked up, the time the detour
+  adds to the batch and the tasks it makes late.
+
+The results are written as JSON and compared with a stored baseline, the metrics that
+got worse by more than their tolerance are flagged and the run exits with status 1.
+Instances are generated from fixed seeds and the solver is seeded, so the scores only
+change when the solver does, as long as its time budget does not cut the search short.
+
+Run from the repository root, once to record the baseline and then to compare with it:
+
+    python -m warehouse-optimization-server.benchmarks.solver_suite --update-baseline
+    python -m warehouse-optimization-server.benchmarks.solver_suite
+
+The baseline is machine specific, it should be recorded on the machine the suite is
+compared on. A time budget needs the binary wire format and solvers built from the
+current sources, --wire-format text runs the original builds without one.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from ..algorithm import protocol
+from ..algorithm.map import distance as map_distance_service
+from ..algorithm.post_optimize import REACH_HUB_BEFORE_SECONDS
+from ..algorithm.problem import DispatchProblem
+from ..algorithm.solver_pool import DISPATCH_PROGRAM_PATH, PICKUP_PROGRAM_PATH
+from ..constants import WAREHOUSE_LOCATION
+from ..settings import settings
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "solver_suite.json")
+
+# metric: (relative tolerance, whether higher is better), a metric is flagged when it is
+# worse than the baseline by more than the tolerance
+REGRESSION_TOLERANCES: Dict[str, Tuple[float, bool]] = {
+    "wall_seconds": (0.25, False),
+    "peak_rss_bytes": (0.10, False),
+    "served": (0.0, True),
+    "total_route_time": (0.02, False),
+    "late_deliveries": (0.0, False),
+    "total_lateness_seconds": (0.0, False),
+    "overloaded_trips": (0.0, False),
+    "late_returns": (0.0, False),
+    "assigned": (0.0, True),
+    "pickup_time": (0.0, False),
+    "added_time": (0.0, False),
+    "late_tasks": (0.0, False),
+}
+# differences below these are noise, timers and solvers that exit between two samples
+# of their memory
+MIN_REGRESSIONS = {"wall_seconds": 0.05, "peak_rss_bytes": 4 * 2**20}
+
+
+class InstanceParameters(NamedTuple):
+    name: str
+    solver: str  # "dispatch" or "pickup"
+    num_deliveries: int  # tasks already in the batches for pickup instances
+    num_riders: int
+    # bag volumes are uniform in bag_volume_mean +- bag_volume_spread, item volumes in 1..10
+    bag_volume_mean: int = 100
+    bag_volume_spread: int = 50
+    # expected delivery times are uniform in this range of seconds from the day start
+    edd_min_seconds: int = 14400
+    edd_max_seconds: int = 46800
+    # deliveries within about this many degrees of the warehouse
+    city_radius_degrees: float = 0.15
+    num_neighbourhoods: int = 6
+    # share of deliveries in the dense core around the warehouse, the rest are in the
+    # neighbourhoods
+    core_share: float = 0.4
+    seed: int = 0
+
+
+def _get_suites() -> Dict[str, List[InstanceParameters]]:
+    quick = [
+        InstanceParameters("dispatch-50", "dispatch", 50, 4),
+        InstanceParameters("dispatch-200", "dispatch", 200, 10),
+        InstanceParameters("dispatch-200-tight-edd", "dispatch", 200, 10, edd_min_seconds=3600, edd_max_seconds=14400),
+        InstanceParameters("dispatch-200-small-bags", "dispatch", 200, 10, bag_volume_mean=40, bag_volume_spread=10),
+        InstanceParameters("dispatch-500-sprawl", "dispatch", 500, 20, city_radius_degrees=0.3, core_share=0.1),
+        InstanceParameters("pickup-200", "pickup", 200, 10),
+        InstanceParameters("pickup-1000", "pickup", 1000, 40),
+    ]
+    full = quick + [
+        InstanceParameters("dispatch-1000", "dispatch", 1000, 40),
+        InstanceParameters("dispatch-2000", "dispatch", 2000, 80),
+        InstanceParameters("dispatch-5000", "dispatch", 5000, 200),
+        InstanceParameters("dispatch-10000", "dispatch", 10000, 400),
+        InstanceParameters("pickup-10000", "pickup", 10000, 400),
+    ]
+    return {"quick": quick, "full": full}
+
+
+def _get_city_coordinates(parameters: InstanceParameters, rng: np.random.Generator, num_points: int):
+    """
+    Returns coordinates in a dense core around the warehouse and in neighbourhood
+    clusters spread over the city, in degrees with longitudes scaled to the same
+    distance as latitudes.
+    """
+    warehouse_coordinate = WAREHOUSE_LOCATION.coordinate
+    radius = parameters.city_radius_degrees
+    longitude_scale = 1 / math.cos(math.radians(warehouse_coordinate.latitude))
+
+    num_core_points = int(round(num_points * parameters.core_share))
+    offsets = [rng.normal(0, radius / 4, size=(num_core_points, 2))]
+    if num_points > num_core_points:
+        num_neighbourhoods = max(1, parameters.num_neighbourhoods)
+        angles = rng.uniform(0, 2 * math.pi, num_neighbourhoods)
+        distances = radius * np.sqrt(rng.uniform(0.1, 1, num_neighbourhoods))
+        centers = np.column_stack([distances * np.sin(angles), distances * np.cos(angles)])
+        neighbourhoods = rng.integers(num_neighbourhoods, size=num_points - num_core_points)
+        offsets.append(centers[neighbourhoods] + rng.normal(0, radius / 10, size=(len(neighbourhoods), 2)))
+    offsets = np.clip(np.concatenate(offsets), -radius, radius)
+    rng.shuffle(offsets)
+    return (
+        warehouse_coordinate.latitude + offsets[:, 0],
+        warehouse_coordinate.longitude + offsets[:, 1] * longitude_scale,
+    )
+
+
+def _get_bag_volumes(parameters: InstanceParameters, rng: np.random.Generator) -> np.ndarray:
+    return np.maximum(
+        1,
+        rng.integers(
+            parameters.bag_volume_mean - parameters.bag_volume_spread,
+            parameters.bag_volume_mean + parameters.bag_volume_spread + 1,
+            size=parameters.num_riders,
+        ),
+    ).astype(np.int32)
+
+
+def get_dispatch_instance(parameters: InstanceParameters) -> DispatchProblem:
+    rng = np.random.default_rng(parameters.seed)
+    num_deliveries = parameters.num_deliveries
+    latitudes, longitudes = _get_city_coordinates(parameters, rng, num_deliveries)
+    warehouse_coordinate = WAREHOUSE_LOCATION.coordinate
+    return DispatchProblem(
+        delivery_task_ids=list(range(num_deliveries)),  # type: ignore
+        rider_ids=list(range(parameters.num_riders)),  # type: ignore
+        latitudes=np.concatenate(([warehouse_coordinate.latitude], latitudes)),
+        longitudes=np.concatenate(([warehouse_coordinate.longitude], longitudes)),
+        areas=np.ones(num_deliveries + 1, dtype=np.int32),
+        volumes=rng.integers(1, 11, size=num_deliveries).astype(np.int32),
+        expected_delivery_time_deltas=rng.integers(
+            parameters.edd_min_seconds, parameters.edd_max_seconds + 1, size=num_deliveries
+        ),
+        bag_volumes=_get_bag_volumes(parameters, rng),
+    )
+
+
+def get_pickup_instance(parameters: InstanceParameters) -> tuple:
+    """
+    Returns the arguments of protocol.encode_pickup_input. The riders are on their way
+    through batches of the generated tasks, in expected delivery time order, a tenth of
+    them pickups, and a new pickup comes in at a random time of the morning.
+    """
+    rng = np.random.default_rng(parameters.seed)
+    warehouse_coordinate = WAREHOUSE_LOCATION.coordinate
+    latitudes, longitudes = _get_city_coordinates(parameters, rng, parameters.num_deliveries + 1)
+    pickup_latitude, pickup_longitude = latitudes[-1], longitudes[-1]
+    current_time = int(rng.integers(3600, 14400))
+
+    first_task_times: List[int] = []
+    tasks: List[np.ndarray] = []
+    for rider_tasks in np.array_split(np.arange(parameters.num_deliveries), parameters.num_riders):
+        if len(rider_tasks) == 0:
+            continue
+        edds = np.sort(
+            rng.integers(parameters.edd_min_seconds, parameters.edd_max_seconds + 1, size=len(rider_tasks))
+        )
+        # hub, the tasks in order, then the pickup
+        path_latitudes = np.concatenate(([warehouse_coordinate.latitude], latitudes[rider_tasks], [pickup_latitude]))
+        path_longitudes = np.concatenate(
+            ([warehouse_coordinate.longitude], longitudes[rider_tasks], [pickup_longitude])
+        )
+        distance_matrix = map_distance_service.get_pairwise_distance_matrix_from_arrays(
+            path_latitudes, path_longitudes
+        )
+        task_locations = np.arange(1, len(rider_tasks) + 1)
+        next_locations = np.append(task_locations[1:], 0)
+        rider_task_rows = np.column_stack(
+            [
+                rng.integers(1, 11, size=len(rider_tasks)),
+                (rng.random(len(rider_tasks)) < 0.1).astype(np.int64),
+                edds,
+                distance_matrix[task_locations, next_locations],
+                distance_matrix[task_locations, len(rider_tasks) + 1],
+            ]
+        ).astype(np.int64)
+        first_task_times.append(int(distance_matrix[0, 1]))
+        tasks.append(rider_task_rows)
+
+    bag_volumes = _get_bag_volumes(parameters, rng)[: len(tasks)]
+    item_volume = int(rng.integers(1, 6))
+    return current_time, item_volume, current_time, bag_volumes, first_task_times, tasks
+
+
+# how often the solver's memory high water mark is read on Linux
+RSS_SAMPLE_SECONDS = 0.005
+
+
+def _read_high_water_rss(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf8") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _run_solver(program: str, payload: bytes, timeout: float) -> Dict[str, Any]:
+    """
+    Runs the solver on one input in a fresh process and returns its output with its wall
+    time and peak resident memory. The process is killed after timeout seconds.
+
+    The child's ru_maxrss also counts the memory of the forked benchmark process it was
+    exec'd from, so on Linux the solver's own high water mark is read from /proc until
+    it closes its output. Elsewhere ru_maxrss is used where there is one.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [program], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    timed_out = threading.Event()
+    finished = threading.Event()
+    high_water_rss: List[int] = []
+
+    def write_input() -> None:
+        try:
+            assert process.stdin is not None
+            process.stdin.write(payload)
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+
+    def sample_rss() -> None:
+        while not finished.is_set():
+            rss = _read_high_water_rss(process.pid)
+            if rss is None:
+                break
+            high_water_rss.append(rss)
+            finished.wait(RSS_SAMPLE_SECONDS)
+
+    def kill() -> None:
+        timed_out.set()
+        process.kill()
+
+    threads = [threading.Thread(target=write_input, daemon=True)]
+    if sys.platform.startswith("linux"):
+        threads.append(threading.Thread(target=sample_rss, daemon=True))
+    for thread in threads:
+        thread.start()
+    killer = threading.Timer(timeout, kill)
+    killer.start()
+    assert process.stdout is not None
+    output = process.stdout.read()
+    killer.cancel()
+    finished.set()
+    for thread in threads:
+        thread.join()
+
+    peak_rss_bytes: Optional[int] = None
+    if sys.platform.startswith("linux"):
+        process.wait()
+        peak_rss_bytes = max(high_water_rss, default=None)
+    elif hasattr(os, "wait4"):
+        _, status, resource_usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        # bytes on macOS
+        peak_rss_bytes = resource_usage.ru_maxrss
+    else:
+        process.wait()
+
+    return {
+        "output": output.decode("utf8"),
+        "wall_seconds": time.perf_counter() - start,
+        "peak_rss_bytes": peak_rss_bytes,
+        "return_code": process.returncode,
+        "timed_out": timed_out.is_set(),
+    }
+
+
+def _parse_dispatch_output(output: str, num_riders: int) -> Optional[List[List[int]]]:
+    """
+    Returns the final orders of a text or version 1 output, or the last streamed
+    incumbent of a version 2 and later output, None when there is none.
+    """
+    lines = output.split()
+    orders: Optional[List[List[int]]] = None
+    index = 0
+
+    def read_orders() -> List[List[int]]:
+        nonlocal index
+        read: List[List[int]] = []
+        for _ in range(num_riders):
+            order: List[int] = []
+            while int(lines[index]) != protocol.END_OF_ORDER:
+                order.append(int(lines[index]))
+                index += 1
+            index += 1
+            read.append(order)
+        return read
+
+    try:
+        if len(lines) > 0 and lines[0] in (protocol.INCUMBENT_MARKER, protocol.FINAL_MARKER):
+            while index < len(lines) and lines[index] == protocol.INCUMBENT_MARKER:
+                index += 3
+                orders = read_orders()
+        else:
+            orders = read_orders()
+    except (IndexError, ValueError):
+        # a solver killed mid answer, the previous incumbent stands
+        pass
+    return orders
+
+
+def _score_dispatch(problem: DispatchProblem, distance_matrix: np.ndarray, orders: List[List[int]]) -> Dict[str, Any]:
+    """
+    Scores the orders in the solver's model, each rider leaving the hub at the start of
+    the day and starting a new trip with an empty bag at every hub return.
+    """
+    volumes = np.concatenate(([0], problem.volumes))
+    edds = np.concatenate(([0], problem.expected_delivery_time_deltas))
+    served = set()
+    total_route_time = late_deliveries = total_lateness_seconds = overloaded_trips = late_returns = 0
+    for rider, order in enumerate(orders):
+        current_time = current_location = load = 0
+        for location in order + [0]:
+            current_time += int(distance_matrix[current_location, location])
+            current_location = location
+            if location == 0:
+                overloaded_trips += load > int(problem.bag_volumes[rider])
+                load = 0
+                continue
+            served.add(location)
+            load += int(volumes[location])
+            lateness = current_time - int(edds[location])
+            late_deliveries += lateness > 0
+            total_lateness_seconds += max(lateness, 0)
+        total_route_time += current_time
+        late_returns += current_time > REACH_HUB_BEFORE_SECONDS
+    return {
+        "served": len(served),
+        "unserved": problem.num_deliveries - len(served),
+        "total_route_time": total_route_time,
+        "late_deliveries": late_deliveries,
+        "total_lateness_seconds": total_lateness_seconds,
+        "overloaded_trips": overloaded_trips,
+        "late_returns": late_returns,
+    }
+
+
+def _score_pickup(pickup_arguments: tuple, output: str) -> Dict[str, Any]:
+    """
+    Scores the pickup's place in the batches, as the pickup solver models it: the rider
+    goes from the task it is placed after to the pickup and then on to the next task.
+    """
+    _, _, _, _, first_task_times, tasks = pickup_arguments
+    batch_index, after_task_index = (int(value) for value in output.split()[:2])
+    if batch_index == -1:
+        return {"assigned": 0, "pickup_time": None, "added_time": None, "late_tasks": None}
+    # a pickup before the first task is placed after it, as the dispatch service does
+    after_task_index = max(after_task_index, 0)
+
+    rider_tasks = tasks[batch_index]
+    volumes, types, edds, times_next, times_from_pickup = rider_tasks.T
+    arrival_times = first_task_times[batch_index] + np.concatenate(([0], np.cumsum(times_next[:-1])))
+    pickup_time = int(arrival_times[after_task_index] + times_from_pickup[after_task_index])
+    if after_task_index + 1 < len(rider_tasks):
+        added_time = int(
+            times_from_pickup[after_task_index]
+            + times_from_pickup[after_task_index + 1]
+            - times_next[after_task_index]
+        )
+    else:
+        added_time = int(times_from_pickup[after_task_index])
+    delayed_arrival_times = arrival_times[after_task_index + 1 :] + added_time
+    late_tasks = int(
+        np.sum(
+            (delayed_arrival_times > edds[after_task_index + 1 :])
+            & (arrival_times[after_task_index + 1 :] <= edds[after_task_index + 1 :])
+        )
+    )
+    return {"assigned": 1, "pickup_time": pickup_time, "added_time": added_time, "late_tasks": late_tasks}
+
+
+def run_instance(parameters: InstanceParameters, args: argparse.Namespace) -> Dict[str, Any]:
+    generation_start = time.perf_counter()
+    if parameters.solver == "dispatch":
+        problem = get_dispatch_instance(parameters)
+        solver_arrays = problem.get_solver_arrays()
+        payload = protocol.encode_dispatch_input(
+            args.wire_format, *solver_arrays, int(args.time_budget * 1000), 0, args.seed
+        )
+        program = args.dispatch_program
+    else:
+        pickup_arguments = get_pickup_instance(parameters)
+        payload = protocol.encode_pickup_input(args.wire_format, *pickup_arguments)
+        program = args.pickup_program
+    generation_seconds = time.perf_counter() - generation_start
+
+    if args.write_instances:
+        os.makedirs(args.write_instances, exist_ok=True)
+        with open(os.path.join(args.write_instances, f"{parameters.name}.in"), "wb") as f:
+            f.write(payload)
+
+    run = _run_solver(program, payload, args.time_budget + args.timeout_grace)
+    result: Dict[str, Any] = {
+        "parameters": parameters._asdict(),
+        "input_bytes": len(payload),
+        "generation_seconds": generation_seconds,
+        "wall_seconds": run["wall_seconds"],
+        "peak_rss_bytes": run["peak_rss_bytes"],
+        "return_code": run["return_code"],
+        "timed_out": run["timed_out"],
+    }
+    if parameters.solver == "dispatch":
+        orders = _parse_dispatch_output(run["output"], problem.num_riders)
+        if orders is not None:
+            result.update(_score_dispatch(problem, solver_arrays[0], orders))
+    elif run["return_code"] == 0:
+        result.update(_score_pickup(pickup_arguments, run["output"]))
+    return result
+
+
+def compare_with_baseline(
+    results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], time_tolerance: float
+) -> List[str]:
+    """
+    Returns a description of each metric worse than in the baseline by more than its
+    tolerance. Instances or metrics missing from either side are not compared.
+    """
+    regressions = []
+    for name, result in results.items():
+        baseline_result = baseline.get(name)
+        if baseline_result is None:
+            continue
+        if baseline_result.get("parameters") != result.get("parameters"):
+            regressions.append(f"{name}: parameters differ from the baseline, record it again")
+            continue
+        for metric, (tolerance, higher_is_better) in REGRESSION_TOLERANCES.items():
+            value, baseline_value = result.get(metric), baseline_result.get(metric)
+            if value is None or baseline_value is None:
+                if baseline_value is not None and metric in ("served", "assigned"):
+                    regressions.append(f"{name}: no answer, baseline {metric} {baseline_value}")
+                continue
+            if metric == "wall_seconds":
+                tolerance = time_tolerance
+            if metric in MIN_REGRESSIONS and value - baseline_value < MIN_REGRESSIONS[metric]:
+                continue
+            allowed = abs(baseline_value) * tolerance
+            worse = baseline_value - value if higher_is_better else value - baseline_value
+            if worse > allowed:
+                regressions.append(f"{name}: {metric} {value:.6g} vs baseline {baseline_value:.6g}")
+    return regressions
+
+
+def _print_result(name: str, result: Dict[str, Any]) -> None:
+    peak_rss = result["peak_rss_bytes"]
+    peak_rss_text = f"{peak_rss / 2**20:.1f}" if peak_rss is not None else "-"
+    if result["parameters"]["solver"] == "dispatch":
+        score = (
+            f"served {result.get('served', '-')} route time {result.get('total_route_time', '-')} "
+            f"late {result.get('late_deliveries', '-')}"
+        )
+    else:
+        score = (
+            f"assigned {result.get('assigned', '-')} pickup time {result.get('pickup_time', '-')} "
+            f"added time {result.get('added_time', '-')}"
+        )
+    timed_out = " (timed out)" if result["timed_out"] else ""
+    print(f"{name:<28} {result['wall_seconds']:>9.3f} {peak_rss_text:>9}  {score}{timed_out}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suite", choices=list(_get_suites()), default="quick")
+    parser.add_argument("--instances", nargs="+", help="only run the instances with these names")
+    parser.add_argument("--dispatch-program", default=DISPATCH_PROGRAM_PATH)
+    parser.add_argument("--pickup-program", default=PICKUP_PROGRAM_PATH)
+    parser.add_argument("--wire-format", choices=["text", "binary"], default="binary")
+    parser.add_argument("--time-budget", type=float, default=10.0, help="dispatch time budget in seconds")
+    parser.add_argument(
+        "--timeout-grace", type=float, default=60.0, help="seconds past the budget before a solver is killed"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="dispatch solver seed")
+    parser.add_argument("--output", default="solver_suite_results.json", help="where the results are written")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="store the results as the baseline")
+    parser.add_argument(
+        "--time-tolerance",
+        type=float,
+        default=REGRESSION_TOLERANCES["wall_seconds"][0],
+        help="relative wall time increase flagged as a regression",
+    )
+    parser.add_argument("--write-instances", help="directory to also write the solver inputs to")
+    args = parser.parse_args()
+    # the same instance must give the same matrix on every run
+    settings.DISTANCE_NOISE_MODE = "deterministic"
+
+    instances = _get_suites()[args.suite]
+    if args.instances:
+        instances = [parameters for parameters in instances if parameters.name in args.instances]
+
+    print(f"{'instance':<28} {'time (s)':>9} {'RSS (MB)':>9}  score")
+    results: Dict[str, Dict[str, Any]] = {}
+    for parameters in instances:
+        results[parameters.name] = run_instance(parameters, args)
+        _print_result(parameters.name, results[parameters.name])
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "machine": {"platform": platform.platform(), "processor": platform.processor(), "cpus": os.cpu_count()},
+        "settings": {
+            "wire_format": args.wire_format,
+            "time_budget": args.time_budget,
+            "seed": args.seed,
+            "dispatch_program": args.dispatch_program,
+            "pickup_program": args.pickup_program,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf8") as f:
+        json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        baseline_report = report
+        if os.path.exists(args.baseline):
+            # instances not run this time keep their baseline
+            with open(args.baseline, "r", encoding="utf8") as f:
+                baseline_report = json.load(f)
+            baseline_report.update({key: value for key, value in report.items() if key != "results"})
+            baseline_report["results"].update(results)
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf8") as f:
+            json.dump(baseline_report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --update-baseline to record one")
+        return
+    with open(args.baseline, "r", encoding="utf8") as f:
+        baseline_report = json.load(f)
+    if baseline_report.get("settings") != report["settings"]:
+        print("Warning: the baseline was recorded with other settings")
+    regressions = compare_with_baseline(results, baseline_report["results"], args.time_tolerance)
+    if len(regressions) == 0:
+        print("No regressions against the baseline")
+        return
+    print("Regressions against the baseline:")
+    for regression in regressions:
+        print(f"  {regression}")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
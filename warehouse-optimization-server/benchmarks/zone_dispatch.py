@@ -0,0 +1,113 @@
+"""
+Benchmark of the zone decomposed dispatch.
+
+Solves random days of growing size scattered around the warehouse, split into zones of
+DISPATCH_ZONE_SIZE deliveries, and for the sizes up to --whole-limit also as a single
+problem on the full matrix. The target is 10,000 deliveries in under a minute.
+
+Needs solvers built from the current sources, dispatch.exe for the subprocess backend
+or the shared library for the native one, see algorithm/native.py. Run from the
+repository root:
+
+    python -m warehouse-optimization-server.benchmarks.zone_dispatch
+"""
+
+import argparse
+import asyncio
+import time
+
+import numpy as np
+from beanie import PydanticObjectId
+
+from ..algorithm.dispatch import DispatchAlgorithm
+from ..algorithm.map import distance as map_distance_service
+from ..algorithm.problem import DispatchProblem
+from ..algorithm.solver_pool import close_solver_pools
+from ..constants import WAREHOUSE_LOCATION
+from ..settings import settings
+
+
+def _get_random_problem(
+    num_deliveries: int, num_riders: int, spread_degrees: float = 0.15
+) -> DispatchProblem:
+    rng = np.random.default_rng(0)
+    warehouse_coordinate = WAREHOUSE_LOCATION.coordinate
+    latitudes = warehouse_coordinate.latitude + rng.uniform(-spread_degrees, spread_degrees, num_deliveries)
+    longitudes = warehouse_coordinate.longitude + rng.uniform(-spread_degrees, spread_degrees, num_deliveries)
+    return DispatchProblem(
+        delivery_task_ids=[PydanticObjectId() for _ in range(num_deliveries)],
+        rider_ids=[PydanticObjectId() for _ in range(num_riders)],
+        latitudes=np.concatenate(([warehouse_coordinate.latitude], latitudes)),
+        longitudes=np.concatenate(([warehouse_coordinate.longitude], longitudes)),
+        areas=np.ones(num_deliveries + 1, dtype=np.int32),
+        volumes=rng.integers(1, 10, size=num_deliveries).astype(np.int32),
+        expected_delivery_time_deltas=rng.integers(14400, 46800, size=num_deliveries),
+        bag_volumes=rng.integers(50, 150, size=num_riders).astype(np.int32),
+    )
+
+
+def _get_total_route_time(problem: DispatchProblem, orders) -> int:
+    total_route_time = 0
+    for order in orders:
+        path = np.array([0] + order + [0])
+        total_route_time += int(
+            map_distance_service.get_simulated_temporal_distances(
+                problem.latitudes[path[:-1]],
+                problem.longitudes[path[:-1]],
+                problem.latitudes[path[1:]],
+                problem.longitudes[path[1:]],
+            ).sum()
+        )
+    return total_route_time
+
+
+async def _time_dispatch(problem: DispatchProblem, decomposition_threshold: int, time_budget: float):
+    settings.DISPATCH_DECOMPOSITION_THRESHOLD = decomposition_threshold
+    start = time.perf_counter()
+    orders = await DispatchAlgorithm.solve_problem(problem, time_budget=time_budget, seed=0)
+    seconds = time.perf_counter() - start
+    served = sum(len(order) for order in orders)
+    return seconds, served, _get_total_route_time(problem, orders)
+
+
+async def _main(args):
+    print(f"{'items':>6} {'riders':>6} {'mode':>6} {'time (s)':>9} {'served':>7} {'route time (s)':>15}")
+    for num_deliveries in args.sizes:
+        num_riders = max(1, num_deliveries // args.deliveries_per_rider)
+        problem = _get_random_problem(num_deliveries, num_riders)
+        modes = [("zones", 1)]
+        if num_deliveries <= args.whole_limit:
+            modes.append(("whole", 0))
+        for mode, decomposition_threshold in modes:
+            seconds, served, total_route_time = await _time_dispatch(
+                problem, decomposition_threshold, args.time_budget
+            )
+            print(
+                f"{num_deliveries:>6} {num_riders:>6} {mode:>6} {seconds:>9.2f} {served:>7} "
+                f"{total_route_time:>15}"
+            )
+    await close_solver_pools()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 5000, 10000])
+    parser.add_argument("--deliveries-per-rider", type=int, default=25)
+    parser.add_argument("--time-budget", type=float, default=40.0, help="dispatch time budget in seconds")
+    parser.add_argument(
+        "--whole-limit",
+        type=int,
+        default=2000,
+        help="largest size also solved as a single problem",
+    )
+    parser.add_argument("--backend", choices=["subprocess", "native"], default=settings.SOLVER_BACKEND)
+    args = parser.parse_args()
+    settings.SOLVER_BACKEND = args.backend
+    # the budget and the seeds need the binary wire format
+    settings.SOLVER_WIRE_FORMAT = "binary"
+    settings.DISTANCE_NOISE_MODE = "deterministic"
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
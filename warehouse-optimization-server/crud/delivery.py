@@ -1,6 +1,11 @@
-from typing import List, Any, Literal
+from typing import List, Any, Literal, Mapping, Optional, Type, TypeVar, Union
 from fastapi import HTTPException
+from pydantic import BaseModel
 from beanie import PydanticObjectId, WriteRules
+from beanie.odm.utils.projection import get_projection
+from beanie.operators import In, Set
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from pymongo import ReturnDocument
 from ..models.delivery import DeliveryTask, Item
 from ..models.rider import Rider
 from ..schemas import DeliveryInformation
@@ -8,26 +13,81 @@ from ..dtos import DeliveryTaskDTO
 from ..enums import DeliveryStatus
 
 
+ProjectionModel = TypeVar("ProjectionModel", bound=BaseModel)
+
+
 async def get_delivery_task(
     delivery_task_id: PydanticObjectId,
 ) -> DeliveryTaskDTO:
     """
     This is the function to get a delivery by its id.
     """
-    delivery_task = await DeliveryTask.get(delivery_task_id)
-    if delivery_task is None:
+    delivery_tasks = await get_delivery_tasks(DeliveryTask.id == delivery_task_id)
+    if len(delivery_tasks) == 0:
         raise HTTPException(status_code=404, detail="Delivery task not found")
-    return await _populate_delivery_task_links(delivery_task)
+    return delivery_tasks[0]
 
 
-async def get_delivery_tasks() -> List[DeliveryTaskDTO]:
+async def get_delivery_tasks(
+    *filters: Union[Mapping[str, Any], bool],
+    projection_model: Type[ProjectionModel] = DeliveryTaskDTO,  # type: ignore
+) -> List[ProjectionModel]:
     """
-    This is the function to get all deliveries.
+    This is the function to get the deliveries matching the filters, Beanie query
+    expressions or raw queries, all of them without filters, with their items.
+
+    It costs two round trips however many deliveries match, one query for the
+    deliveries and one $in query for all their items, joined in memory in the order of
+    each delivery's item links. With a projection model only its fields are read, as
+    with Beanie's project, and its items field, if it has one, holds the items.
     """
-    return [
-        await _populate_delivery_task_links(task)
-        for task in await DeliveryTask.find_all().to_list()
-    ]
+    raw_delivery_tasks = (
+        await DeliveryTask.get_pymongo_collection()
+        .find(
+            DeliveryTask.find(*filters).get_filter_query(),
+            get_projection(projection_model),
+        )
+        .to_list(None)
+    )
+    return await _join_items(raw_delivery_tasks, projection_model)
+
+
+async def _join_items(
+    raw_delivery_tasks: List[dict[str, Any]],
+    projection_model: Type[ProjectionModel],
+    session: Optional[AsyncIOMotorClientSession] = None,
+) -> List[ProjectionModel]:
+    """
+    This is the function to join raw deliveries with their items in one $in query.
+    """
+    item_ids = list(
+        {
+            item_ref.id
+            for raw_delivery_task in raw_delivery_tasks
+            for item_ref in raw_delivery_task.get("items", [])
+        }
+    )
+    items = (
+        {
+            item.id: item
+            for item in await Item.find(
+                In(Item.id, item_ids), session=session
+            ).to_list()
+        }
+        if len(item_ids) > 0
+        else {}
+    )
+
+    delivery_tasks = []
+    for raw_delivery_task in raw_delivery_tasks:
+        if "items" in raw_delivery_task:
+            raw_delivery_task["items"] = [
+                items[item_ref.id]
+                for item_ref in raw_delivery_task["items"]
+                if item_ref.id in items
+            ]
+        delivery_tasks.append(projection_model.model_validate(raw_delivery_task))
+    return delivery_tasks
 
 
 async def delete_delivery_task(delivery_task_id: PydanticObjectId) -> None:
@@ -55,6 +115,62 @@ async def update_delivery_task(
         raise HTTPException(status_code=404, detail="Dispatched delivery not found")
 
 
+async def update_delivery_tasks_status(
+    delivery_task_ids: List[PydanticObjectId],
+    status: DeliveryStatus,
+    from_statuses: Optional[List[DeliveryStatus]] = None,
+    session: Optional[AsyncIOMotorClientSession] = None,
+) -> int:
+    """
+    This is the function to move delivery tasks to a status in one update, only those
+    in one of from_statuses when given. It returns how many tasks matched.
+    """
+    if len(delivery_task_ids) == 0:
+        return 0
+    filters = [In(DeliveryTask.id, delivery_task_ids)]
+    if from_statuses is not None:
+        filters.append(
+            In(DeliveryTask.status, [from_status.name for from_status in from_statuses])
+        )
+    result = await DeliveryTask.find(*filters, session=session).update_many(
+        Set({DeliveryTask.status: status.name}), session=session
+    )
+    return result.matched_count
+
+
+async def transition_delivery_task_status(
+    delivery_task_id: PydanticObjectId,
+    status: DeliveryStatus,
+    session: Optional[AsyncIOMotorClientSession] = None,
+) -> DeliveryTaskDTO:
+    """
+    This is the function to move a delivery task to a status of higher rank, checked
+    and written in one conditional update, and get it back with its items.
+    """
+    raw_delivery_task = await DeliveryTask.get_pymongo_collection().find_one_and_update(
+        {
+            "_id": delivery_task_id,
+            "status": {
+                "$in": [
+                    from_status.name
+                    for from_status in DeliveryStatus
+                    if from_status.rank < status.rank
+                ]
+            },
+        },
+        {"$set": {"status": status.name}},
+        projection=get_projection(DeliveryTaskDTO),
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+    if raw_delivery_task is None:
+        if await DeliveryTask.get(delivery_task_id, session=session) is None:
+            raise HTTPException(status_code=404, detail="Delivery task not found")
+        raise AssertionError("Invalid status")
+    (delivery_task,) = await _join_items([raw_delivery_task], DeliveryTaskDTO, session)
+    return delivery_task
+
+
 async def create_delivery_tasks(
     delivery_tasks: List[DeliveryTask],
 ) -> None:
@@ -89,16 +205,3 @@ async def update_delivery_task_status(
         return delivery_task
     else:
         raise HTTPException(status_code=404, detail="Delivery task not found")
-
-
-async def _populate_delivery_task_links(delivery_task: DeliveryTask) -> DeliveryTaskDTO:
-    """
-    This is the function to populate the delivery task links.
-    """
-    if not delivery_task:
-        raise HTTPException(status_code=404, detail="Delivery task not found")
-
-    delivery_task.items = [i for i in [await Item.get(item.ref.id) for item in delivery_task.items] if i is not None]
-
-    return DeliveryTaskDTO(**delivery_task.model_dump())
-
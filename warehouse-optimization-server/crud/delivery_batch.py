@@ -1,11 +1,34 @@
-from typing import List, Any
+from typing import List, Any, Callable, Mapping, Optional, Union
 from fastapi import HTTPException
 from beanie import PydanticObjectId
-from ..models.delivery import DeliveryStatus
+from bson import DBRef
+from beanie.odm.utils.projection import get_projection
+from beanie.operators import In, Inc, Push, Set
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from ..models.delivery import DeliveryStatus, DeliveryTask
 from ..models.delivery_batch import DeliveryTasksBatch
-from ..dtos import DeliveryTaskDTO, DeliveryTaskRefDTO, DeliveryTasksBatchDTO
+from ..models.rider import Rider
+from ..dtos import (
+    DeliveryTaskDTO,
+    DeliveryTaskRefDTO,
+    DeliveryTasksBatchCurrentTaskDTO,
+    DeliveryTasksBatchDTO,
+)
 from ..crud import rider as rider_crud
 from ..crud import delivery as delivery_crud
+from ..settings import settings
+
+
+class DeliveryTasksBatchConflict(HTTPException):
+    """
+    Raised when a delivery tasks batch was updated since the version an update was
+    computed from.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(
+            status_code=409, detail="Delivery tasks batch was updated concurrently"
+        )
 
 
 async def create_delivery_tasks_batch(
@@ -17,6 +40,18 @@ async def create_delivery_tasks_batch(
     return await DeliveryTasksBatch.insert_one(delivery_tasks_batch) or None
 
 
+async def create_delivery_tasks_batches(
+    delivery_tasks_batches: List[DeliveryTasksBatch],
+    session: Optional[AsyncIOMotorClientSession] = None,
+) -> None:
+    """
+    This is the function to create delivery tasks batches in one insert.
+    """
+    if len(delivery_tasks_batches) == 0:
+        return
+    await DeliveryTasksBatch.insert_many(delivery_tasks_batches, session=session)
+
+
 async def get_delivery_tasks_batch(
     delivery_tasks_batch_id: PydanticObjectId,
 ) -> DeliveryTasksBatchDTO:
@@ -26,67 +61,424 @@ async def get_delivery_tasks_batch(
     delivery_tasks_batch = await DeliveryTasksBatch.get(delivery_tasks_batch_id)
     if delivery_tasks_batch is None:
         raise HTTPException(status_code=404, detail="Delivery tasks batch not found")
-    delivery_tasks_batch_dto = await _populate_delivery_tasks_batch(
-        delivery_tasks_batch
+    (delivery_tasks_batch_dto,) = await _populate_delivery_tasks_batches(
+        [delivery_tasks_batch]
     )
     _validate_deliery_tasks_batch(delivery_tasks_batch_dto)
     return delivery_tasks_batch_dto
 
 
-async def get_delivery_tasks_batches() -> List[DeliveryTasksBatchDTO]:
+async def get_delivery_tasks_batch_slice(
+    delivery_tasks_batch_id: PydanticObjectId,
+    skip: int,
+    limit: int,
+) -> DeliveryTasksBatch:
     """
-    This is the function to get the delivery tasks batch for a rider.
+    This is the function to get a delivery tasks batch with only up to limit of its
+    tasks from index skip on, unpopulated, so reading a few tasks of a batch costs the
+    same however long its route is.
     """
-    delivery_tasks_batches = await DeliveryTasksBatch.find_all().to_list()
-    delivery_tasks_batches_dto = [
-        await _populate_delivery_tasks_batch(delivery_tasks_batch)
-        for delivery_tasks_batch in delivery_tasks_batches
-        if delivery_tasks_batch.is_current_day_tasks_batch()
-    ]
+    document = await DeliveryTasksBatch.get_pymongo_collection().find_one(
+        {"_id": delivery_tasks_batch_id},
+        {
+            **(get_projection(DeliveryTasksBatch) or {}),
+            "tasks": {"$slice": [skip, limit]},
+        },
+    )
+    if document is None:
+        raise HTTPException(status_code=404, detail="Delivery tasks batch not found")
+    return DeliveryTasksBatch.model_validate(document)
+
+
+async def get_delivery_tasks_batches(
+    *filters: Union[Mapping[str, Any], bool],
+) -> List[DeliveryTasksBatchDTO]:
+    """
+    This is the function to get the current day's delivery tasks batches matching the
+    filters, in the same few round trips however many batches and tasks there are.
+    """
+    day_start, day_end = DeliveryTasksBatch.get_current_day_bounds()
+    delivery_tasks_batches = await DeliveryTasksBatch.find(
+        DeliveryTasksBatch.route_identifier_timestamp >= day_start,
+        DeliveryTasksBatch.route_identifier_timestamp < day_end,
+        *filters,
+    ).to_list()
+    delivery_tasks_batches_dto = await _populate_delivery_tasks_batches(
+        delivery_tasks_batches
+    )
     for delivery_tasks_batch_dto in delivery_tasks_batches_dto:
         _validate_deliery_tasks_batch(delivery_tasks_batch_dto)
     return delivery_tasks_batches_dto
 
 
+async def get_delivery_tasks_batches_for_riders(
+    rider_ids: List[PydanticObjectId],
+) -> List[DeliveryTasksBatchDTO]:
+    """
+    This is the function to get the current day's delivery tasks batches of the riders.
+    """
+    return await get_delivery_tasks_batches(
+        {"rider": {"$in": [_get_ref(Rider, rider_id) for rider_id in rider_ids]}}
+    )
+
+
+async def get_delivery_tasks_batch_ids_for_riders(
+    rider_ids: List[PydanticObjectId],
+) -> dict[PydanticObjectId, PydanticObjectId]:
+    """
+    This is the function to get the ids of the current day's delivery tasks batches of
+    the riders by rider id, in one query reading only the batches' ids and rider links.
+    A rider with several batches gets the first one found, a rider with none is left
+    out.
+    """
+    if len(rider_ids) == 0:
+        return {}
+    day_start, day_end = DeliveryTasksBatch.get_current_day_bounds()
+    raw_delivery_tasks_batches = (
+        await DeliveryTasksBatch.get_pymongo_collection()
+        .find(
+            {
+                "route_identifier_timestamp": {"$gte": day_start, "$lt": day_end},
+                "rider": {"$in": [_get_ref(Rider, rider_id) for rider_id in rider_ids]},
+            },
+            {"rider": 1},
+        )
+        .to_list(None)
+    )
+    delivery_tasks_batch_ids: dict[PydanticObjectId, PydanticObjectId] = {}
+    for raw_delivery_tasks_batch in raw_delivery_tasks_batches:
+        delivery_tasks_batch_ids.setdefault(
+            PydanticObjectId(raw_delivery_tasks_batch["rider"].id),
+            PydanticObjectId(raw_delivery_tasks_batch["_id"]),
+        )
+    return delivery_tasks_batch_ids
+
+
+async def get_delivery_tasks_batches_having_delivery_task(
+    delivery_task_id: PydanticObjectId,
+) -> List[DeliveryTasksBatchDTO]:
+    """
+    This is the function to get the current day's delivery tasks batches having a
+    delivery task.
+    """
+    return await get_delivery_tasks_batches(
+        {"tasks.delivery_task": _get_ref(DeliveryTask, delivery_task_id)}
+    )
+
+
+async def get_delivery_tasks_batch_at_delivery_task(
+    delivery_task_id: PydanticObjectId,
+) -> Optional[DeliveryTasksBatchCurrentTaskDTO]:
+    """
+    This is the function to get the delivery tasks batch whose current task is the
+    delivery task, or None. The batch is found through the index on the links of the
+    batches' tasks and only its id and current task index are read.
+    """
+    delivery_task_ref = _get_ref(DeliveryTask, delivery_task_id)
+    return await DeliveryTasksBatch.find_one(
+        {
+            "tasks.delivery_task": delivery_task_ref,
+            "$expr": {
+                "$eq": [
+                    {
+                        "$arrayElemAt": [
+                            "$tasks.delivery_task",
+                            "$current_task_index",
+                        ]
+                    },
+                    delivery_task_ref,
+                ]
+            },
+        },
+        projection_model=DeliveryTasksBatchCurrentTaskDTO,
+    )
+
+
+async def get_batched_delivery_task_ids(
+    delivery_task_ids: List[PydanticObjectId],
+    session: Optional[AsyncIOMotorClientSession] = None,
+) -> set[PydanticObjectId]:
+    """
+    This is the function to get which of the delivery tasks are held by the current
+    day's delivery tasks batches, in one query through the index on the links of the
+    batches' tasks.
+    """
+    if len(delivery_task_ids) == 0:
+        return set()
+    day_start, day_end = DeliveryTasksBatch.get_current_day_bounds()
+    raw_delivery_tasks_batches = (
+        await DeliveryTasksBatch.get_pymongo_collection()
+        .find(
+            {
+                "route_identifier_timestamp": {"$gte": day_start, "$lt": day_end},
+                "tasks.delivery_task": {
+                    "$in": [
+                        _get_ref(DeliveryTask, delivery_task_id)
+                        for delivery_task_id in delivery_task_ids
+                    ]
+                },
+            },
+            {"tasks.delivery_task": 1},
+            session=session,
+        )
+        .to_list(None)
+    )
+    return {
+        PydanticObjectId(task["delivery_task"].id)
+        for raw_delivery_tasks_batch in raw_delivery_tasks_batches
+        for task in raw_delivery_tasks_batch["tasks"]
+    } & set(delivery_task_ids)
+
+
+async def get_delivery_task_ids_for_rider(
+    rider_id: PydanticObjectId,
+) -> List[PydanticObjectId]:
+    """
+    This is the function to get the ids of the delivery tasks in the rider's batches of
+    every day, in route order.
+    """
+    delivery_tasks_batches = (
+        await DeliveryTasksBatch.find({"rider": _get_ref(Rider, rider_id)})
+        .sort(+DeliveryTasksBatch.route_identifier_timestamp)
+        .to_list()
+    )
+    return [
+        task.delivery_task.ref.id
+        for delivery_tasks_batch in delivery_tasks_batches
+        for task in sorted(delivery_tasks_batch.tasks, key=lambda task: task.order_key)
+    ]
+
+
 async def update_delivery_tasks_batch(
     delivery_tasks_batch_id: PydanticObjectId,
     update_dict: dict[str, Any],
-) -> DeliveryTasksBatch:
+    expected_version: Optional[int] = None,
+    session: Optional[AsyncIOMotorClientSession] = None,
+) -> None:
     """
-    This is the function to update a delivery tasks batch.
+    This is the function to update a delivery tasks batch and bump its version. Given
+    expected_version, the update is a compare and swap that only applies to the batch
+    at that version and raises DeliveryTasksBatchConflict otherwise.
     """
-    delivery_tasks_batch = await DeliveryTasksBatch.get(delivery_tasks_batch_id)
-    if delivery_tasks_batch:
-        await delivery_tasks_batch.set(update_dict)
-        return delivery_tasks_batch
-    else:
-        raise HTTPException(status_code=404, detail="Delivery tasks batch not found")
+    filters: List[Any] = [DeliveryTasksBatch.id == delivery_tasks_batch_id]
+    if expected_version is not None:
+        filters.append(DeliveryTasksBatch.version == expected_version)
+    result = await DeliveryTasksBatch.find_one(*filters, session=session).update(
+        Set(update_dict), Inc({DeliveryTasksBatch.version: 1}), session=session
+    )
+    if result.matched_count == 0:
+        await _raise_update_not_matched(
+            delivery_tasks_batch_id, expected_version is not None, session
+        )
 
-async def _populate_delivery_tasks_batch(
-    delivery_tasks_batch: DeliveryTasksBatch,
-) -> DeliveryTasksBatchDTO:
+
+async def check_delivery_tasks_batch_versions(
+    delivery_tasks_batch_versions: dict[PydanticObjectId, int],
+    session: Optional[AsyncIOMotorClientSession] = None,
+) -> None:
+    """
+    This is the function to check that delivery tasks batches are still at the given
+    versions, in one query reading only their versions, before updates computed from
+    them are written. It raises DeliveryTasksBatchConflict otherwise.
+    """
+    if len(delivery_tasks_batch_versions) == 0:
+        return
+    raw_delivery_tasks_batches = (
+        await DeliveryTasksBatch.get_pymongo_collection()
+        .find(
+            {"_id": {"$in": list(delivery_tasks_batch_versions.keys())}},
+            {"version": 1},
+            session=session,
+        )
+        .to_list(None)
+    )
+    if {
+        PydanticObjectId(raw_delivery_tasks_batch["_id"]): raw_delivery_tasks_batch[
+            "version"
+        ]
+        for raw_delivery_tasks_batch in raw_delivery_tasks_batches
+    } != delivery_tasks_batch_versions:
+        raise DeliveryTasksBatchConflict()
+
+
+async def delete_delivery_tasks_batches(
+    delivery_tasks_batch_ids: List[PydanticObjectId],
+    session: Optional[AsyncIOMotorClientSession] = None,
+) -> None:
+    """
+    This is the function to delete delivery tasks batches in one delete.
+    """
+    if len(delivery_tasks_batch_ids) == 0:
+        return
+    await DeliveryTasksBatch.find(
+        In(DeliveryTasksBatch.id, delivery_tasks_batch_ids), session=session
+    ).delete(session=session)
+
+
+async def advance_current_task_index(
+    delivery_tasks_batch_id: PydanticObjectId,
+    current_task_index: int,
+    session: Optional[AsyncIOMotorClientSession] = None,
+) -> None:
+    """
+    This is the function to move a delivery tasks batch on to its next task, only
+    while its current task index is still current_task_index.
+    """
+    result = await DeliveryTasksBatch.find_one(
+        DeliveryTasksBatch.id == delivery_tasks_batch_id,
+        DeliveryTasksBatch.current_task_index == current_task_index,
+        session=session,
+    ).update(
+        Inc({DeliveryTasksBatch.current_task_index: 1, DeliveryTasksBatch.version: 1}),
+        session=session,
+    )
+    if result.matched_count == 0:
+        await _raise_update_not_matched(delivery_tasks_batch_id, True, session)
+
+
+async def insert_delivery_task_ref(
+    delivery_tasks_batch_id: PydanticObjectId,
+    position: int,
+    delivery_task_id: PydanticObjectId,
+    order_key: str,
+    expected_version: int,
+) -> None:
     """
-    This is the function to perform actions after dispatching delivery tasks.
-    """
-    if delivery_tasks_batch.rider is not None:
-        rider = await rider_crud.get_rider(delivery_tasks_batch.rider.ref.id)
-        if rider is None:
-            raise HTTPException(status_code=404, detail="Rider not found")
-        delivery_tasks_batch.rider = rider
-
-    delivery_tasks_batch.tasks = sorted(
-        [
-            DeliveryTaskRefDTO(
-                delivery_task=await delivery_crud.get_delivery_task(
-                    task.delivery_task.ref.id
-                ),
-                order_key=task.order_key,
+    This is the function to insert a task at a position of a delivery tasks batch
+    with a single element push, compare and swap on the batch's version.
+    """
+    result = await DeliveryTasksBatch.find_one(
+        DeliveryTasksBatch.id == delivery_tasks_batch_id,
+        DeliveryTasksBatch.version == expected_version,
+    ).update(
+        Push(
+            {
+                DeliveryTasksBatch.tasks: {
+                    "$each": [
+                        {
+                            "delivery_task": _get_ref(DeliveryTask, delivery_task_id),
+                            "order_key": order_key,
+                        }
+                    ],
+                    "$position": position,
+                }
+            }
+        ),
+        Inc({DeliveryTasksBatch.version: 1}),
+    )
+    if result.matched_count == 0:
+        await _raise_update_not_matched(delivery_tasks_batch_id, True)
+
+
+async def _raise_update_not_matched(
+    delivery_tasks_batch_id: PydanticObjectId,
+    conditional: bool,
+    session: Optional[AsyncIOMotorClientSession] = None,
+) -> None:
+    # a conditional update matching no batch lost the race to another update, unless
+    # the batch is gone
+    if conditional and await DeliveryTasksBatch.find_one(
+        DeliveryTasksBatch.id == delivery_tasks_batch_id, session=session
+    ).exists():
+        raise DeliveryTasksBatchConflict()
+    raise HTTPException(status_code=404, detail="Delivery tasks batch not found")
+
+
+async def update_delivery_tasks_batch_with_retry(
+    delivery_tasks_batch_id: PydanticObjectId,
+    get_update_dict: Callable[[DeliveryTasksBatch], dict[str, Any]],
+) -> None:
+    """
+    This is the function to update a delivery tasks batch from its stored state, the
+    update being computed by get_update_dict. When another update gets in between the
+    read and the write, the update is computed again from the batch read afresh, up to
+    DELIVERY_TASKS_BATCH_UPDATE_MAX_ATTEMPTS times.
+    """
+    for attempt in range(settings.DELIVERY_TASKS_BATCH_UPDATE_MAX_ATTEMPTS):
+        delivery_tasks_batch = await DeliveryTasksBatch.get(delivery_tasks_batch_id)
+        if delivery_tasks_batch is None:
+            raise HTTPException(
+                status_code=404, detail="Delivery tasks batch not found"
             )
-            for task in delivery_tasks_batch.tasks
-        ],
-        key=lambda x: x.order_key,
+        try:
+            await update_delivery_tasks_batch(
+                delivery_tasks_batch_id,
+                get_update_dict(delivery_tasks_batch),
+                expected_version=delivery_tasks_batch.version,
+            )
+            return
+        except DeliveryTasksBatchConflict:
+            if attempt + 1 == settings.DELIVERY_TASKS_BATCH_UPDATE_MAX_ATTEMPTS:
+                raise
+
+
+async def _populate_delivery_tasks_batches(
+    delivery_tasks_batches: List[DeliveryTasksBatch],
+) -> List[DeliveryTasksBatchDTO]:
+    """
+    This is the function to join the batches with their riders and delivery tasks, with
+    one query for all the riders and the two of delivery_crud.get_delivery_tasks for all
+    the tasks and their items.
+    """
+    riders = {
+        rider.id: rider
+        for rider in await rider_crud.get_riders_by_ids(
+            [
+                delivery_tasks_batch.rider.ref.id
+                for delivery_tasks_batch in delivery_tasks_batches
+                if delivery_tasks_batch.rider is not None
+            ]
+        )
+    }
+    delivery_task_ids = [
+        task.delivery_task.ref.id
+        for delivery_tasks_batch in delivery_tasks_batches
+        for task in delivery_tasks_batch.tasks
+    ]
+    delivery_tasks = (
+        {
+            delivery_task.id: delivery_task
+            for delivery_task in await delivery_crud.get_delivery_tasks(
+                In(DeliveryTask.id, delivery_task_ids)
+            )
+        }
+        if len(delivery_task_ids) > 0
+        else {}
     )
-    return DeliveryTasksBatchDTO(**delivery_tasks_batch.model_dump())
+
+    delivery_tasks_batches_dto = []
+    for delivery_tasks_batch in delivery_tasks_batches:
+        if delivery_tasks_batch.rider is not None:
+            rider = riders.get(delivery_tasks_batch.rider.ref.id)
+            if rider is None:
+                raise HTTPException(status_code=404, detail="Rider not found")
+            delivery_tasks_batch.rider = rider
+
+        for task in delivery_tasks_batch.tasks:
+            if task.delivery_task.ref.id not in delivery_tasks:
+                raise HTTPException(status_code=404, detail="Delivery task not found")
+        delivery_tasks_batch.tasks = sorted(
+            [
+                DeliveryTaskRefDTO(
+                    delivery_task=delivery_tasks[task.delivery_task.ref.id],
+                    order_key=task.order_key,
+                )
+                for task in delivery_tasks_batch.tasks
+            ],
+            key=lambda x: x.order_key,
+        )
+        delivery_tasks_batches_dto.append(
+            DeliveryTasksBatchDTO(**delivery_tasks_batch.model_dump())
+        )
+    return delivery_tasks_batches_dto
+
+
+def _get_ref(document_model: Any, document_id: PydanticObjectId) -> DBRef:
+    """
+    This is the function to get the DBRef a link to the document is stored as. Links
+    are matched as whole DBRefs, which their indexes cover.
+    """
+    return DBRef(document_model.get_collection_name(), document_id)
 
 
 def _validate_deliery_tasks_batch(delivery_tasks_batch: DeliveryTasksBatchDTO) -> None:
@@ -1,6 +1,7 @@
 from typing import Any
 from fastapi import HTTPException
 from beanie import PydanticObjectId
+from beanie.operators import In
 
 from ..models.rider import Rider
 
@@ -24,6 +25,15 @@ async def get_riders() -> list[Rider]:
     return []
 
 
+async def get_riders_by_ids(rider_ids: list[PydanticObjectId]) -> list[Rider]:
+    """
+    This function is used to get the riders with the given ids in one query.
+    """
+    if len(rider_ids) == 0:
+        return []
+    return await Rider.find(In(Rider.id, rider_ids)).to_list()
+
+
 async def create_rider(rider: Rider) -> Rider:
     """
     This function is used to create a rider.
@@ -0,0 +1,124 @@
+from typing import Any, List, Optional
+from beanie import PydanticObjectId
+from pymongo import ReplaceOne
+from ..models.rider_route_view import RiderRouteView
+from ..dtos import DeliveryTaskRefDTO, DeliveryTasksBatchDTO
+from ..enums import DeliveryStatus
+
+
+async def get_rider_route(rider_id: PydanticObjectId) -> Optional[DeliveryTasksBatchDTO]:
+    """
+    This is the function to get the batch a rider's route view mirrors, in one lookup
+    on the rider id, or None when the rider has no view.
+    """
+    rider_route_view = await RiderRouteView.find_one(
+        RiderRouteView.rider_id == rider_id
+    )
+    if rider_route_view is None:
+        return None
+    return DeliveryTasksBatchDTO.model_validate(rider_route_view.delivery_tasks_batch)
+
+
+async def save_rider_route_views(
+    delivery_tasks_batches: List[DeliveryTasksBatchDTO],
+) -> None:
+    """
+    This is the function to write the route views of the riders of the batches from
+    the batches, in one bulk write replacing the riders' previous views.
+    """
+    if len(delivery_tasks_batches) == 0:
+        return
+    await RiderRouteView.get_pymongo_collection().bulk_write(
+        [
+            ReplaceOne(
+                {"rider_id": delivery_tasks_batch.rider.id},
+                {
+                    "rider_id": delivery_tasks_batch.rider.id,
+                    "delivery_tasks_batch": _dump(delivery_tasks_batch),
+                },
+                upsert=True,
+            )
+            for delivery_tasks_batch in delivery_tasks_batches
+        ]
+    )
+
+
+async def insert_rider_route_view_task(
+    delivery_tasks_batch_id: PydanticObjectId,
+    position: int,
+    delivery_task_ref: DeliveryTaskRefDTO,
+    delivery_tasks_batch_version: int,
+) -> bool:
+    """
+    This is the function to insert a task at a position of the route view mirroring a
+    batch, as insert_delivery_task_ref did in the batch at the given version. It
+    returns False when the view is not at that version.
+    """
+    result = await RiderRouteView.get_pymongo_collection().update_one(
+        {
+            "delivery_tasks_batch._id": delivery_tasks_batch_id,
+            "delivery_tasks_batch.version": delivery_tasks_batch_version,
+        },
+        {
+            "$push": {
+                "delivery_tasks_batch.tasks": {
+                    "$each": [_dump(delivery_task_ref)],
+                    "$position": position,
+                }
+            },
+            "$inc": {"delivery_tasks_batch.version": 1},
+        },
+    )
+    return result.matched_count == 1
+
+
+async def update_rider_route_view_task_status(
+    delivery_tasks_batch_id: PydanticObjectId,
+    task_index: int,
+    delivery_task_id: PydanticObjectId,
+    status: DeliveryStatus,
+) -> bool:
+    """
+    This is the function to set the status of the current task of the route view
+    mirroring a batch, moving the view on to the next task when it is completed as
+    advance_current_task_index did. It returns False when the view's current task is
+    not the one at task_index.
+    """
+    update: dict[str, Any] = {
+        "$set": {
+            f"delivery_tasks_batch.tasks.{task_index}.delivery_task.status": status.name
+        }
+    }
+    if status == DeliveryStatus.COMPLETED:
+        update["$inc"] = {
+            "delivery_tasks_batch.current_task_index": 1,
+            "delivery_tasks_batch.version": 1,
+        }
+    result = await RiderRouteView.get_pymongo_collection().update_one(
+        {
+            "delivery_tasks_batch._id": delivery_tasks_batch_id,
+            "delivery_tasks_batch.current_task_index": task_index,
+            f"delivery_tasks_batch.tasks.{task_index}.delivery_task._id": (
+                delivery_task_id
+            ),
+        },
+        update,
+    )
+    return result.matched_count == 1
+
+
+async def delete_rider_route_views_having_delivery_task(
+    delivery_task_id: PydanticObjectId,
+) -> None:
+    """
+    This is the function to delete the route views holding a delivery task, after the
+    task was changed outside of its batch. The riders' routes are read from their
+    batches until a write to a batch gives it a view again.
+    """
+    await RiderRouteView.get_pymongo_collection().delete_many(
+        {"delivery_tasks_batch.tasks.delivery_task._id": delivery_task_id}
+    )
+
+
+def _dump(model: Any) -> dict[str, Any]:
+    return model.model_dump(by_alias=True)
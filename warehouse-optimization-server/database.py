@@ -3,14 +3,41 @@ from .models.item import Item
 from .models.rider import Rider
 from .models.delivery import DeliveryTask
 from .models.delivery_batch import DeliveryTasksBatch
+from .models.rider_route_view import RiderRouteView
+from typing import AsyncIterator, Optional
+from contextlib import asynccontextmanager
 from beanie import init_beanie
 import motor.motor_asyncio
 
 
+_client: Optional[motor.motor_asyncio.AsyncIOMotorClient] = None
+
+
 async def init_db():
+    global _client
     client = motor.motor_asyncio.AsyncIOMotorClient(settings.MONGO_URL)
     database = client[settings.MONGO_NAME]
 
     await init_beanie(
-        database=database, document_models=[Item, Rider, DeliveryTask, DeliveryTasksBatch]
+        database=database,
+        document_models=[Item, Rider, DeliveryTask, DeliveryTasksBatch, RiderRouteView],
     )
+    _client = client
+
+
+@asynccontextmanager
+async def transaction() -> AsyncIterator[
+    Optional[motor.motor_asyncio.AsyncIOMotorClientSession]
+]:
+    """
+    Yields a session whose writes commit together when the block exits and are aborted
+    when it raises, or None when MONGO_TRANSACTIONS_ENABLED is off, in which case the
+    writes given it apply one by one.
+    """
+    if not settings.MONGO_TRANSACTIONS_ENABLED:
+        yield None
+        return
+    assert _client is not None, "The database must be initialised"
+    async with await _client.start_session() as session:
+        async with session.start_transaction():
+            yield session
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Literal, List, Optional
 import datetime
 from beanie import PydanticObjectId
@@ -51,13 +51,28 @@ class RiderDTO(Rider):
 
 class DeliveryTaskRefDTO(DeliveryTaskRef):
     delivery_task: DeliveryTaskDTO
-    order_key: float
+    order_key: str
 
 
 class DeliveryTasksBatchDTO(DeliveryTasksBatch):
     rider: Rider
     tasks: List[DeliveryTaskRefDTO] # type: ignore
 
+    def get_fixed_tasks(self) -> List[DeliveryTaskRefDTO]:
+        """
+        Get the tasks a redispatch leaves in place, in order: those up to the current
+        task, which is under way, and up to the last pickup, since pickups are placed
+        by the pickup solver
+        """
+        all_tasks = sorted(self.tasks, key=lambda x: x.order_key)
+
+        num_fixed_tasks = min(self.current_task_index + 1, len(all_tasks))
+        for index, task in enumerate(all_tasks):
+            if task.delivery_task.delivery_information.delivery_type == "pickup":
+                num_fixed_tasks = max(num_fixed_tasks, index + 1)
+
+        return all_tasks[:num_fixed_tasks]
+
     def get_time_for_task(self, delivery_task: DeliveryTaskDTO) -> float:
         """
         Get time it will take to go from previous task to given task
@@ -122,6 +137,11 @@ class DeliveryTasksBatchDTO(DeliveryTasksBatch):
             )
 
 
+class DeliveryTasksBatchCurrentTaskDTO(BaseModel):
+    id: PydanticObjectId = Field(alias="_id")
+    current_task_index: int
+
+
 class PickupDeliveryBatchAssignmentDTO(BaseModel):
     assigned_delivery_tasks_batch_id: Optional[PydanticObjectId] = None
     after_task_index: Optional[int] = None
\ No newline at end of file
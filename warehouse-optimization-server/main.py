@@ -1,10 +1,14 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from .database import init_db
 from .settings import settings
 from .router import item, rider, delivery, delivery_batch
+from .algorithm.recorder import problem_recorder
+from .algorithm.solver_pool import close_solver_pools
+from .metrics import CONTENT_TYPE, render_metrics
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -12,7 +16,8 @@ async def lifespan(app: FastAPI):
     await init_db()
     yield
     # Shutdown
-    pass
+    await close_solver_pools()
+    problem_recorder.close()
 
 app = FastAPI(
     title=settings.TITLE,
@@ -47,3 +52,8 @@ app.include_router(delivery_batch.router)
 @app.get("/")
 async def read_root():
     return {"Hello": "World!"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
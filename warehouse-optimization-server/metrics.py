@@ -0,0 +1,221 @@
+"""
+Process-wide counters and latency histograms, exposed in the Prometheus text format on
+/metrics.
+
+Dispatch and pickup requests are timed phase by phase, loading from Mongo, building
+and validating the problem, the distance matrix, encoding the solver input, the solver
+round trip and persisting the answer, each tagged with the instance size rounded up to
+a power of ten so the number of series stays bounded. Solver timeouts, crashes and the
+fallbacks taken when a solver misbehaves are counted alongside.
+
+Metrics live in the memory of one server process, a deployment with several workers is
+scraped per worker.
+"""
+
+from typing import Dict, Iterator, List, Sequence, Tuple
+from contextlib import contextmanager
+import math
+import threading
+import time
+
+
+# upper bounds of the latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+# instance sizes above the largest power of ten are labelled "+Inf"
+MAX_SIZE_LABEL = 100000
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def get_size_label(size: int) -> str:
+    """
+    This function rounds an instance size up to a power of ten, the label value its
+    timings are recorded under.
+    """
+    if size > MAX_SIZE_LABEL:
+        return "+Inf"
+    return str(10 ** max(1, math.ceil(math.log10(max(size, 1)))))
+
+
+def _format_labels(label_names: Sequence[str], label_values: Sequence[str]) -> str:
+    if len(label_names) == 0:
+        return ""
+    labels = ",".join(
+        '{}="{}"'.format(
+            name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        )
+        for name, value in zip(label_names, label_values)
+    )
+    return f"{{{labels}}}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _get_label_values(self, labels: Dict[str, object]) -> LabelValues:
+        assert set(labels) == set(
+            self.label_names
+        ), f"Metric {self.name} takes the labels {self.label_names}"
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: object) -> None:
+        label_values = self._get_label_values(labels)
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.append(
+                f"{self.name}{_format_labels(self.label_names, label_values)} "
+                f"{_format_value(value)}"
+            )
+        return lines
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values to (count per bucket, not cumulative, sum)
+        self._values: Dict[LabelValues, Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        label_values = self._get_label_values(labels)
+        bucket = next(
+            index for index, bound in enumerate(self.buckets) if value <= bound
+        )
+        with self._lock:
+            counts, total = self._values.get(
+                label_values, ([0] * len(self.buckets), 0.0)
+            )
+            counts[bucket] += 1
+            self._values[label_values] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels: object) -> Iterator[None]:
+        """
+        This method observes the seconds spent in its block, also when it raises.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            values = sorted(
+                (label_values, (list(counts), total))
+                for label_values, (counts, total) in self._values.items()
+            )
+        bucket_label_names = self.label_names + ("le",)
+        for label_values, (counts, total) in values:
+            cumulative_count = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative_count += count
+                bucket_labels = _format_labels(
+                    bucket_label_names, label_values + (_format_value(bound),)
+                )
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative_count}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative_count}")
+        return lines
+
+
+_registry: List[_Metric] = []
+
+
+def render_metrics() -> str:
+    """
+    This function returns every metric in the Prometheus text exposition format.
+    """
+    return "".join(f"{line}\n" for metric in _registry for line in metric.render())
+
+
+def time_phase(operation: str, phase: str, size: int):
+    """
+    This function times a phase of a dispatch or pickup request on an instance of size
+    deliveries or tasks.
+    """
+    return phase_seconds.time(
+        operation=operation, phase=phase, size=get_size_label(size)
+    )
+
+
+phase_seconds = Histogram(
+    "wos_phase_seconds",
+    "Seconds spent in each phase of a dispatch or pickup request.",
+    ("operation", "phase", "size"),
+)
+solver_timeouts = Counter(
+    "wos_solver_timeouts_total",
+    "Solver requests cut short by their deadline.",
+    ("solver",),
+)
+solver_crashes = Counter(
+    "wos_solver_crashes_total",
+    "Solver requests that failed, the solver exited or answered with an error.",
+    ("solver",),
+)
+solver_fallbacks = Counter(
+    "wos_solver_fallbacks_total",
+    "Answers taken from a fallback instead of a solver finishing normally.",
+    ("solver", "fallback"),
+)
@@ -1,6 +1,7 @@
 from pydantic import Field
 from typing import Literal, List
 from beanie import Document, Link
+from pymongo import ASCENDING, IndexModel
 from ..schemas import DeliveryInformation 
 from .item import Item
 from ..enums import DeliveryStatus
@@ -23,4 +24,11 @@ class DeliveryTask(Document):
         DeliveryStatus.IN_PROGRESS.name,
         DeliveryStatus.COMPLETED.name,
         DeliveryStatus.CANCELLED.name,
-    ] = Field(DeliveryStatus.UNDISPATCHED.name, description="The status of the delivery task")
\ No newline at end of file
+    ] = Field(DeliveryStatus.UNDISPATCHED.name, description="The status of the delivery task")
+
+    class Settings:
+        # services select tasks by status and by delivery or pickup
+        indexes = [
+            IndexModel([("status", ASCENDING)]),
+            IndexModel([("delivery_information.delivery_type", ASCENDING)]),
+        ]
\ No newline at end of file
@@ -1,17 +1,27 @@
-from typing import List, Optional
-from pydantic import Field
+from typing import Any, List, Optional, Tuple
+from pydantic import Field, field_validator
 from beanie import Document, Link, PydanticObjectId
+from pymongo import ASCENDING, IndexModel
 from .rider import Rider
 from .delivery import DeliveryTask
 from pydantic import BaseModel
 import datetime
 from ..schemas import RouteSegment
+from ..order_keys import get_order_key_from_number
 from zoneinfo import ZoneInfo
 
 
 class DeliveryTaskRef(BaseModel):
     delivery_task: Link[DeliveryTask]
-    order_key: float
+    order_key: str  # fractional key, see order_keys.py
+
+    @field_validator("order_key", mode="before")
+    @classmethod
+    def convert_numeric_order_key(cls, order_key: Any) -> Any:
+        # batches dispatched before order keys were strings have numeric keys
+        if isinstance(order_key, (int, float)):
+            return get_order_key_from_number(order_key)
+        return order_key
 
 
 # route to get to current_task_index
@@ -49,6 +59,31 @@ class DeliveryTasksBatch(Document):
     )
     batch_route: Optional[List[DeliveryTasksBatchRouteSegment]] = []
 
+    class Settings:
+        # the current day's batches are loaded by a range on the route date, and
+        # batches are looked up by the DBRef of their rider or of one of their tasks
+        indexes = [
+            IndexModel([("route_identifier_timestamp", ASCENDING)]),
+            IndexModel([("rider", ASCENDING)]),
+            IndexModel([("tasks.delivery_task", ASCENDING)]),
+        ]
+
+    @classmethod
+    def get_current_day_bounds(cls) -> Tuple[datetime.datetime, datetime.datetime]:
+        """
+        Returns the UTC start and end of today in IST, the route_identifier_timestamp
+        range of the current day's batches.
+        """
+        day_start = datetime.datetime.combine(
+            datetime.datetime.now(ZoneInfo("Asia/Kolkata")).date(),
+            datetime.time(),
+            tzinfo=ZoneInfo("Asia/Kolkata"),
+        )
+        return (
+            day_start.astimezone(datetime.timezone.utc),
+            (day_start + datetime.timedelta(days=1)).astimezone(datetime.timezone.utc),
+        )
+
     def is_current_day_tasks_batch(self) -> bool:
         # the batch route date should be today in IST timezone
         batch_route_day = (
@@ -0,0 +1,25 @@
+from typing import Any, Dict
+from beanie import Document, PydanticObjectId
+from pymongo import ASCENDING, IndexModel
+
+
+class RiderRouteView(Document):
+    """
+    Read model of a rider's route: their current batch with its rider, tasks and items
+    embedded, so a rider's route is read with one lookup on the rider id. It is written
+    along with the batch it mirrors, see crud/rider_route_view.py.
+    """
+
+    rider_id: PydanticObjectId
+    # a dumped DeliveryTasksBatchDTO, Beanie would store the documents nested in the
+    # DTO as links
+    delivery_tasks_batch: Dict[str, Any]
+
+    class Settings:
+        # one route per rider, updated by the id of the batch it mirrors and
+        # dropped by the ids of the tasks it holds
+        indexes = [
+            IndexModel([("rider_id", ASCENDING)], unique=True),
+            IndexModel([("delivery_tasks_batch._id", ASCENDING)]),
+            IndexModel([("delivery_tasks_batch.tasks.delivery_task._id", ASCENDING)]),
+        ]
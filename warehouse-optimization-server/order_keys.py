@@ -0,0 +1,101 @@
+"""
+Fractional order keys of the tasks in a delivery tasks batch.
+
+Keys are strings of base 62 digits compared as strings, read as the digits after the
+point of a fraction between 0 and 1. A key never ends with the digit 0, so there is
+always a key between two others and a new task can be keyed between its neighbours
+without rekeying the rest of the batch. Each such insertion at the same place adds a
+digit about every six times, a batch whose keys grew past ORDER_KEY_REBALANCE_LENGTH is
+rekeyed with evenly spaced keys.
+"""
+
+from typing import List, Optional
+
+
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+
+# digits of the fraction kept when converting numeric keys of older batches
+_NUMBER_FRACTION_DIGITS = 8
+_NUMBER_WIDTH = 12
+
+
+def _validate_order_key(order_key: str) -> None:
+    assert order_key != "" and all(
+        digit in DIGITS for digit in order_key
+    ), f"Order key {order_key!r} must be made of base {BASE} digits"
+    assert not order_key.endswith(DIGITS[0]), f"Order key {order_key!r} ends with 0"
+
+
+def _get_midpoint(before: str, after: Optional[str]) -> str:
+    """
+    This function returns a key strictly between the digits before and after, "" for
+    before and None for after standing for 0 and 1.
+    """
+    if after is not None:
+        # a common prefix is kept and the key is looked for after it
+        prefix_length = 0
+        while prefix_length < len(after) and (
+            before[prefix_length] if prefix_length < len(before) else DIGITS[0]
+        ) == after[prefix_length]:
+            prefix_length += 1
+        if prefix_length > 0:
+            return after[:prefix_length] + _get_midpoint(
+                before[prefix_length:], after[prefix_length:]
+            )
+
+    before_digit = DIGITS.index(before[0]) if before != "" else 0
+    after_digit = DIGITS.index(after[0]) if after is not None else BASE
+    if after_digit - before_digit > 1:
+        return DIGITS[(before_digit + after_digit) // 2]
+    # consecutive first digits, the key is after the first digit of before
+    if after is not None and len(after) > 1:
+        return after[:1]
+    return DIGITS[before_digit] + _get_midpoint(before[1:], None)
+
+
+def get_order_key_between(before: Optional[str], after: Optional[str]) -> str:
+    """
+    This function returns a key strictly between two keys, before None for a key before
+    every other and after None for a key after every other.
+    """
+    if before is not None:
+        _validate_order_key(before)
+    if after is not None:
+        _validate_order_key(after)
+    assert (
+        before is None or after is None or before < after
+    ), f"Order key {before!r} must come before {after!r}"
+    return _get_midpoint(before or "", after)
+
+
+def get_order_keys_between(
+    before: Optional[str], after: Optional[str], count: int
+) -> List[str]:
+    """
+    This function returns count increasing keys strictly between two keys, spread
+    evenly so their length grows with the logarithm of count.
+    """
+    if count == 0:
+        return []
+    middle_key = get_order_key_between(before, after)
+    return (
+        get_order_keys_between(before, middle_key, count // 2)
+        + [middle_key]
+        + get_order_keys_between(middle_key, after, count - count // 2 - 1)
+    )
+
+
+def get_order_key_from_number(number: float) -> str:
+    """
+    This function converts the numeric order key of a batch keyed before keys were
+    strings, preserving the order of the non-negative keys it was given.
+    """
+    assert number >= 0, "Numeric order key must not be negative"
+    value = round(number * BASE**_NUMBER_FRACTION_DIGITS) + 1
+    digits = []
+    for _ in range(_NUMBER_WIDTH):
+        value, digit = divmod(value, BASE)
+        digits.append(DIGITS[digit])
+    assert value == 0, "Numeric order key is too large"
+    return "".join(reversed(digits)).rstrip(DIGITS[0])
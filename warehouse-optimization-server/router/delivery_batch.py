@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Any
+from fastapi import APIRouter, HTTPException, Request
+from typing import Any, Awaitable, List, TypeVar
 from beanie import PydanticObjectId
+import asyncio
 
 from ..services.delivery_batch import DeliveryBatchService
 from ..dtos import (
@@ -14,23 +15,64 @@ from ..models.delivery import DeliveryStatus
 
 router = APIRouter(prefix="/delivery_batch", tags=["delivery_batch"])
 
+T = TypeVar("T")
+
+# how often a request running the solvers checks whether its client went away
+DISCONNECT_POLL_INTERVAL_SECONDS = 0.5
+
+
+async def _cancel_on_disconnect(request: Request, awaitable: Awaitable[T]) -> T:
+    """
+    Runs awaitable and cancels it when the client disconnects, which kills the solvers
+    it is waiting on instead of letting them finish for nobody.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait(
+                {task}, timeout=DISCONNECT_POLL_INTERVAL_SECONDS
+            )
+            if done or await request.is_disconnected():
+                break
+    finally:
+        if not task.done():
+            task.cancel()
+    return await task
+
 
 @router.post("/dispatch")
 async def dispatch_delivery_tasks(
-    delivery_task_ids: List[PydanticObjectId], rider_ids: List[PydanticObjectId]
+    request: Request,
+    delivery_task_ids: List[PydanticObjectId],
+    rider_ids: List[PydanticObjectId],
+) -> dict[str, Any]:
+    return await _cancel_on_disconnect(
+        request,
+        DeliveryBatchService.dispatch_delivery_tasks(delivery_task_ids, rider_ids),
+    )
+
+
+@router.post("/redispatch")
+async def redispatch_delivery_tasks(
+    request: Request,
+    delivery_task_ids: List[PydanticObjectId],
+    rider_ids: List[PydanticObjectId],
 ) -> dict[str, Any]:
-    return await DeliveryBatchService.dispatch_delivery_tasks(
-        delivery_task_ids, rider_ids
+    return await _cancel_on_disconnect(
+        request,
+        DeliveryBatchService.redispatch_delivery_tasks(delivery_task_ids, rider_ids),
     )
 
 
 @router.post("/pickup", response_model=List[PickupDeliveryBatchAssignmentDTO])
 async def dispatch_dynamic_pickup_delivery_tasks(
+    request: Request,
     delivery_task_ids: List[PydanticObjectId],
 ):
     print("delivery_task_ids", delivery_task_ids)
-    return await DeliveryBatchService.dispatch_dynamic_pickup_delivery_tasks(
-        delivery_task_ids
+    return await _cancel_on_disconnect(
+        request,
+        DeliveryBatchService.dispatch_dynamic_pickup_delivery_tasks(delivery_task_ids),
     )
 
 
@@ -1,10 +1,13 @@
 from typing import List
 from beanie import PydanticObjectId
+from beanie.operators import In
 
 from ..dtos import DeliveryTaskDTO
 from ..models.delivery import DeliveryTask
 from ..models.item import Item
 from ..crud import delivery as delivery_crud
+from ..crud import delivery_batch as delivery_batch_crud
+from ..crud import rider_route_view as rider_route_view_crud
 from ..schemas import DeliveryInformation
 from ..enums import DeliveryStatus
 from ..clock import WarehouseClock
@@ -32,7 +35,10 @@ class DeliveryService:
         """
         This method is used to delete a dispatched delivery.
         """
-        return await delivery_crud.delete_delivery_task(delivery_task_id)
+        await delivery_crud.delete_delivery_task(delivery_task_id)
+        await rider_route_view_crud.delete_rider_route_views_having_delivery_task(
+            delivery_task_id
+        )
 
     @classmethod
     async def update_delivery_task(
@@ -41,19 +47,22 @@ class DeliveryService:
         """
         This method is used to update a dispatched delivery.
         """
-        return await delivery_crud.update_delivery_task(delivery_task_id, delivery_task)
+        delivery_task = await delivery_crud.update_delivery_task(
+            delivery_task_id, delivery_task
+        )
+        await rider_route_view_crud.delete_rider_route_views_having_delivery_task(
+            delivery_task_id
+        )
+        return delivery_task
 
     @classmethod
     async def get_undispatched_delivery_tasks(self) -> List[DeliveryTaskDTO]:
         """
         This method is used to get all undelivered delivery tasks.
         """
-        delivery_tasks = await delivery_crud.get_delivery_tasks()
-        return [
-            delivery_task
-            for delivery_task in delivery_tasks
-            if delivery_task.status == DeliveryStatus.UNDISPATCHED.name
-        ]
+        return await delivery_crud.get_delivery_tasks(
+            DeliveryTask.status == DeliveryStatus.UNDISPATCHED.name
+        )
 
     @staticmethod
     async def create_item_and_delivery_task(
@@ -75,17 +84,36 @@ class DeliveryService:
         delivery_task = await delivery_crud.get_delivery_task(delivery_task_id)
         current_status = DeliveryStatus.get_status_by_name(delivery_task.status)
         assert status.rank > current_status.rank, "Invalid status"
-        return await delivery_crud.update_delivery_task_status(delivery_task_id, status)
+        delivery_task = await delivery_crud.update_delivery_task_status(
+            delivery_task_id, status
+        )
+        await rider_route_view_crud.delete_rider_route_views_having_delivery_task(
+            delivery_task_id
+        )
+        return delivery_task
 
     @staticmethod
     async def get_delivery_tasks_by_rider(
         rider_id: PydanticObjectId,
     ) -> List[DeliveryTaskDTO]:
-        delivery_tasks = await delivery_crud.get_delivery_tasks()
+        """
+        This method is used to get the rider's delivery tasks that are not completed,
+        in route order. Tasks reach a rider through their batches.
+        """
+        delivery_task_ids = await delivery_batch_crud.get_delivery_task_ids_for_rider(
+            rider_id
+        )
+        if len(delivery_task_ids) == 0:
+            return []
+        delivery_tasks = {
+            delivery_task.id: delivery_task
+            for delivery_task in await delivery_crud.get_delivery_tasks(
+                In(DeliveryTask.id, delivery_task_ids),
+                DeliveryTask.status != DeliveryStatus.COMPLETED.name,
+            )
+        }
         return [
-            delivery_task
-            for delivery_task in delivery_tasks
-            if delivery_task.rider is not None
-            and delivery_task.rider.id == rider_id
-            and delivery_task.status != DeliveryStatus.COMPLETED.name
+            delivery_tasks[delivery_task_id]
+            for delivery_task_id in delivery_task_ids
+            if delivery_task_id in delivery_tasks
         ]
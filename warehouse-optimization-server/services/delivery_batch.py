@@ -1,11 +1,15 @@
-from typing import List, Any
+from typing import List, Any, Awaitable, Optional, TypeVar
 from collections import defaultdict
 from fastapi import HTTPException
 from beanie import PydanticObjectId
+from beanie.operators import In
+from motor.motor_asyncio import AsyncIOMotorClientSession
 import asyncio
+import logging
 
 from ..dtos import (
     DeliveryTaskDTO,
+    DeliveryTaskRefDTO,
     DeliveryTasksBatchDTO,
     PickupDeliveryBatchAssignmentDTO,
 )
@@ -14,10 +18,83 @@ from ..models.delivery_batch import DeliveryTaskRef, DeliveryTasksBatch
 from ..crud import delivery as delivery_crud
 from ..crud import delivery_batch as delivery_batch_crud
 from ..crud import rider as rider_crud
+from ..crud import rider_route_view as rider_route_view_crud
 from ..algorithm.dispatch import DispatchAlgorithm
 from ..enums import DeliveryStatus
-from .delivery import DeliveryService
 from ..algorithm.dynamic_pickup import DynamicPickupAlgorithm
+from ..database import transaction
+from ..metrics import time_phase
+from ..order_keys import get_order_key_between, get_order_keys_between
+from ..settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+async def _run_to_completion(awaitable: Awaitable[T]) -> T:
+    """
+    Runs writes that must not stop halfway. When the request is cancelled meanwhile,
+    the writes still finish and the cancellation is raised once they did.
+    """
+    task = asyncio.ensure_future(awaitable)
+    cancelled = False
+    while True:
+        try:
+            result = await asyncio.shield(task)
+            break
+        except asyncio.CancelledError:
+            if task.cancelled():
+                raise
+            cancelled = True
+    if cancelled:
+        raise asyncio.CancelledError()
+    return result
+
+
+class PickupDispatchIncomplete(HTTPException):
+    """
+    Raised when only some of the pickups of a request were dispatched, with the
+    assignments of those that were and the errors of the others.
+    """
+
+    def __init__(
+        self,
+        pickup_delivery_batch_assignments: dict[
+            PydanticObjectId, PickupDeliveryBatchAssignmentDTO
+        ],
+        errors: dict[PydanticObjectId, BaseException],
+    ) -> None:
+        super().__init__(
+            status_code=next(
+                (
+                    error.status_code
+                    for error in errors.values()
+                    if isinstance(error, HTTPException)
+                ),
+                500,
+            ),
+            detail={
+                "message": "Some pickup delivery tasks were not dispatched",
+                "dispatched": {
+                    str(delivery_task_id): (
+                        pickup_delivery_batch_assignment.model_dump(mode="json")
+                    )
+                    for delivery_task_id, pickup_delivery_batch_assignment in (
+                        pickup_delivery_batch_assignments.items()
+                    )
+                },
+                "failed": {
+                    str(delivery_task_id): (
+                        error.detail
+                        if isinstance(error, HTTPException)
+                        else str(error) or type(error).__name__
+                    )
+                    for delivery_task_id, error in errors.items()
+                },
+            },
+        )
 
 
 class DeliveryBatchService:
@@ -30,15 +107,13 @@ class DeliveryBatchService:
         """
         This method is used to dispatch deliveries to riders.
         """
-        delivery_tasks = await delivery_crud.get_delivery_tasks()
-        delivery_tasks = [
-            delivery_task
-            for delivery_task in delivery_tasks
-            if delivery_task.id in delivery_task_ids
-        ]
+        size = len(delivery_task_ids)
+        with time_phase("dispatch", "load", size):
+            delivery_tasks = await delivery_crud.get_delivery_tasks(
+                In(DeliveryTask.id, delivery_task_ids)
+            )
 
-        riders = await rider_crud.get_riders()
-        riders = [rider for rider in riders if rider.id in rider_ids]
+            riders = await rider_crud.get_riders_by_ids(rider_ids)
 
         assert all(
             [
@@ -50,15 +125,140 @@ class DeliveryBatchService:
 
         assert len(rider_ids) == len(set(rider_ids)), "Rider ids must be unique"
 
-        for delivery_task in delivery_tasks:
-            assert delivery_task.id is not None, "Delivery task id must be provided"
-            await delivery_crud.update_delivery_task(
-                delivery_task.id, {DeliveryTask.status: DeliveryStatus.DISPATCHING.name}
+        delivery_task_ids = cls._get_delivery_task_ids(delivery_tasks)
+        with time_phase("dispatch", "mark_dispatching", size):
+            await cls._mark_dispatching(delivery_task_ids)
+
+        try:
+            # the budget covers the solve and its local search, with the binary wire
+            # format the best answer found within it is returned, with the text format
+            # a solver still busy at its deadline is killed before the TimeoutError is
+            # raised here
+            with time_phase("dispatch", "algorithm", size):
+                dispatched_delivery_tasks = await asyncio.wait_for(
+                    DispatchAlgorithm.dispatch(
+                        delivery_tasks,
+                        riders,
+                        time_budget=settings.DISPATCH_TIME_BUDGET_SECONDS,
+                    ),
+                    timeout=10,
+                )
+
+            rider_to_delivery_task_ids = defaultdict(list)
+            for dispatched_delivery_task in dispatched_delivery_tasks:
+                rider_to_delivery_task_ids[dispatched_delivery_task.rider_id].append(
+                    dispatched_delivery_task.delivery_id
+                )
+
+            dispatched_delivery_task_ids = [
+                dispatched_delivery_task.delivery_id
+                for dispatched_delivery_task in dispatched_delivery_tasks
+            ]
+            with time_phase("dispatch", "persist", size):
+                await _run_to_completion(
+                    cls._persist_dispatch(
+                        delivery_task_ids,
+                        rider_to_delivery_task_ids,
+                        dispatched_delivery_task_ids,
+                    )
+                )
+
+        except BaseException as e:  # also revert when the request is cancelled
+            await cls._revert_dispatching(delivery_task_ids)
+            raise e
+
+        with time_phase("dispatch", "persist_rider_route_views", size):
+            await rider_route_view_crud.save_rider_route_views(
+                await delivery_batch_crud.get_delivery_tasks_batches_for_riders(
+                    list(rider_to_delivery_task_ids.keys())
+                )
+            )
+
+        return {
+            "success": True,
+            "dispatched_delivery_tasks": dispatched_delivery_tasks,
+        }
+
+    @classmethod
+    async def _persist_dispatch(
+        cls,
+        delivery_task_ids: List[PydanticObjectId],
+        rider_to_delivery_task_ids: dict[PydanticObjectId, List[PydanticObjectId]],
+        dispatched_delivery_task_ids: List[PydanticObjectId],
+    ) -> None:
+        """
+        This method writes a dispatch answer, in one transaction when transactions are
+        enabled: the tasks served become DISPATCHED, each rider gets a batch of them,
+        and the tasks no rider could take are left to dispatch again.
+        """
+        async with transaction() as session:
+            await delivery_crud.update_delivery_tasks_status(
+                dispatched_delivery_task_ids,
+                DeliveryStatus.DISPATCHED,
+                from_statuses=[DeliveryStatus.DISPATCHING],
+                session=session,
             )
+            await delivery_batch_crud.create_delivery_tasks_batches(
+                [
+                    DeliveryTasksBatch(
+                        rider=rider_id,
+                        tasks=cls._get_delivery_task_refs(
+                            [
+                                delivery_task_id
+                                for delivery_task_id in rider_delivery_task_ids
+                                if delivery_task_id is not None
+                            ]
+                        ),
+                    )
+                    for rider_id, rider_delivery_task_ids in (
+                        rider_to_delivery_task_ids.items()
+                    )
+                ],
+                session=session,
+            )
+            await cls._revert_dispatching(delivery_task_ids, session=session)
+
+    @classmethod
+    async def redispatch_delivery_tasks(
+        cls,
+        delivery_task_ids: List[PydanticObjectId],
+        rider_ids: List[PydanticObjectId],
+    ) -> dict[str, Any]:
+        """
+        This method is used to dispatch a later wave of deliveries to riders, reworking
+        the riders' batches for the day instead of dispatching from scratch.
+        """
+        delivery_tasks = await delivery_crud.get_delivery_tasks(
+            In(DeliveryTask.id, delivery_task_ids)
+        )
+
+        riders = await rider_crud.get_riders_by_ids(rider_ids)
+
+        assert all(
+            [
+                delivery_task.status == DeliveryStatus.UNDISPATCHED.name
+                and delivery_task.delivery_information.delivery_type == "delivery"
+                for delivery_task in delivery_tasks
+            ]
+        ), "All delivery tasks must be undispatched and not assigned to a rider and must be delivery"
+
+        assert len(rider_ids) == len(set(rider_ids)), "Rider ids must be unique"
+
+        delivery_tasks_batches = (
+            await delivery_batch_crud.get_delivery_tasks_batches_for_riders(rider_ids)
+        )
+
+        delivery_task_ids = cls._get_delivery_task_ids(delivery_tasks)
+        await cls._mark_dispatching(delivery_task_ids)
 
         try:
             dispatched_delivery_tasks = await asyncio.wait_for(
-                asyncio.to_thread(DispatchAlgorithm.dispatch, delivery_tasks, riders),
+                DispatchAlgorithm.redispatch(
+                    delivery_tasks_batches,
+                    delivery_tasks,
+                    riders,
+                    time_budget=settings.DISPATCH_TIME_BUDGET_SECONDS,
+                ),
                 timeout=10,
             )
 
@@ -67,46 +267,306 @@ class DeliveryBatchService:
                 rider_to_delivery_task_ids[dispatched_delivery_task.rider_id].append(
                     dispatched_delivery_task.delivery_id
                 )
+            dispatched_delivery_task_ids = set(
+                dispatched_delivery_task.delivery_id
+                for dispatched_delivery_task in dispatched_delivery_tasks
+            )
+            for delivery_tasks_batch in delivery_tasks_batches:
+                fixed_tasks = delivery_tasks_batch.get_fixed_tasks()
+                assert rider_to_delivery_task_ids[delivery_tasks_batch.rider.id][
+                    : len(fixed_tasks)
+                ] == [
+                    task.delivery_task.id for task in fixed_tasks
+                ], "Tasks up to the current task and the last pickup must stay in place"
+
+            await _run_to_completion(
+                cls._persist_redispatch(
+                    delivery_tasks_batches,
+                    delivery_task_ids,
+                    rider_to_delivery_task_ids,
+                    dispatched_delivery_task_ids,
+                )
+            )
 
-            for dispatched_delivery_task in dispatched_delivery_tasks:
-                await delivery_crud.update_delivery_task(
-                    dispatched_delivery_task.delivery_id,
+        except BaseException as e:  # also revert when the request is cancelled
+            # the tasks of the batches read may have been left out of them as well
+            await cls._revert_dispatching(
+                delivery_task_ids
+                + [
+                    task.delivery_task.id
+                    for delivery_tasks_batch in delivery_tasks_batches
+                    for task in delivery_tasks_batch.tasks
+                ]
+            )
+            raise e
+
+        await rider_route_view_crud.save_rider_route_views(
+            await delivery_batch_crud.get_delivery_tasks_batches_for_riders(rider_ids)
+        )
+
+        return {
+            "success": True,
+            "dispatched_delivery_tasks": dispatched_delivery_tasks,
+        }
+
+    @classmethod
+    async def _persist_redispatch(
+        cls,
+        delivery_tasks_batches: List[DeliveryTasksBatchDTO],
+        delivery_task_ids: List[PydanticObjectId],
+        rider_to_delivery_task_ids: dict[PydanticObjectId, List[PydanticObjectId]],
+        dispatched_delivery_task_ids: set[PydanticObjectId],
+    ) -> None:
+        """
+        This method writes a redispatch answer, in one transaction when transactions
+        are enabled: the new tasks served become DISPATCHED, the batches are reordered,
+        the riders without one get a new batch, and the tasks left out of every batch
+        are UNDISPATCHED again.
+        """
+        async with transaction() as session:
+            await cls._write_redispatch(
+                delivery_tasks_batches,
+                delivery_task_ids,
+                rider_to_delivery_task_ids,
+                dispatched_delivery_task_ids,
+                session,
+            )
+
+    @classmethod
+    async def _write_redispatch(
+        cls,
+        delivery_tasks_batches: List[DeliveryTasksBatchDTO],
+        delivery_task_ids: List[PydanticObjectId],
+        rider_to_delivery_task_ids: dict[PydanticObjectId, List[PydanticObjectId]],
+        dispatched_delivery_task_ids: set[PydanticObjectId],
+        session: Optional[AsyncIOMotorClientSession],
+    ) -> None:
+        """
+        This method makes the writes of _persist_redispatch in the session given.
+        Without a transaction, every batch is checked to be at the version it was read
+        at before any is written, and when a batch write still fails the batches
+        written so far are put back as they were read.
+        """
+        released_delivery_task_ids = list(delivery_task_ids)
+        delivery_tasks_batch_updates: List[tuple[DeliveryTasksBatchDTO, dict]] = []
+        for delivery_tasks_batch in delivery_tasks_batches:
+            assert (
+                delivery_tasks_batch.id is not None
+            ), "Delivery tasks batch id must be provided"
+            # the fixed tasks come first in the rider's order and keep their keys,
+            # the rest are keyed after them
+            order_keys = {
+                task.delivery_task.id: task.order_key
+                for task in delivery_tasks_batch.tasks
+            }
+            batch_delivery_task_ids = rider_to_delivery_task_ids.pop(
+                delivery_tasks_batch.rider.id, []
+            )
+            num_fixed_tasks = len(delivery_tasks_batch.get_fixed_tasks())
+            last_fixed_order_key = max(
+                (
+                    order_keys[delivery_task_id]
+                    for delivery_task_id in batch_delivery_task_ids[:num_fixed_tasks]
+                ),
+                default=None,
+            )
+            delivery_tasks_batch_updates.append(
+                (
+                    delivery_tasks_batch,
                     {
-                        DeliveryTask.status: DeliveryStatus.DISPATCHED.name,
+                        DeliveryTasksBatch.tasks: [
+                            DeliveryTaskRef(
+                                delivery_task=delivery_task_id,  # type: ignore
+                                order_key=order_keys[delivery_task_id],
+                            )
+                            for delivery_task_id in batch_delivery_task_ids[
+                                :num_fixed_tasks
+                            ]
+                        ]
+                        + cls._get_delivery_task_refs(
+                            batch_delivery_task_ids[num_fixed_tasks:],
+                            after_order_key=last_fixed_order_key,
+                        ),
                     },
                 )
+            )
 
-            for rider_id, delivery_task_ids in rider_to_delivery_task_ids.items():
-                delivery_tasks_batch = DeliveryTasksBatch(
-                    rider=rider_id,
-                    tasks=[
-                        DeliveryTaskRef(
-                            delivery_task=delivery_task_id,  # type: ignore
-                            order_key=i,
-                        )
-                        for i, delivery_task_id in enumerate(delivery_task_ids)
-                        if delivery_task_id is not None
-                    ],
+            # batch tasks that can no longer be served in time go back to be
+            # dispatched again, the others may have moved to another rider
+            released_delivery_task_ids.extend(
+                order_keys.keys() - dispatched_delivery_task_ids
+            )
+        new_delivery_tasks_batches = [
+            DeliveryTasksBatch(
+                id=PydanticObjectId(),
+                rider=rider_id,
+                tasks=cls._get_delivery_task_refs(rider_delivery_task_ids),
+            )
+            for rider_id, rider_delivery_task_ids in rider_to_delivery_task_ids.items()
+        ]
+
+        # a pickup inserted since the batches were read fails the redispatch
+        await delivery_batch_crud.check_delivery_tasks_batch_versions(
+            {
+                delivery_tasks_batch.id: delivery_tasks_batch.version
+                for delivery_tasks_batch in delivery_tasks_batches
+            },
+            session=session,
+        )
+
+        await delivery_crud.update_delivery_tasks_status(
+            [
+                delivery_task_id
+                for delivery_task_id in delivery_task_ids
+                if delivery_task_id in dispatched_delivery_task_ids
+            ],
+            DeliveryStatus.DISPATCHED,
+            from_statuses=[DeliveryStatus.DISPATCHING],
+            session=session,
+        )
+
+        written_delivery_tasks_batches: List[DeliveryTasksBatchDTO] = []
+        try:
+            for delivery_tasks_batch, update_dict in delivery_tasks_batch_updates:
+                await delivery_batch_crud.update_delivery_tasks_batch(
+                    delivery_tasks_batch.id,
+                    update_dict,
+                    # a batch updated since the check above still fails the redispatch
+                    expected_version=delivery_tasks_batch.version,
+                    session=session,
                 )
-                await delivery_batch_crud.create_delivery_tasks_batch(
-                    delivery_tasks_batch
+                written_delivery_tasks_batches.append(delivery_tasks_batch)
+
+            await delivery_batch_crud.create_delivery_tasks_batches(
+                new_delivery_tasks_batches, session=session
+            )
+        except BaseException as e:
+            if session is None:
+                await cls._restore_delivery_tasks_batches(
+                    written_delivery_tasks_batches,
+                    [
+                        delivery_tasks_batch.id
+                        for delivery_tasks_batch in new_delivery_tasks_batches
+                        if delivery_tasks_batch.id is not None
+                    ],
                 )
+            raise e
 
-            return {
-                "success": True,
-                "dispatched_delivery_tasks": dispatched_delivery_tasks,
-            }
+        await cls._revert_dispatching(released_delivery_task_ids, session=session)
 
-        except Exception as e:
-            for delivery_task in delivery_tasks:
-                assert delivery_task.id is not None, "Delivery task id must be provided"
-                await delivery_crud.update_delivery_task(
-                    delivery_task.id,
+    @classmethod
+    async def _restore_delivery_tasks_batches(
+        cls,
+        delivery_tasks_batches: List[DeliveryTasksBatchDTO],
+        created_delivery_tasks_batch_ids: List[PydanticObjectId],
+    ) -> None:
+        """
+        This method undoes the batch writes of a redispatch that failed without a
+        transaction: the batches it created are deleted and those it rewrote get back
+        the tasks they were read with. A batch updated again since it was rewritten is
+        left as it is, the tasks it holds stay dispatched.
+        """
+        await delivery_batch_crud.delete_delivery_tasks_batches(
+            created_delivery_tasks_batch_ids
+        )
+        for delivery_tasks_batch in delivery_tasks_batches:
+            assert (
+                delivery_tasks_batch.id is not None
+            ), "Delivery tasks batch id must be provided"
+            try:
+                await delivery_batch_crud.update_delivery_tasks_batch(
+                    delivery_tasks_batch.id,
                     {
-                        DeliveryTask.status: DeliveryStatus.UNDISPATCHED.name,
+                        DeliveryTasksBatch.tasks: [
+                            DeliveryTaskRef(
+                                delivery_task=task.delivery_task.id,  # type: ignore
+                                order_key=task.order_key,
+                            )
+                            for task in delivery_tasks_batch.tasks
+                        ]
                     },
+                    expected_version=delivery_tasks_batch.version + 1,
                 )
-            raise e
+            except delivery_batch_crud.DeliveryTasksBatchConflict:
+                pass
+
+    @classmethod
+    def _get_delivery_task_refs(
+        cls,
+        delivery_task_ids: List[PydanticObjectId],
+        after_order_key: Optional[str] = None,
+    ) -> List[DeliveryTaskRef]:
+        """
+        This method returns the refs of tasks in order, with evenly spaced order keys
+        after after_order_key.
+        """
+        return [
+            DeliveryTaskRef(
+                delivery_task=delivery_task_id,  # type: ignore
+                order_key=order_key,
+            )
+            for delivery_task_id, order_key in zip(
+                delivery_task_ids,
+                get_order_keys_between(after_order_key, None, len(delivery_task_ids)),
+            )
+        ]
+
+    @classmethod
+    def _get_delivery_task_ids(
+        cls, delivery_tasks: List[DeliveryTaskDTO]
+    ) -> List[PydanticObjectId]:
+        delivery_task_ids = []
+        for delivery_task in delivery_tasks:
+            assert delivery_task.id is not None, "Delivery task id must be provided"
+            delivery_task_ids.append(delivery_task.id)
+        return delivery_task_ids
+
+    @classmethod
+    async def _mark_dispatching(cls, delivery_task_ids: List[PydanticObjectId]) -> None:
+        """
+        This method claims the undispatched tasks for a dispatch in one update. A task
+        another dispatch claimed since they were read fails the claim, and the tasks
+        still being dispatched are released.
+        """
+        num_claimed = await delivery_crud.update_delivery_tasks_status(
+            delivery_task_ids,
+            DeliveryStatus.DISPATCHING,
+            from_statuses=[DeliveryStatus.UNDISPATCHED],
+        )
+        if num_claimed != len(delivery_task_ids):
+            await delivery_crud.update_delivery_tasks_status(
+                delivery_task_ids,
+                DeliveryStatus.UNDISPATCHED,
+                from_statuses=[DeliveryStatus.DISPATCHING],
+            )
+            raise AssertionError("All delivery tasks must be undispatched")
+
+    @classmethod
+    async def _revert_dispatching(
+        cls,
+        delivery_task_ids: List[PydanticObjectId],
+        session: Optional[AsyncIOMotorClientSession] = None,
+    ) -> None:
+        """
+        This method returns the tasks of a dispatch that no batch holds to
+        UNDISPATCHED in one update. The tasks of the batches it wrote stay dispatched,
+        so the batches hold dispatched tasks however far a failed dispatch got.
+        """
+        batched_delivery_task_ids = (
+            await delivery_batch_crud.get_batched_delivery_task_ids(
+                delivery_task_ids, session=session
+            )
+        )
+        await delivery_crud.update_delivery_tasks_status(
+            [
+                delivery_task_id
+                for delivery_task_id in delivery_task_ids
+                if delivery_task_id not in batched_delivery_task_ids
+            ],
+            DeliveryStatus.UNDISPATCHED,
+            from_statuses=[DeliveryStatus.DISPATCHING, DeliveryStatus.DISPATCHED],
+            session=session,
+        )
 
     @classmethod
     async def dispatch_dynamic_pickup_delivery_tasks(
@@ -135,62 +595,112 @@ class DeliveryBatchService:
             )
 
             try:
-                delivery_tasks_batches = (
-                    await delivery_batch_crud.get_delivery_tasks_batches()
-                )
-
-                pickup_delivery_batch_assignment = await asyncio.wait_for(
-                    asyncio.to_thread(
-                        DynamicPickupAlgorithm.add_pickup,
-                        pickup_delivery_task,
-                        delivery_tasks_batches,
-                    ),
-                    timeout=10,
-                )
-
-                assert (
-                    pickup_delivery_batch_assignment.assigned_delivery_tasks_batch_id
-                    is not None
-                ), "Assigned delivery tasks batch id must be provided"
-                assert (
-                    pickup_delivery_batch_assignment.after_task_index is not None
-                ), "After task index must be provided"
+                # the pickup is placed again on the current batches when its batch was
+                # updated by another request since it was placed
+                for attempt in range(
+                    settings.DELIVERY_TASKS_BATCH_UPDATE_MAX_ATTEMPTS
+                ):
+                    delivery_tasks_batches = (
+                        await delivery_batch_crud.get_delivery_tasks_batches()
+                    )
 
-                await cls.add_delivery_task_to_delivery_tasks_batch(
-                    pickup_delivery_batch_assignment.assigned_delivery_tasks_batch_id,
-                    pickup_delivery_task.id,
-                    pickup_delivery_batch_assignment.after_task_index,
-                )
+                    pickup_delivery_batch_assignment = await asyncio.wait_for(
+                        DynamicPickupAlgorithm.add_pickup(
+                            pickup_delivery_task,
+                            delivery_tasks_batches,
+                        ),
+                        timeout=10,
+                    )
 
+                    assigned_delivery_tasks_batch_id = (
+                        pickup_delivery_batch_assignment.assigned_delivery_tasks_batch_id
+                    )
+                    assert (
+                        assigned_delivery_tasks_batch_id is not None
+                    ), "Assigned delivery tasks batch id must be provided"
+                    assert (
+                        pickup_delivery_batch_assignment.after_task_index is not None
+                    ), "After task index must be provided"
+
+                    # the pickup is dispatched before it shows in the batch, which only
+                    # holds dispatched tasks
+                    await delivery_crud.update_delivery_task(
+                        pickup_delivery_task.id,
+                        {DeliveryTask.status: DeliveryStatus.DISPATCHED.name},
+                    )
+                    expected_version = next(
+                        delivery_tasks_batch.version
+                        for delivery_tasks_batch in delivery_tasks_batches
+                        if delivery_tasks_batch.id == assigned_delivery_tasks_batch_id
+                    )
+                    try:
+                        order_key, _ = await cls._insert_delivery_task(
+                            assigned_delivery_tasks_batch_id,
+                            pickup_delivery_task.id,
+                            pickup_delivery_batch_assignment.after_task_index,
+                            expected_version,
+                        )
+                        break
+                    except delivery_batch_crud.DeliveryTasksBatchConflict:
+                        if (
+                            attempt + 1
+                            == settings.DELIVERY_TASKS_BATCH_UPDATE_MAX_ATTEMPTS
+                        ):
+                            raise
+
+            except BaseException as e:  # also revert when the request is cancelled
                 await delivery_crud.update_delivery_task(
                     pickup_delivery_task.id,
                     {
-                        DeliveryTask.status: DeliveryStatus.DISPATCHED.name,
+                        DeliveryTask.status: DeliveryStatus.UNDISPATCHED.name,
                     },
                 )
+                raise e
 
-            except Exception as e:
-                await delivery_crud.update_delivery_task(
+            # the pickup is in its batch from here on and stays dispatched
+            await _run_to_completion(
+                cls._update_rider_route_view_with_delivery_task(
+                    assigned_delivery_tasks_batch_id,
                     pickup_delivery_task.id,
-                    {
-                        DeliveryTask.status: DeliveryStatus.UNDISPATCHED.name,
-                    },
+                    pickup_delivery_batch_assignment.after_task_index + 1,
+                    order_key,
+                    expected_version,
                 )
-                raise e
+            )
 
             return pickup_delivery_batch_assignment
 
-        # pickup tasks must be assigned in the same order as they are dispatched
-        # To ensure the delivery tasks are dispatched sequentially (one after another),
-        # we process them in a for loop and await each one before moving to the next.
-        pickup_delivery_batch_assignments = []
-        for delivery_task_id in delivery_task_ids:
-            pickup_delivery_batch_assignment = (
-                await _dispatch_dynamic_pickup_delivery_task(delivery_task_id)
+        # the pickups are placed concurrently, those placed in the same batch at once
+        # conflict on its version and the losers are placed again
+        results = await asyncio.gather(
+            *(
+                _dispatch_dynamic_pickup_delivery_task(delivery_task_id)
+                for delivery_task_id in delivery_task_ids
+            ),
+            return_exceptions=True,
+        )
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if len(errors) == len(results) or (
+            len(errors) > 0 and not isinstance(errors[0], Exception)
+        ):
+            raise errors[0]
+        if len(errors) > 0:
+            # the pickups placed stay dispatched, the error tells which they are so
+            # only the others are dispatched again
+            raise PickupDispatchIncomplete(
+                {
+                    delivery_task_id: result
+                    for delivery_task_id, result in zip(delivery_task_ids, results)
+                    if not isinstance(result, BaseException)
+                },
+                {
+                    delivery_task_id: result
+                    for delivery_task_id, result in zip(delivery_task_ids, results)
+                    if isinstance(result, BaseException)
+                },
             )
-            pickup_delivery_batch_assignments.append(pickup_delivery_batch_assignment)
 
-        return pickup_delivery_batch_assignments
+        return results  # type: ignore
 
     @classmethod
     async def add_delivery_task_to_delivery_tasks_batch(
@@ -198,69 +708,157 @@ class DeliveryBatchService:
         delivery_tasks_batch_id: PydanticObjectId,
         delivery_task_id: PydanticObjectId,
         after_task_index: int,
+        expected_version: Optional[int] = None,
     ) -> None:
-        delivery_tasks_batch = await delivery_batch_crud.get_delivery_tasks_batch(
-            delivery_tasks_batch_id
+        """
+        This method inserts a delivery task in a batch after the task at
+        after_task_index. The insertion only applies to the batch at expected_version,
+        the version its position was chosen on, when given.
+        """
+        order_key, delivery_tasks_batch_version = await cls._insert_delivery_task(
+            delivery_tasks_batch_id, delivery_task_id, after_task_index, expected_version
+        )
+        await cls._update_rider_route_view_with_delivery_task(
+            delivery_tasks_batch_id,
+            delivery_task_id,
+            after_task_index + 1,
+            order_key,
+            delivery_tasks_batch_version,
         )
-        tasks = sorted(delivery_tasks_batch.tasks, key=lambda x: x.order_key)
 
+    @classmethod
+    async def _insert_delivery_task(
+        cls,
+        delivery_tasks_batch_id: PydanticObjectId,
+        delivery_task_id: PydanticObjectId,
+        after_task_index: int,
+        expected_version: Optional[int],
+    ) -> tuple[str, int]:
+        """
+        This method inserts a delivery task in a batch after the task at
+        after_task_index, only in the batch at expected_version when given. It returns
+        the order key the task was given and the version the batch was inserted at.
+        """
         assert (
             after_task_index >= 0
         ), "After task index must be greater than or equal to 0"
-        assert after_task_index < len(
-            tasks
+
+        # the tasks are stored in order, only the task the new one follows and the
+        # next one are read, and the new task is pushed at its position
+        delivery_tasks_batch = await delivery_batch_crud.get_delivery_tasks_batch_slice(
+            delivery_tasks_batch_id, after_task_index, 2
+        )
+        assert (
+            len(delivery_tasks_batch.tasks) > 0
         ), "After task index must be less than the number of tasks"
 
-        updated_tasks = tasks
+        order_key = get_order_key_between(
+            delivery_tasks_batch.tasks[0].order_key,
+            (
+                delivery_tasks_batch.tasks[1].order_key
+                if len(delivery_tasks_batch.tasks) > 1
+                else None
+            ),
+        )
+        if expected_version is None:
+            expected_version = delivery_tasks_batch.version
+        await delivery_batch_crud.insert_delivery_task_ref(
+            delivery_tasks_batch_id,
+            after_task_index + 1,
+            delivery_task_id,
+            order_key,
+            expected_version=expected_version,
+        )
+        return order_key, expected_version
 
-        if len(tasks) == 0:
-            updated_tasks = [
-                DeliveryTaskRef(delivery_task=delivery_task_id, order_key=0)  # type: ignore
-            ]
-        else:
-            prev_task_order_key = tasks[after_task_index].order_key
-            next_task_order_key = (
-                (prev_task_order_key + 1)
-                if (after_task_index + 1) >= len(tasks)
-                else tasks[after_task_index + 1].order_key
+    @classmethod
+    async def _update_rider_route_view_with_delivery_task(
+        cls,
+        delivery_tasks_batch_id: PydanticObjectId,
+        delivery_task_id: PydanticObjectId,
+        position: int,
+        order_key: str,
+        delivery_tasks_batch_version: int,
+    ) -> None:
+        """
+        This method follows the insertion of a delivery task at a position of a batch,
+        rebalancing the batch's order keys once they grew long and inserting the task
+        in the route view mirroring the batch. The task is in the batch whatever
+        happens here, so an error only gets the view rewritten from the batch.
+        """
+        try:
+            if len(order_key) > settings.ORDER_KEY_REBALANCE_LENGTH:
+                await cls.rebalance_order_keys(delivery_tasks_batch_id)
+                return
+
+            # the route view of the batch's rider takes the task at the same position
+            if await rider_route_view_crud.insert_rider_route_view_task(
+                delivery_tasks_batch_id,
+                position,
+                DeliveryTaskRefDTO(
+                    delivery_task=await delivery_crud.get_delivery_task(
+                        delivery_task_id
+                    ),
+                    order_key=order_key,
+                ),
+                delivery_tasks_batch_version,
+            ):
+                return
+        except Exception:
+            logger.exception(
+                "Failed to update the route view of delivery tasks batch %s",
+                delivery_tasks_batch_id,
             )
-            updated_tasks = (
-                [
-                    DeliveryTaskRef(
-                        delivery_task=task.delivery_task.id,  # type: ignore
-                        order_key=task.order_key,
-                    )
-                    for task in tasks[: after_task_index + 1]
-                ]
-                + [
-                    DeliveryTaskRef(
-                        delivery_task=delivery_task_id,  # type: ignore
-                        order_key=((prev_task_order_key + next_task_order_key) / 2),
-                    )
-                ]
-                + [
+        try:
+            await cls._refresh_rider_route_view(delivery_tasks_batch_id)
+        except Exception:
+            logger.exception(
+                "Failed to refresh the route view of delivery tasks batch %s",
+                delivery_tasks_batch_id,
+            )
+
+    @classmethod
+    async def rebalance_order_keys(
+        cls, delivery_tasks_batch_id: PydanticObjectId
+    ) -> None:
+        """
+        This method rekeys the tasks of a batch with evenly spaced order keys, keeping
+        their order, once insertions at the same place made the keys long.
+        """
+
+        def get_update_dict(
+            delivery_tasks_batch: DeliveryTasksBatch,
+        ) -> dict[str, Any]:
+            order_keys = get_order_keys_between(
+                None, None, len(delivery_tasks_batch.tasks)
+            )
+            return {
+                DeliveryTasksBatch.tasks: [
                     DeliveryTaskRef(
-                        delivery_task=task.delivery_task.id,  # type: ignore
-                        order_key=task.order_key,
+                        delivery_task=task.delivery_task.ref.id,  # type: ignore
+                        order_key=order_key,
                     )
-                    for task in tasks[after_task_index + 1 :]
+                    for task, order_key in zip(delivery_tasks_batch.tasks, order_keys)
                 ]
-            )
+            }
 
-        assert (
-            len(updated_tasks) == len(tasks) + 1
-        ), "Updated tasks must be of the same length as the original tasks"
-        assert set([task.delivery_task.ref.id for task in updated_tasks]) == set(
-            [task.delivery_task.id for task in tasks]
-        ) | {
-            delivery_task_id
-        }, "Updated tasks must contain the original tasks and the new task"
-
-        await delivery_batch_crud.update_delivery_tasks_batch(
-            delivery_tasks_batch_id,
-            {
-                DeliveryTasksBatch.tasks: updated_tasks,
-            },
+        await delivery_batch_crud.update_delivery_tasks_batch_with_retry(
+            delivery_tasks_batch_id, get_update_dict
+        )
+        await cls._refresh_rider_route_view(delivery_tasks_batch_id)
+
+    @classmethod
+    async def _refresh_rider_route_view(
+        cls, delivery_tasks_batch_id: PydanticObjectId
+    ) -> None:
+        """
+        This method rewrites the route view mirroring a batch from the batch, when the
+        view missed an update or the update is not worth making in place.
+        """
+        await rider_route_view_crud.save_rider_route_views(
+            await delivery_batch_crud.get_delivery_tasks_batches(
+                DeliveryTasksBatch.id == delivery_tasks_batch_id
+            )
         )
 
     @classmethod
@@ -277,13 +875,25 @@ class DeliveryBatchService:
         cls, rider_id: PydanticObjectId
     ) -> DeliveryTasksBatchDTO:
         """
-        This method is used to get the delivery tasks batch for a rider.
+        This method is used to get the delivery tasks batch for a rider, from the
+        rider's route view when it holds today's batch.
         """
-        delivery_tasks_batches = await delivery_batch_crud.get_delivery_tasks_batches()
-        for delivery_tasks_batch in delivery_tasks_batches:
-            if getattr(delivery_tasks_batch.rider, "id", None) == rider_id:
-                return delivery_tasks_batch
-        raise HTTPException(status_code=404, detail="Delivery tasks batch not found")
+        delivery_tasks_batch = await rider_route_view_crud.get_rider_route(rider_id)
+        if (
+            delivery_tasks_batch is not None
+            and delivery_tasks_batch.is_current_day_tasks_batch()
+        ):
+            return delivery_tasks_batch
+
+        # a batch gets its view on its first write since views were introduced
+        delivery_tasks_batches = (
+            await delivery_batch_crud.get_delivery_tasks_batches_for_riders([rider_id])
+        )
+        if len(delivery_tasks_batches) == 0:
+            raise HTTPException(
+                status_code=404, detail="Delivery tasks batch not found"
+            )
+        return delivery_tasks_batches[0]
 
     @classmethod
     async def get_delivery_tasks_batch_having_delivery_task(
@@ -292,15 +902,11 @@ class DeliveryBatchService:
         """
         This method is used to get the delivery tasks batches having a delivery task.
         """
-        delivery_tasks_batches = await delivery_batch_crud.get_delivery_tasks_batches()
-        delivery_tasks_batches_having_delivery_task = [
-            delivery_tasks_batch
-            for delivery_tasks_batch in delivery_tasks_batches
-            if any(
-                task.delivery_task.id == delivery_task_id
-                for task in delivery_tasks_batch.tasks
+        delivery_tasks_batches_having_delivery_task = (
+            await delivery_batch_crud.get_delivery_tasks_batches_having_delivery_task(
+                delivery_task_id
             )
-        ]
+        )
 
         assert (
             len(delivery_tasks_batches_having_delivery_task) == 1
@@ -313,35 +919,49 @@ class DeliveryBatchService:
         cls, delivery_task_id: PydanticObjectId, status: DeliveryStatus
     ) -> DeliveryTaskDTO:
         """
-        This method is used to update the status of a delivery task.
+        This method moves the current task of a batch to a status of higher rank, and
+        the batch on to its next task when the task is completed. It costs the same few
+        round trips however many batches and tasks there are: a lookup of the batch
+        through the index on its task links, then a conditional update of the task and
+        of the batch, in one transaction when transactions are enabled.
         """
-        delivery_tasks_batch = await cls.get_delivery_tasks_batch_having_delivery_task(
-            delivery_task_id
-        )
-
-        want_to_update_task_index = next(
-            i
-            for i, task in enumerate(delivery_tasks_batch.tasks)
-            if task.delivery_task.id == delivery_task_id
+        delivery_tasks_batch = (
+            await delivery_batch_crud.get_delivery_tasks_batch_at_delivery_task(
+                delivery_task_id
+            )
         )
-
         assert (
-            want_to_update_task_index == delivery_tasks_batch.current_task_index
+            delivery_tasks_batch is not None
         ), "Can't update the delivery task that is not the current task"
 
-        await DeliveryService.update_delivery_task_status(delivery_task_id, status)
+        async with transaction() as session:
+            # a task is completed once, so only one request advances its batch
+            try:
+                delivery_task = await delivery_crud.transition_delivery_task_status(
+                    delivery_task_id, status, session=session
+                )
+            except AssertionError:
+                # a completion that stopped before advancing the batch left it at
+                # the completed task, a retry advances it
+                delivery_task = await delivery_crud.get_delivery_task(delivery_task_id)
+                if not (
+                    status == DeliveryStatus.COMPLETED
+                    and delivery_task.status == DeliveryStatus.COMPLETED.name
+                ):
+                    raise
+            if status == DeliveryStatus.COMPLETED:
+                await delivery_batch_crud.advance_current_task_index(
+                    delivery_tasks_batch.id,
+                    delivery_tasks_batch.current_task_index,
+                    session=session,
+                )
 
-        delivery_task = await delivery_crud.get_delivery_task(delivery_task_id)
-        if delivery_task.status == DeliveryStatus.COMPLETED.name:
-            assert (
-                delivery_tasks_batch.id is not None
-            ), "Delivery tasks batch id must be provided"
-            await delivery_batch_crud.update_delivery_tasks_batch(
-                delivery_tasks_batch.id,
-                {
-                    DeliveryTasksBatch.current_task_index: delivery_tasks_batch.current_task_index
-                    + 1
-                },
-            )
+        if not await rider_route_view_crud.update_rider_route_view_task_status(
+            delivery_tasks_batch.id,
+            delivery_tasks_batch.current_task_index,
+            delivery_task_id,
+            status,
+        ):
+            await cls._refresh_rider_route_view(delivery_tasks_batch.id)
 
         return delivery_task
@@ -6,7 +6,7 @@ from ..crud import rider as rider_crud
 from ..models.rider import Rider
 from ..dtos import RiderDTO
 from ..crud import delivery as delivery_crud
-from .delivery_batch import DeliveryBatchService
+from ..crud import delivery_batch as delivery_batch_crud
 
 
 class RiderService:
@@ -18,7 +18,7 @@ class RiderService:
         try:
             rider = await rider_crud.get_rider(rider_id)
             if rider:
-                return await cls._populate_rider(rider)
+                return (await cls._populate_riders([rider]))[0]
             raise HTTPException(status_code=404, detail="Rider not found")
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
@@ -26,12 +26,13 @@ class RiderService:
     @classmethod
     async def get_riders(cls) -> list[RiderDTO]:
         """
-        This method is used to get all riders.
+        This method is used to get all riders, with the ids of their batches read in
+        one query for all of them.
         """
         try:
             riders = await rider_crud.get_riders()
             if riders:
-                return [await cls._populate_rider(rider) for rider in riders]
+                return await cls._populate_riders(riders)
             raise HTTPException(status_code=404, detail="Riders not found")
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
@@ -60,20 +61,22 @@ class RiderService:
             raise HTTPException(status_code=500, detail=str(e))
 
     @classmethod
-    async def _populate_rider(cls, rider: Rider) -> RiderDTO:
+    async def _populate_riders(cls, riders: List[Rider]) -> List[RiderDTO]:
         """
-        This method is used to populate a rider.
+        This method is used to populate riders with the ids of their current day's
+        batches, looked up for all the riders at once.
         """
-        assert rider.id is not None, "Rider id must be provided"
-        try:
-            delivery_tasks_batch = (
-                await DeliveryBatchService.get_delivery_tasks_batch_for_rider(rider.id)
-            )
-        except HTTPException:
-            delivery_tasks_batch = None
-        return RiderDTO(
-            **rider.model_dump(),
-            assigned_delivery_tasks_batch_id=(
-                delivery_tasks_batch.id if delivery_tasks_batch else None
-            )
+        rider_ids = []
+        for rider in riders:
+            assert rider.id is not None, "Rider id must be provided"
+            rider_ids.append(rider.id)
+        delivery_tasks_batch_ids = (
+            await delivery_batch_crud.get_delivery_tasks_batch_ids_for_riders(rider_ids)
         )
+        return [
+            RiderDTO(
+                **rider.model_dump(),
+                assigned_delivery_tasks_batch_id=delivery_tasks_batch_ids.get(rider_id),
+            )
+            for rider, rider_id in zip(riders, rider_ids)
+        ]
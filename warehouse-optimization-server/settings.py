@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic_settings import BaseSettings
 
 
@@ -9,6 +10,45 @@ class Settings(BaseSettings):
     ENVIRONMENT: str = "DEV"
     MONGO_URL: str = "mongodb://localhost"
     MONGO_NAME: str = "ROUTE-PLANNING-DB"
+    # dispatch writes its answer in one multi-document transaction, needs a replica set
+    MONGO_TRANSACTIONS_ENABLED: bool = False
+    # attempts of a delivery tasks batch update that lost the race to another update
+    DELIVERY_TASKS_BATCH_UPDATE_MAX_ATTEMPTS: int = 5
+    # a batch is rekeyed once a task inserted in it gets an order key this long
+    ORDER_KEY_REBALANCE_LENGTH: int = 16
+    # "random" draws fresh travel time noise on every call, "deterministic" derives it
+    # from the seed and the pair of coordinates so results are symmetric and reusable
+    DISTANCE_NOISE_MODE: Literal["random", "deterministic"] = "random"
+    DISTANCE_NOISE_SEED: int = 0
+    # input format written to the solvers, "binary" needs solvers built from the current sources
+    SOLVER_WIRE_FORMAT: Literal["text", "binary"] = "text"
+    # "native" runs the solvers in process through their shared libraries, see algorithm/native.py
+    SOLVER_BACKEND: Literal["subprocess", "native"] = "subprocess"
+    # long-lived solver processes kept per solver, 0 uses one per CPU core
+    SOLVER_POOL_SIZE: int = 0
+    # time of a dispatch request's solve and local search, with the binary wire format
+    # the best answer found by then is returned
+    DISPATCH_TIME_BUDGET_SECONDS: float = 8.0
+    # parallel dispatch searches with distinct seeds, 0 uses one per solver slot
+    DISPATCH_NUM_STARTS: int = 1
+    # local search on the dispatch answer's routes, 0 disables it
+    DISPATCH_POST_OPTIMIZE_SECONDS: float = 0.5
+    # days with more deliveries are split into zones of about DISPATCH_ZONE_SIZE deliveries
+    # solved separately, 0 never splits
+    DISPATCH_DECOMPOSITION_THRESHOLD: int = 2000
+    DISPATCH_ZONE_SIZE: int = 500
+    # answers of repeated dispatches of the same problem, see algorithm/cache.py, with
+    # 0 entries only the directory is used and with no directory only memory
+    DISPATCH_CACHE_MAX_ENTRIES: int = 128
+    DISPATCH_CACHE_TTL_SECONDS: float = 900.0
+    DISPATCH_CACHE_DIRECTORY: str = ""
+    DISPATCH_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    # sampled, compressed capture of solver inputs for offline replay
+    PROBLEM_RECORDER_ENABLED: bool = False
+    PROBLEM_RECORDER_SAMPLE_RATE: float = 1.0
+    PROBLEM_RECORDER_DIRECTORY: str = "./algorithm/runnable/recordings"
+    PROBLEM_RECORDER_COMPRESSION: Literal["gzip", "zstd"] = "gzip"
+    PROBLEM_RECORDER_MAX_BYTES: int = 512 * 1024 * 1024
 
     class Config:
         env_file = ".env"
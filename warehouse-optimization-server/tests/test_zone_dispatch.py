@@ -0,0 +1,94 @@
+"""
+Tests of the zone decomposition of large dispatch problems, run from the repository
+root:
+
+    python -m unittest discover -s warehouse-optimization-server/tests -t .
+"""
+
+from typing import List
+from unittest import mock
+import asyncio
+import unittest
+
+import numpy as np
+from beanie import PydanticObjectId
+
+from ..algorithm.dispatch import DispatchAlgorithm
+from ..algorithm.problem import DispatchProblem
+
+
+def _get_problem(num_deliveries: int, num_riders: int) -> DispatchProblem:
+    return DispatchProblem(
+        delivery_task_ids=[PydanticObjectId() for _ in range(num_deliveries)],
+        rider_ids=[PydanticObjectId() for _ in range(num_riders)],
+        latitudes=np.linspace(12.90, 12.99, num_deliveries + 1),
+        longitudes=np.linspace(77.50, 77.59, num_deliveries + 1),
+        areas=np.ones(num_deliveries + 1, dtype=np.int32),
+        volumes=np.full(num_deliveries, 10, dtype=np.int32),
+        expected_delivery_time_deltas=np.full(num_deliveries, 36000, dtype=np.int64),
+        bag_volumes=np.full(num_riders, 100, dtype=np.int32),
+    )
+
+
+class ZoneDispatchTest(unittest.TestCase):
+    def test_repair_keeps_hub_returns(self):
+        problem = _get_problem(4, 2)
+        orders = DispatchAlgorithm._repair_zone_boundaries(
+            problem,
+            np.array([0, 0, 1, 1]),
+            [np.array([0]), np.array([1])],
+            [[1, 0, 2], [3, 4]],
+            1.0,
+        )
+        self.assertEqual(orders, [[1, 0, 2], [3, 4]])
+
+    def test_solve_by_zones_keeps_hub_returns(self):
+        problem = _get_problem(4, 2)
+        zone_labels = np.array([0, 1, 0, 1])
+
+        async def solve_whole(zone_problem: DispatchProblem, *args) -> List[List[int]]:
+            # every zone has two deliveries and one rider, who goes back to the hub
+            # between them
+            return [[1, 0, 2]]
+
+        with mock.patch.object(
+            DispatchAlgorithm, "_get_zone_labels", return_value=zone_labels
+        ), mock.patch.object(
+            DispatchAlgorithm, "_solve_whole", side_effect=solve_whole
+        ):
+            orders = asyncio.run(
+                DispatchAlgorithm._solve_by_zones(problem, None, None, 0, None)
+            )
+
+        self.assertEqual(sorted(orders), [[1, 0, 3], [2, 0, 4]])
+
+    def test_failed_zone_gets_empty_routes(self):
+        problem = _get_problem(4, 2)
+        zone_labels = np.array([0, 1, 0, 1])
+
+        async def solve_whole(zone_problem: DispatchProblem, *args) -> List[List[int]]:
+            if zone_problem.delivery_task_ids[0] == problem.delivery_task_ids[1]:
+                raise RuntimeError("solver crashed")
+            return [[1, 2]]
+
+        with mock.patch.object(
+            DispatchAlgorithm, "_get_zone_labels", return_value=zone_labels
+        ), mock.patch.object(
+            DispatchAlgorithm, "_solve_whole", side_effect=solve_whole
+        ), self.assertLogs("warehouse-optimization-server.algorithm.dispatch"):
+            orders = asyncio.run(
+                DispatchAlgorithm._solve_by_zones(problem, None, None, 0, None)
+            )
+
+        # the repair may reorder the surviving route
+        self.assertEqual(sorted(sorted(order) for order in orders), [[], [1, 3]])
+
+    def test_get_problem_order(self):
+        self.assertEqual(
+            DispatchAlgorithm._get_problem_order([2, 0, 1, 0], np.array([5, 7])),
+            [8, 0, 6, 0],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()